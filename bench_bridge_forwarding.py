@@ -0,0 +1,248 @@
+"""跨服桥接端到端转发基准测试
+
+把合成的消息对象直接送进 on_message，经过路由、规则、审查、发件箱、webhook调度器，
+发送到本地模拟的Discord webhook服务（可设置延迟和429比例），统计：
+  - 每条消息从 on_message 开始到所有目标发送完成的延迟 p50/p95/p99
+  - 吞吐量（条/秒）
+  - 数据库写入开销（发件箱入队、转发记录批量提交）
+
+不需要网络和机器人TOKEN。每个场景在独立的子进程和临时目录中运行，互不影响。
+
+用法: python bench_bridge_forwarding.py [--messages 2000] [--bridges 1,10,50] [--audit-ratios 0,0.5]
+                                        [--latency-ms 20] [--rate-limit-ratio 0.01] [--rate 0] [--workers 0]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# 合成ID的起点（避免与真实snowflake冲突无关紧要，只需唯一）
+_BASE_ID = 10 ** 17
+
+def run_webhook_server(port_queue, latency_ms: float, rate_limit_ratio: float, seed: int):
+    """模拟Discord webhook接口：固定延迟加抖动，按比例返回429"""
+    from aiohttp import web
+
+    rng = random.Random(seed)
+    counter = {'next': _BASE_ID * 9}
+
+    async def execute_webhook(request: web.Request) -> web.Response:
+        await request.read()
+        if latency_ms:
+            await asyncio.sleep(latency_ms * rng.uniform(0.5, 1.5) / 1000)
+        if rng.random() < rate_limit_ratio:
+            return web.json_response(
+                {'message': 'You are being rate limited.', 'retry_after': 0.05, 'global': False},
+                status=429,
+                headers={'Retry-After': '0.05', 'X-RateLimit-Bucket': request.match_info['webhook_id']}
+            )
+        counter['next'] += 1
+        return web.json_response({'id': str(counter['next'])})
+
+    async def serve():
+        app = web.Application()
+        app.router.add_post('/api/webhooks/{webhook_id}/{token}', execute_webhook)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port_queue.put(site._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+def make_message(message_id: int, channel_id: int, guild_id: int, author_id: int, content: str):
+    """构造on_message用到的discord.Message字段"""
+    import discord
+
+    author = SimpleNamespace(
+        id=author_id, bot=False, name=f"user{author_id}", display_name=f"用户{author_id}",
+        display_avatar=SimpleNamespace(url=f"https://cdn.example/avatars/{author_id}.png"), roles=[]
+    )
+    return SimpleNamespace(
+        id=message_id, webhook_id=None, type=discord.MessageType.default, author=author,
+        channel=SimpleNamespace(id=channel_id), guild=SimpleNamespace(id=guild_id),
+        content=content, attachments=[], embeds=[], _state=None
+    )
+
+def percentile(values, p: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_scenario(scenario: dict, port: int) -> dict:
+    import cross_server_bridge_bot as bridge
+
+    rng = random.Random(scenario['seed'])
+    bot = bridge.bot
+    # 不登录网关：给机器人一个合成身份，并让 get_guild 返回模拟的目标服务器
+    bot._connection.user = SimpleNamespace(id=1)
+    channels = {}
+    bot.get_guild = lambda guild_id: SimpleNamespace(id=guild_id, get_channel=channels.get)
+
+    await bot.setup_hook()
+
+    bridges = scenario['bridges']
+    audit_count = round(bridges * scenario['audit_ratio'])
+    sources = []
+    for index in range(bridges):
+        source_guild, source_channel = 1000 + index, 2000 + index
+        target_guild, target_channel = 3000 + index, 4000 + index
+        webhook_url = f"http://127.0.0.1:{port}/api/webhooks/{5000 + index}/token"
+        await bridge.db.run(
+            bridge.save_bridge_config, f"bench-{index}", source_guild, source_channel,
+            target_guild, target_channel, webhook_url, 1, index < audit_count
+        )
+        channels[target_channel] = SimpleNamespace(id=target_channel)
+        sources.append((source_guild, source_channel))
+    await bridge.reload_bridge_routes()
+    if bridge.delivery_workers:
+        # 不把子进程启动时间算进吞吐
+        await bridge.delivery_workers.wait_ready()
+
+    violation = bridge.FORBIDDEN_WORDS[0]
+    messages = []
+    for index in range(scenario['messages']):
+        guild_id, channel_id = sources[index % bridges]
+        content = f"基准测试消息 {index} " + "测试内容" * rng.randint(1, 20)
+        if rng.random() < scenario['violation_ratio']:
+            content += violation
+        messages.append(make_message(_BASE_ID + index, channel_id, guild_id, 100 + index % 50, content))
+
+    latencies = []
+    semaphore = asyncio.Semaphore(scenario['concurrency'])
+    loop = asyncio.get_running_loop()
+
+    async def feed(message):
+        async with semaphore:
+            start = loop.time()
+            await bridge.on_message(message)
+            latencies.append((loop.time() - start) * 1000)
+
+    # 按到达顺序创建任务，同一webhook内保持顺序；指定速率时按固定间隔到达
+    wall_start = time.perf_counter()
+    tasks = []
+    for index, message in enumerate(messages):
+        if scenario['rate'] > 0:
+            delay = wall_start + index / scenario['rate'] - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(feed(message)))
+    await asyncio.gather(*tasks)
+    wall = time.perf_counter() - wall_start
+
+    outbox_stats = bridge.outbox.stats()
+    # 关闭时写完剩余的转发记录，统计包含全部提交开销
+    await bot.close()
+    writer_stats = bridge.log_writer.stats()
+    if bridge.delivery_workers:
+        # 投递进程模式下转发记录由子进程写入
+        delivery_stats = bridge.delivery_workers.stats()
+        writer_stats = {
+            'rows_written': delivery_stats['rows_written'],
+            'total_flush_ms': delivery_stats['total_flush_ms'],
+            'max_flush_ms': delivery_stats['max_flush_ms']
+        }
+    else:
+        delivery_stats = bridge.webhook_scheduler.stats()
+
+    return {
+        'messages': len(messages),
+        'sent': delivery_stats['sent'],
+        'rate_limited': delivery_stats['rate_limited'],
+        'throughput': len(messages) / wall,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'enqueue_us': outbox_stats['total_enqueue_ms'] * 1000 / max(1, outbox_stats['enqueued']),
+        'log_rows': writer_stats['rows_written'],
+        'log_us': writer_stats['total_flush_ms'] * 1000 / max(1, writer_stats['rows_written']),
+        'log_max_ms': writer_stats['max_flush_ms']
+    }
+
+def scenario_main(scenario: dict):
+    """子进程入口：在临时目录中启动模拟服务和桥接，结果以JSON写到标准输出最后一行"""
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    server = context.Process(
+        target=run_webhook_server,
+        args=(port_queue, scenario['latency_ms'], scenario['rate_limit_ratio'], scenario['seed']),
+        daemon=True
+    )
+    server.start()
+    port = port_queue.get(timeout=30)
+
+    workdir = tempfile.mkdtemp(prefix='bridge-bench-')
+    os.chdir(workdir)
+    try:
+        # 机器人每条转发都会打印日志，基准测试中丢弃
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            result = asyncio.run(run_scenario(scenario, port))
+    finally:
+        server.terminate()
+    print(json.dumps(result))
+
+def main():
+    parser = argparse.ArgumentParser(description="跨服桥接端到端转发基准测试")
+    parser.add_argument('--messages', type=int, default=2000, help="每个场景发送的消息数量")
+    parser.add_argument('--bridges', default='1,10,50', help="桥接数量，逗号分隔（每个桥接一对源/目标频道）")
+    parser.add_argument('--audit-ratios', default='0,0.5', help="审查模式桥接所占比例，逗号分隔")
+    parser.add_argument('--violation-ratio', type=float, default=0.1, help="包含违禁词的消息比例")
+    parser.add_argument('--latency-ms', type=float, default=20, help="模拟webhook的平均响应延迟")
+    parser.add_argument('--rate-limit-ratio', type=float, default=0.01, help="模拟webhook返回429的比例")
+    parser.add_argument('--concurrency', type=int, default=200, help="同时在处理中的消息数上限")
+    parser.add_argument('--rate', type=float, default=0,
+                        help="消息到达速率（条/秒），0为尽快发送（测最大吞吐，延迟包含排队时间）")
+    parser.add_argument('--workers', default='0', help="BRIDGE_DELIVERY_WORKERS取值，逗号分隔")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        scenario_main(json.loads(args.scenario))
+        return
+
+    print(f"{'桥接':>4} | {'审查':>4} | {'进程':>4} | {'吞吐 msg/s':>10} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'p99 ms':>7} | {'429':>4} | {'入队 us':>7} | {'记录 us/行':>9} | 最大提交")
+    print('-' * 108)
+    for workers in (int(w) for w in args.workers.split(',')):
+        for bridges in (int(b) for b in args.bridges.split(',')):
+            for audit_ratio in (float(r) for r in args.audit_ratios.split(',')):
+                scenario = {
+                    'messages': args.messages,
+                    'bridges': bridges,
+                    'audit_ratio': audit_ratio,
+                    'violation_ratio': args.violation_ratio,
+                    'latency_ms': args.latency_ms,
+                    'rate_limit_ratio': args.rate_limit_ratio,
+                    'concurrency': args.concurrency,
+                    'rate': args.rate,
+                    'seed': args.seed
+                }
+                env = dict(os.environ, BRIDGE_DELIVERY_WORKERS=str(workers))
+                completed = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), '--scenario', json.dumps(scenario)],
+                    capture_output=True, text=True, env=env,
+                    cwd=os.path.dirname(os.path.abspath(__file__))
+                )
+                if completed.returncode != 0:
+                    print(f"场景失败（桥接 {bridges}，审查 {audit_ratio}，进程 {workers}）:\n{completed.stderr}")
+                    continue
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                print(f"{bridges:>4} | {audit_ratio:>4.0%} | {workers:>4} | {result['throughput']:>10,.0f} | "
+                      f"{result['p50']:>7.1f} | {result['p95']:>7.1f} | {result['p99']:>7.1f} | "
+                      f"{result['rate_limited']:>4} | {result['enqueue_us']:>7.0f} | {result['log_us']:>9.1f} | "
+                      f"{result['log_max_ms']:.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""审查模式关键词匹配基准测试
+
+对比逐个关键词 `in` 检查（原 check_violation_content 的做法）、KeywordMatcher
+（按关键词数自动选择逐个 str.find 或 Aho-Corasick）和强制使用 Aho-Corasick 的吞吐量（条消息/秒）。
+几十个关键词时自动机比逐个检查慢，用这个脚本确定 LINEAR_SCAN_MAX_KEYWORDS 的分界点。
+
+用法: python bench_violation_matcher.py [--messages 2000] [--sizes 40,100,1000,5000]
+"""
+import argparse
+import random
+import string
+import time
+
+from bridge_matcher import LINEAR_SCAN_MAX_KEYWORDS, KeywordMatcher
+
+def linear_check(content: str, forbidden_words, dc_patterns, political_words) -> tuple[bool, str]:
+    """原实现：每次调用小写化内容并逐个关键词检查"""
+    if not content:
+        return False, ""
+
+    content_lower = content.lower()
+    for word in forbidden_words:
+        if word in content:
+            return True, f"包含违禁词: {word}"
+    for pattern in dc_patterns:
+        if pattern in content_lower:
+            return True, "包含Discord邀请链接"
+    for word in political_words:
+        if word in content_lower:
+            return True, f"包含涉政内容: {word}"
+    return False, ""
+
+def matcher_check(matcher: KeywordMatcher, content: str) -> tuple[bool, str]:
+    """新实现：取按规则顺序的第一条命中（与 check_violation_content 相同）"""
+    first = matcher.first(content)
+    if first is None:
+        return False, ""
+    if first.category == 'forbidden':
+        return True, f"包含违禁词: {first.keyword}"
+    if first.category == 'invite':
+        return True, "包含Discord邀请链接"
+    return True, f"包含涉政内容: {first.keyword}"
+
+def random_word(rng: random.Random, alphabet: str, min_len: int = 2, max_len: int = 6) -> str:
+    return ''.join(rng.choice(alphabet) for _ in range(rng.randint(min_len, max_len)))
+
+def build_keywords(rng: random.Random, size: int):
+    """生成中英混合的小写关键词表"""
+    cjk = ''.join(chr(c) for c in range(0x4e00, 0x4e00 + 400))
+    latin = string.ascii_lowercase
+    forbidden = [random_word(rng, cjk) for _ in range(max(2, size // 20))]
+    invites = ["discord.gg/", "discord.com/invite/", "discordapp.com/invite/", "discord.gg", ".gg/"]
+    political = []
+    for _ in range(size - len(forbidden)):
+        political.append(random_word(rng, cjk) if rng.random() < 0.7 else random_word(rng, latin, 4, 10))
+    return forbidden, invites, political
+
+def build_messages(rng: random.Random, count: int, keywords, hit_ratio: float = 0.1):
+    """生成聊天消息，其中约hit_ratio比例包含关键词"""
+    cjk = ''.join(chr(c) for c in range(0x4e00, 0x4e00 + 3000))
+    filler = cjk + string.ascii_letters + '  ,.!?'
+    all_keywords = [word for group in keywords for word in group]
+    messages = []
+    for _ in range(count):
+        text = ''.join(rng.choice(filler) for _ in range(rng.randint(10, 200)))
+        if rng.random() < hit_ratio:
+            pos = rng.randint(0, len(text))
+            text = text[:pos] + rng.choice(all_keywords) + text[pos:]
+        messages.append(text)
+    return messages
+
+def throughput(func, messages, rounds: int = 3) -> float:
+    """取多轮中最快的一轮，返回条/秒"""
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for message in messages:
+            func(message)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+def main():
+    parser = argparse.ArgumentParser(description="审查模式关键词匹配基准测试")
+    parser.add_argument('--messages', type=int, default=2000, help="每轮测试的消息数量")
+    parser.add_argument('--sizes', default='35,60,100,200,1000,5000', help="关键词表大小，逗号分隔")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"分界点 LINEAR_SCAN_MAX_KEYWORDS = {LINEAR_SCAN_MAX_KEYWORDS}")
+    print(f"{'关键词数':>8} | {'逐个检查 msg/s':>15} | {'Matcher msg/s':>14} | {'模式':>6} | "
+          f"{'Aho-Corasick msg/s':>19} | {'加速比':>6} | 构建耗时")
+    print('-' * 100)
+    for size in (int(s) for s in args.sizes.split(',')):
+        rng = random.Random(args.seed)
+        forbidden, invites, political = build_keywords(rng, size)
+        messages = build_messages(rng, args.messages, (forbidden, invites, political))
+
+        build_start = time.perf_counter()
+        rules = [(w, 'forbidden') for w in forbidden]
+        rules += [(p, 'invite') for p in invites]
+        rules += [(w, 'political') for w in political]
+        automaton = KeywordMatcher(rules, linear_max=0)
+        build_ms = (time.perf_counter() - build_start) * 1000
+        matcher = KeywordMatcher(rules)
+
+        # 两种模式的结果都必须与原实现一致
+        for message in messages:
+            expected = linear_check(message, forbidden, invites, political)
+            for m in (matcher, automaton):
+                actual = matcher_check(m, message)
+                assert expected == actual, (message, expected, actual)
+
+        linear_rate = throughput(lambda m: linear_check(m, forbidden, invites, political), messages)
+        matcher_rate = throughput(lambda m: matcher_check(matcher, m), messages)
+        automaton_rate = throughput(lambda m: matcher_check(automaton, m), messages)
+        mode = '逐个' if matcher.linear else '自动机'
+        print(f"{len(rules):>8} | {linear_rate:>15,.0f} | {matcher_rate:>14,.0f} | {mode:>6} | "
+              f"{automaton_rate:>19,.0f} | {matcher_rate / linear_rate:>5.1f}x | {build_ms:.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""投票统计查询基准测试
+
+在百万级投票记录上对比 /stats 的两种实现：
+  - 原实现：每种票型一次 COUNT(*)，votes 表除 UNIQUE 约束外没有索引，每次统计扫描整张表两遍
+  - 新实现：条件聚合一次查询，走 (guild_id, target_id, vote_type, timestamp) 覆盖索引
+
+以及排行榜的两种实现：
+  - 原实现：对该服务器的全部投票 GROUP BY target_id
+  - 新实现：读取由触发器增量维护的按天汇总表（vote_tallies）和总计表（vote_totals）
+
+同时记录在已有数据库上执行迁移（建索引、回填汇总表）的耗时，以及单次投票的写入耗时：
+  - 原实现：每次投票新建连接、提交时等待fsync
+  - 新实现：vote_db.VoteDatabase 的持久WAL连接（从事件循环发起，包含线程切换开销）
+
+最后模拟活动期间的集中投票（--burst 张票同时到达）：逐张提交 vs vote_buffer.VoteWriteBuffer 合并提交。
+
+用法: python bench_vote_stats.py [--votes 1200000] [--targets 5000] [--queries 300] [--burst 1000]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+def legacy_get_user_stats(user_id: int, guild_id: int, days: Optional[int] = None) -> dict:
+    """原实现：两次COUNT(*)"""
+    conn = sqlite3.connect('votes.db')
+    cursor = conn.cursor()
+
+    time_condition = ""
+    params = [user_id, guild_id]
+    if days:
+        cutoff_date = datetime.now() - timedelta(days=days)
+        time_condition = "AND timestamp >= ?"
+        params.append(cutoff_date.isoformat())
+
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM votes
+        WHERE target_id = ? AND vote_type = '好票' AND guild_id = ? {time_condition}
+    ''', params)
+    good_votes = cursor.fetchone()[0]
+
+    cursor.execute(f'''
+        SELECT COUNT(*) FROM votes
+        WHERE target_id = ? AND vote_type = '坏票' AND guild_id = ? {time_condition}
+    ''', params)
+    bad_votes = cursor.fetchone()[0]
+
+    conn.close()
+    return {'good_votes': good_votes, 'bad_votes': bad_votes}
+
+def legacy_get_leaderboard_data(guild_id: int, days: Optional[int] = None, limit: int = 10):
+    """原实现：每次对投票记录分组聚合"""
+    conn = sqlite3.connect('votes.db')
+    cursor = conn.cursor()
+
+    time_condition = ""
+    params = [guild_id]
+    if days:
+        time_condition = "AND timestamp >= ?"
+        params.append((datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S'))
+
+    cursor.execute(f'''
+        SELECT target_id,
+               SUM(CASE WHEN vote_type = '好票' THEN 1 ELSE 0 END) as good_votes,
+               SUM(CASE WHEN vote_type = '坏票' THEN 1 ELSE 0 END) as bad_votes,
+               COUNT(*) as total_votes
+        FROM votes
+        WHERE guild_id = ? {time_condition}
+        GROUP BY target_id
+        HAVING total_votes > 0
+        ORDER BY good_votes DESC, total_votes DESC
+        LIMIT ?
+    ''', params + [limit])
+    results = cursor.fetchall()
+    conn.close()
+    return results
+
+def legacy_cast_vote(voter_id: int, target_id: int, vote_type: str, guild_id: int) -> bool:
+    """原实现：每次投票新建连接并提交"""
+    conn = sqlite3.connect('votes.db')
+    conn.execute('''
+        INSERT OR REPLACE INTO votes (voter_id, target_id, vote_type, guild_id)
+        VALUES (?, ?, ?, ?)
+    ''', (voter_id, target_id, vote_type, guild_id))
+    conn.commit()
+    conn.close()
+    return True
+
+def populate(votes: int, guilds: int, targets: int, seed: int) -> int:
+    """按原表结构（无索引）生成投票记录，时间分布在最近180天内"""
+    rng = random.Random(seed)
+    conn = sqlite3.connect('votes.db')
+    conn.execute('''
+        CREATE TABLE votes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            voter_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            vote_type TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(voter_id, target_id, guild_id)
+        )
+    ''')
+    now = datetime.now(timezone.utc)
+
+    def rows():
+        for _ in range(votes):
+            # 第一个服务器占大部分投票，模拟一个活跃的大服务器
+            guild_id = 1 if rng.random() < 0.8 else rng.randint(2, guilds)
+            moment = now - timedelta(seconds=rng.randint(0, 180 * 86400))
+            yield (
+                rng.randint(1, votes // 10), rng.randint(1, targets),
+                '好票' if rng.random() < 0.7 else '坏票', guild_id,
+                moment.strftime('%Y-%m-%d %H:%M:%S')
+            )
+
+    with conn:
+        conn.executemany('''
+            INSERT OR IGNORE INTO votes (voter_id, target_id, vote_type, guild_id, timestamp)
+            VALUES (?, ?, ?, ?, ?)
+        ''', rows())
+    count = conn.execute('SELECT COUNT(*) FROM votes').fetchone()[0]
+    conn.close()
+    return count
+
+def measure(func, samples, days: Optional[int]) -> tuple:
+    """返回 (p50毫秒, p95毫秒)"""
+    timings = []
+    for target_id, guild_id in samples:
+        start = time.perf_counter()
+        func(target_id, guild_id, days)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[int(len(timings) * 0.95)]
+
+def measure_leaderboard(func, days: Optional[int], repeat: int) -> float:
+    """排行榜查询p50毫秒（查询最活跃的服务器）"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(1, days)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+def measure_votes(cast, rng: random.Random, votes: int, targets: int, count: int) -> float:
+    """投票写入p50毫秒；一半是改票（走INSERT OR REPLACE的替换路径）"""
+    timings = []
+    for index in range(count):
+        voter_id = rng.randint(1, votes // 10) if index % 2 else votes * 2 + rng.randint(1, votes)
+        start = time.perf_counter()
+        cast(voter_id, rng.randint(1, targets), rng.choice(['好票', '坏票']), 1)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+async def measure_burst(cast, votes: list, flush=None) -> tuple:
+    """同时到达的一批投票：返回 (确认延迟p50毫秒, 全部写入数据库的总耗时毫秒)"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    acks = []
+
+    async def one(vote):
+        await cast(*vote)
+        acks.append((loop.time() - start) * 1000)
+
+    await asyncio.gather(*(one(vote) for vote in votes))
+    if flush:
+        await flush()
+    total_ms = (loop.time() - start) * 1000
+    acks.sort()
+    return acks[len(acks) // 2], total_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="投票统计查询基准测试")
+    parser.add_argument('--votes', type=int, default=1200000, help="生成的投票记录数")
+    parser.add_argument('--guilds', type=int, default=5, help="服务器数量")
+    parser.add_argument('--targets', type=int, default=5000, help="被投票成员数量")
+    parser.add_argument('--queries', type=int, default=300, help="每种实现测试的统计次数")
+    parser.add_argument('--burst', type=int, default=1000, help="集中投票测试中同时到达的投票数")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='vote-bench-')
+    os.chdir(workdir)
+
+    start = time.perf_counter()
+    count = populate(args.votes, args.guilds, args.targets, args.seed)
+    print(f"生成 {count:,} 条投票记录，耗时 {time.perf_counter() - start:.1f} s（{workdir}）")
+
+    rng = random.Random(args.seed)
+    samples = [(rng.randint(1, args.targets), 1) for _ in range(args.queries)]
+    # 原实现每次都扫全表，测试次数少一些
+    legacy_samples = samples[:max(10, args.queries // 10)]
+
+    legacy = {days: measure(legacy_get_user_stats, legacy_samples, days) for days in (None, 30)}
+    leaderboard_periods = (15, 30, 90, None)
+    legacy_leaderboard = {days: measure_leaderboard(legacy_get_leaderboard_data, days, 5)
+                          for days in leaderboard_periods}
+
+    # 在已有数据库上执行迁移
+    from vote_db import VoteDatabase
+    loop = asyncio.new_event_loop()
+    vote_db = VoteDatabase('votes.db')
+    start = time.perf_counter()
+    loop.run_until_complete(vote_db.open())
+    print(f"迁移（建立覆盖索引、回填汇总表）耗时 {time.perf_counter() - start:.1f} s")
+
+    def get_user_stats(target_id, guild_id, days=None):
+        return loop.run_until_complete(vote_db.get_user_stats(target_id, guild_id, days))
+
+    def get_leaderboard(guild_id, days=None, limit=10):
+        return loop.run_until_complete(vote_db.get_leaderboard(guild_id, days, limit))
+
+    def cast_vote(voter_id, target_id, vote_type, guild_id):
+        return loop.run_until_complete(vote_db.cast_vote(voter_id, target_id, vote_type, guild_id))
+
+    # 结果必须与原实现一致（全部时间；原实现的时间条件格式与写入格式不一致，不做比较）
+    for target_id, guild_id in legacy_samples:
+        assert legacy_get_user_stats(target_id, guild_id) == get_user_stats(target_id, guild_id)
+
+    current = {days: measure(get_user_stats, samples, days) for days in (None, 30)}
+
+    # 汇总表的全部时间排行榜与原实现一致（时间窗口按整天计算，边界与原实现不同，不做比较）
+    assert legacy_get_leaderboard_data(1, None, 50) == get_leaderboard(1, None, 50)
+    current_leaderboard = {days: measure_leaderboard(get_leaderboard, days, 50) for days in leaderboard_periods}
+
+    # 写入在迁移之后测（两种实现都带汇总触发器，数据库都已是WAL模式）
+    legacy_vote_p50 = measure_votes(legacy_cast_vote, rng, args.votes, args.targets, args.queries)
+    vote_p50 = measure_votes(cast_vote, rng, args.votes, args.targets, args.queries)
+
+    from vote_buffer import VoteWriteBuffer
+    vote_buffer = VoteWriteBuffer(vote_db)
+
+    def burst_votes():
+        return [(rng.randint(1, args.votes // 10), rng.randint(1, args.targets), rng.choice(['好票', '坏票']), 1)
+                for _ in range(args.burst)]
+
+    direct_burst = loop.run_until_complete(measure_burst(vote_db.cast_vote, burst_votes()))
+    buffered_burst = loop.run_until_complete(measure_burst(vote_buffer.cast_vote, burst_votes(), vote_buffer.flush))
+    loop.run_until_complete(vote_db.close())
+    loop.close()
+
+    print()
+    print(f"{'周期':>8} | {'原实现 p50':>10} | {'原实现 p95':>10} | {'新实现 p50':>10} | {'新实现 p95':>10} | 加速比")
+    print('-' * 76)
+    for days in (None, 30):
+        old_p50, old_p95 = legacy[days]
+        new_p50, new_p95 = current[days]
+        label = '全部时间' if days is None else f'{days}天'
+        print(f"{label:>8} | {old_p50:>8.2f}ms | {old_p95:>8.2f}ms | {new_p50:>8.3f}ms | {new_p95:>8.3f}ms | "
+              f"{old_p50 / new_p50:>5.0f}x")
+
+    print()
+    print(f"{'排行榜':>8} | {'原实现 p50':>10} | {'新实现 p50':>10} | 加速比")
+    print('-' * 48)
+    for days in leaderboard_periods:
+        old_p50, new_p50 = legacy_leaderboard[days], current_leaderboard[days]
+        label = '全部时间' if days is None else f'{days}天'
+        print(f"{label:>8} | {old_p50:>8.2f}ms | {new_p50:>8.3f}ms | {old_p50 / new_p50:>5.0f}x")
+
+    print()
+    print(f"投票写入 p50：原实现 {legacy_vote_p50:.2f} ms，持久连接 {vote_p50:.2f} ms")
+    print(f"集中投票 {args.burst} 张：逐张提交 确认p50 {direct_burst[0]:.1f} ms、全部写入 {direct_burst[1]:.0f} ms；"
+          f"写缓冲 确认p50 {buffered_burst[0]:.3f} ms、全部写入 {buffered_burst[1]:.0f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import asyncio
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import discord
+from discord.utils import snowflake_time, time_snowflake
+
+from bridge_db import BridgeDatabase
+
+@dataclass
+class BackfillJob:
+    bridge_name: str
+    source_channel_id: int
+    end_message_id: int
+    status: str = 'running'
+    start_message_id: Optional[int] = None
+    last_message_id: Optional[int] = None
+    copied: int = 0
+    error: Optional[str] = None
+    # 本次运行开始时的进度和时间，用于估算剩余时间
+    session_progress: float = 0.0
+    session_started: float = field(default_factory=time.monotonic)
+
+    def progress(self) -> float:
+        """按雪花ID中的时间戳估算进度（0~1）"""
+        if self.status == 'done':
+            return 1.0
+        if self.start_message_id is None or self.last_message_id is None:
+            return 0.0
+        start = snowflake_time(self.start_message_id).timestamp()
+        end = snowflake_time(self.end_message_id).timestamp()
+        current = snowflake_time(self.last_message_id).timestamp()
+        if end <= start:
+            return 1.0
+        return min(max((current - start) / (end - start), 0.0), 1.0)
+
+    def eta_seconds(self) -> Optional[float]:
+        """按本次运行的推进速度估算剩余秒数"""
+        done = self.progress() - self.session_progress
+        elapsed = time.monotonic() - self.session_started
+        if done <= 0 or elapsed <= 0:
+            return None
+        return (1.0 - self.progress()) * elapsed / done
+
+class BackfillManager:
+    """把源频道的历史消息分页补发到目标频道；断点写入数据库，重启后继续
+
+    发送速度受 rate 限制，且目标webhook有实时消息排队时先让路，不影响正常转发。
+    """
+
+    def __init__(self, db: BridgeDatabase,
+                 forward: Callable[[str, discord.Message], Awaitable[bool]],
+                 busy: Callable[[str], bool],
+                 rate: float = 1.0, report_every: int = 50):
+        # forward(bridge_name, message)：按桥接规则转发一条历史消息，返回是否发送
+        # busy(bridge_name)：目标webhook是否还有实时消息在排队
+        self.db = db
+        self.forward = forward
+        self.busy = busy
+        self.rate = rate
+        self.report_every = report_every
+
+        self._jobs: Dict[str, BackfillJob] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def is_running(self, bridge_name: str) -> bool:
+        task = self._tasks.get(bridge_name)
+        return task is not None and not task.done()
+
+    async def start(self, bridge_name: str, channel: discord.abc.Messageable,
+                    admin_user_id: Optional[int] = None) -> BackfillJob:
+        """开始回填：只补发开始时刻之前的消息，之后的消息由实时转发负责"""
+        job = BackfillJob(
+            bridge_name=bridge_name,
+            source_channel_id=channel.id,
+            end_message_id=time_snowflake(datetime.now(timezone.utc))
+        )
+        await self.db.run(self._insert, job, admin_user_id)
+        self._launch(job, channel)
+        return job
+
+    async def resume(self, channel_getter: Callable[[int], Optional[discord.abc.Messageable]]) -> int:
+        """重启后继续所有未完成的回填任务，返回恢复的任务数"""
+        resumed = 0
+        for job in await self.db.run(self._load_running):
+            if self.is_running(job.bridge_name):
+                continue
+            channel = channel_getter(job.source_channel_id)
+            if channel is None:
+                print(f"回填 {job.bridge_name}: 找不到源频道 {job.source_channel_id}，暂不恢复")
+                continue
+            self._launch(job, channel)
+            resumed += 1
+        return resumed
+
+    async def cancel(self, bridge_name: str) -> bool:
+        task = self._tasks.get(bridge_name)
+        if task is None or task.done():
+            return False
+        job = self._jobs[bridge_name]
+        job.status = 'cancelled'
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await self.db.run(self._checkpoint, job)
+        return True
+
+    async def discard(self, bridge_name: str):
+        """桥接被删除时停止其回填，不再写断点（记录由调用方随桥接配置一起删除）"""
+        self._jobs.pop(bridge_name, None)
+        task = self._tasks.pop(bridge_name, None)
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    @staticmethod
+    def delete_job(conn: sqlite3.Connection, bridge_name: str):
+        """删除桥接的回填记录（在调用方的事务中执行）"""
+        conn.execute('DELETE FROM bridge_backfill_jobs WHERE bridge_name = ?', (bridge_name,))
+
+    async def stop(self):
+        """关闭时停止所有回填，状态保持running以便下次启动继续"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def status(self, bridge_name: str) -> Optional[BackfillJob]:
+        job = self._jobs.get(bridge_name)
+        if job is not None:
+            return job
+        return await self.db.run(self._load, bridge_name)
+
+    def _launch(self, job: BackfillJob, channel: discord.abc.Messageable):
+        job.session_progress = job.progress()
+        job.session_started = time.monotonic()
+        self._jobs[job.bridge_name] = job
+        self._tasks[job.bridge_name] = asyncio.create_task(self._run(job, channel))
+
+    async def _run(self, job: BackfillJob, channel: discord.abc.Messageable):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.rate if self.rate > 0 else 0.0
+        after = discord.Object(job.last_message_id) if job.last_message_id else None
+        print(f"📥 开始回填 {job.bridge_name}（已复制 {job.copied} 条）")
+        scanned = 0
+
+        try:
+            # history 按每页100条分页请求，oldest_first 保证按时间顺序补发
+            async for message in channel.history(limit=None, after=after,
+                                                 before=discord.Object(job.end_message_id),
+                                                 oldest_first=True):
+                # 实时消息优先：目标webhook有排队时先等待
+                while self.busy(job.bridge_name):
+                    await asyncio.sleep(0.5)
+
+                started = loop.time()
+                if job.start_message_id is None:
+                    job.start_message_id = message.id
+                if await self.forward(job.bridge_name, message):
+                    job.copied += 1
+                job.last_message_id = message.id
+                await self.db.run(self._checkpoint, job)
+
+                scanned += 1
+                if scanned % self.report_every == 0:
+                    print(f"⏳ 回填 {job.bridge_name}: {self.describe(job)}")
+
+                await asyncio.sleep(max(0.0, interval - (loop.time() - started)))
+
+            job.status = 'done'
+            print(f"✅ 回填完成 {job.bridge_name}：共复制 {job.copied} 条消息")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)[:200]
+            print(f"回填 {job.bridge_name} 失败: {e}")
+        finally:
+            if job.status != 'running':
+                await self.db.run(self._checkpoint, job)
+
+    @staticmethod
+    def describe(job: BackfillJob) -> str:
+        """进度描述，例如 “42.0%，已复制 120 条，预计剩余 3 分钟”"""
+        text = f"{job.progress() * 100:.1f}%，已复制 {job.copied} 条"
+        eta = job.eta_seconds() if job.status == 'running' else None
+        if eta is not None:
+            text += f"，预计剩余 {round(eta)} 秒" if eta < 60 else f"，预计剩余 {round(eta / 60)} 分钟"
+        return text
+
+    @staticmethod
+    def _insert(conn: sqlite3.Connection, job: BackfillJob, admin_user_id: Optional[int]):
+        conn.execute('''
+            INSERT OR REPLACE INTO bridge_backfill_jobs
+            (bridge_name, source_channel_id, status, end_message_id, admin_user_id)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (job.bridge_name, job.source_channel_id, job.status, job.end_message_id, admin_user_id))
+
+    @staticmethod
+    def _checkpoint(conn: sqlite3.Connection, job: BackfillJob):
+        conn.execute('''
+            UPDATE bridge_backfill_jobs
+            SET status = ?, start_message_id = ?, last_message_id = ?, copied = ?, error = ?,
+                updated_time = CURRENT_TIMESTAMP
+            WHERE bridge_name = ?
+        ''', (job.status, job.start_message_id, job.last_message_id, job.copied, job.error,
+              job.bridge_name))
+
+    _COLUMNS = '''bridge_name, source_channel_id, end_message_id, status,
+                  start_message_id, last_message_id, copied, error'''
+
+    @classmethod
+    def _load_running(cls, conn: sqlite3.Connection) -> List[BackfillJob]:
+        rows = conn.execute(
+            f"SELECT {cls._COLUMNS} FROM bridge_backfill_jobs WHERE status = 'running'"
+        ).fetchall()
+        return [BackfillJob(*row) for row in rows]
+
+    @classmethod
+    def _load(cls, conn: sqlite3.Connection, bridge_name: str) -> Optional[BackfillJob]:
+        row = conn.execute(
+            f"SELECT {cls._COLUMNS} FROM bridge_backfill_jobs WHERE bridge_name = ?",
+            (bridge_name,)
+        ).fetchone()
+        return BackfillJob(*row) if row else None
@@ -0,0 +1,121 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+# Discord单条webhook消息的限制
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+
+COALESCE_MODES = ('off', 'author', 'digest')
+
+# (转发任务, 发件箱任务ID)
+JobPart = Tuple[Dict, Optional[int]]
+
+@dataclass
+class _Buffer:
+    mode: str
+    parts: List[JobPart] = field(default_factory=list)
+    lines: List[str] = field(default_factory=list)
+    length: int = 0
+    embeds: int = 0
+    timer: Optional[asyncio.Task] = None
+
+class ForwardCoalescer:
+    """把同一桥接短时间内的多条消息合并成一次webhook发送
+
+    author模式：同一作者的连续消息合并；digest模式：窗口内的所有消息合并为一条摘要。
+    合并结果不超过2000字符和10个嵌入。
+    """
+
+    def __init__(self, deliver: Callable[[Dict, Optional[int]], Awaitable[bool]]):
+        # deliver(job, job_id)：合并后的任务带有 'merged' 字段，包含所有原始任务
+        self._deliver = deliver
+        self._buffers: Dict[str, _Buffer] = {}
+        self._inflight: Set[asyncio.Task] = set()
+
+        self.coalesced_messages = 0
+        self.saved_calls = 0
+
+    def add(self, job: Dict, job_id: Optional[int], mode: str, window_ms: int):
+        """加入合并缓冲区，窗口结束或放不下时发送"""
+        bridge_name = job['bridge_name']
+        line = self._render(job, mode)
+
+        if len(line) > MAX_CONTENT_LENGTH or len(job['embeds']) > MAX_EMBEDS:
+            # 单条消息渲染后就放不下（如digest模式加上作者名前缀）：先发出缓冲区保持顺序，再按原内容单独发送
+            self._flush(bridge_name)
+            self._send(job, job_id)
+            return
+
+        buffer = self._buffers.get(bridge_name)
+        if buffer and not self._fits(buffer, job, line, mode):
+            self._flush(bridge_name)
+            buffer = None
+
+        if buffer is None:
+            buffer = self._buffers[bridge_name] = _Buffer(mode)
+            buffer.timer = asyncio.create_task(self._flush_later(bridge_name, buffer, window_ms / 1000))
+
+        buffer.length += len(line) + (1 if buffer.lines else 0)
+        buffer.lines.append(line)
+        buffer.embeds += len(job['embeds'])
+        buffer.parts.append((job, job_id))
+
+    async def flush_all(self):
+        """立即发送所有缓冲区并等待发送完成（关闭时调用）"""
+        for bridge_name in list(self._buffers):
+            self._flush(bridge_name)
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def pending(self) -> int:
+        return sum(len(buffer.parts) for buffer in self._buffers.values())
+
+    @staticmethod
+    def _render(job: Dict, mode: str) -> str:
+        if mode == 'digest':
+            return f"**{job['username']}**: {job['content']}"
+        return job['content']
+
+    def _fits(self, buffer: _Buffer, job: Dict, line: str, mode: str) -> bool:
+        if buffer.mode != mode:
+            return False
+        if mode == 'author' and buffer.parts[0][0]['author_id'] != job['author_id']:
+            return False
+        if buffer.length + 1 + len(line) > MAX_CONTENT_LENGTH:
+            return False
+        return buffer.embeds + len(job['embeds']) <= MAX_EMBEDS
+
+    async def _flush_later(self, bridge_name: str, buffer: _Buffer, delay: float):
+        await asyncio.sleep(delay)
+        if self._buffers.get(bridge_name) is buffer:
+            buffer.timer = None
+            self._flush(bridge_name)
+
+    def _flush(self, bridge_name: str):
+        buffer = self._buffers.pop(bridge_name, None)
+        if buffer is None:
+            return
+        if buffer.timer is not None:
+            buffer.timer.cancel()
+
+        if len(buffer.parts) == 1:
+            job, job_id = buffer.parts[0]
+        else:
+            first = buffer.parts[0][0]
+            job = dict(first)
+            job['content'] = "\n".join(buffer.lines)
+            job['embeds'] = [embed for part, _ in buffer.parts for embed in part['embeds']]
+            job['merged'] = buffer.parts
+            if buffer.mode == 'digest':
+                job['username'] = f"消息摘要 · {bridge_name}"[:80]
+                job['avatar_url'] = None
+            self.coalesced_messages += len(buffer.parts)
+            self.saved_calls += len(buffer.parts) - 1
+            job_id = None
+        self._send(job, job_id)
+
+    def _send(self, job: Dict, job_id: Optional[int]):
+        task = asyncio.create_task(self._deliver(job, job_id))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
@@ -0,0 +1,96 @@
+import asyncio
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+# 连接级别的PRAGMA：WAL让读写互不阻塞，NORMAL同步在WAL下足够安全
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+    'PRAGMA mmap_size = 134217728',
+)
+
+class BridgeDatabase:
+    """SQLite访问层：一个持久连接，所有查询在专用线程中执行，事件循环只等待结果"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        # 单线程执行器，连接始终只在这个线程里使用，查询天然串行
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bridge-db')
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.queries = 0
+        self.last_query_ms = 0.0
+        self.max_query_ms = 0.0
+
+    async def open(self):
+        """在数据库线程中建立连接并设置PRAGMA"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._connect)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self._close_connection)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """在数据库线程中执行 fn(conn, *args, **kwargs)；正常返回时提交，异常时回滚"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args, kwargs)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> int:
+        """执行一条写语句，返回受影响的行数"""
+        return await self.run(lambda conn: conn.execute(sql, params).rowcount)
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> int:
+        rows = list(seq_of_params)
+        return await self.run(lambda conn: conn.executemany(sql, rows).rowcount)
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        return await self.run(lambda conn: conn.execute(sql, params).fetchall())
+
+    def stats(self) -> dict:
+        return {
+            'queries': self.queries,
+            'last_query_ms': self.last_query_ms,
+            'max_query_ms': self.max_query_ms
+        }
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            for pragma in PRAGMAS:
+                self._conn.execute(pragma).fetchall()
+
+    def _call(self, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        self._connect()
+        start = time.perf_counter()
+        try:
+            result = fn(self._conn, *args, **kwargs)
+            if self._conn.in_transaction:
+                self._conn.commit()
+            return result
+        except Exception:
+            if self._conn.in_transaction:
+                self._conn.rollback()
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.last_query_ms = elapsed_ms
+            self.max_query_ms = max(self.max_query_ms, elapsed_ms)
+
+    def _close_connection(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,254 @@
+import asyncio
+import random
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, Optional
+
+import aiohttp
+
+def webhook_queue_key(url: str) -> str:
+    """webhook消息的编辑/删除和发送共用同一个队列，保证顺序"""
+    base = url.split('?', 1)[0]
+    if '/messages/' in base:
+        base = base.split('/messages/', 1)[0]
+    return base
+
+@dataclass
+class DeliveryResult:
+    """一次webhook请求的最终结果"""
+    status: int
+    data: Optional[Dict] = None
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status < 300
+
+@dataclass
+class _DeliveryJob:
+    method: str
+    url: str
+    payload: Optional[Dict]
+    params: Optional[Dict]
+    future: asyncio.Future
+    attempts: int = 0
+    rate_limited: int = 0
+
+@dataclass
+class _RateLimitBucket:
+    """Discord返回的限流桶状态（时间为事件循环时钟）"""
+    remaining: int = 1
+    reset_at: float = 0.0
+
+@dataclass
+class _WebhookQueue:
+    jobs: Deque[_DeliveryJob] = field(default_factory=deque)
+    task: Optional[asyncio.Task] = None
+    bucket: Optional[str] = None
+
+class WebhookScheduler:
+    """按webhook分队列的投递调度器：保持同一webhook内的顺序，遵守Discord限流"""
+
+    def __init__(self, session_getter: Callable[[], Optional[aiohttp.ClientSession]],
+                 max_retries: int = 5, max_rate_limit_retries: int = 20,
+                 base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self._session_getter = session_getter
+        self.max_retries = max_retries
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._queues: Dict[str, _WebhookQueue] = {}
+        self._buckets: Dict[str, _RateLimitBucket] = {}
+        self._global_reset_at = 0.0
+
+        # 运行统计
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.rate_limited = 0
+
+    def submit(self, method: str, url: str, payload: Optional[Dict] = None,
+               params: Optional[Dict] = None) -> asyncio.Future:
+        """加入对应webhook的队列，返回可等待的DeliveryResult"""
+        loop = asyncio.get_running_loop()
+        job = _DeliveryJob(method, url, payload, params, loop.create_future())
+
+        key = self._queue_key(url)
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = _WebhookQueue()
+        queue.jobs.append(job)
+
+        if queue.task is None or queue.task.done():
+            queue.task = asyncio.create_task(self._drain(key, queue))
+        return job.future
+
+    def queue_depths(self) -> Dict[str, int]:
+        """每个webhook队列中等待发送的请求数"""
+        return {key: len(queue.jobs) for key, queue in self._queues.items()}
+
+    def pending_for(self, url: str) -> int:
+        """指定webhook队列中等待发送的请求数"""
+        queue = self._queues.get(self._queue_key(url))
+        return len(queue.jobs) if queue else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queues': len(self._queues),
+            'pending': sum(len(queue.jobs) for queue in self._queues.values()),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'rate_limited': self.rate_limited
+        }
+
+    async def stop(self, timeout: float = 10.0):
+        """等待队列发送完毕，超时后取消剩余任务"""
+        tasks = [queue.task for queue in self._queues.values() if queue.task and not queue.task.done()]
+        if not tasks:
+            return
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        for queue in self._queues.values():
+            while queue.jobs:
+                job = queue.jobs.popleft()
+                if not job.future.done():
+                    job.future.set_result(DeliveryResult(0, attempts=job.attempts, error="调度器已停止"))
+
+    @staticmethod
+    def _queue_key(url: str) -> str:
+        return webhook_queue_key(url)
+
+    async def _drain(self, key: str, queue: _WebhookQueue):
+        """逐个发送队列中的请求，队列清空后退出"""
+        while queue.jobs:
+            job = queue.jobs[0]
+            try:
+                result = await self._deliver(job, queue)
+            except Exception as e:
+                result = DeliveryResult(0, attempts=job.attempts, error=str(e))
+
+            queue.jobs.popleft()
+            if result.ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+            if not job.future.done():
+                job.future.set_result(result)
+
+        if self._queues.get(key) is queue:
+            del self._queues[key]
+
+    async def _wait_for_capacity(self, queue: _WebhookQueue):
+        """全局限流和桶限流都放开后再发送"""
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            wait_until = self._global_reset_at
+            bucket = self._buckets.get(queue.bucket) if queue.bucket else None
+            if bucket and bucket.remaining <= 0 and bucket.reset_at > wait_until:
+                wait_until = bucket.reset_at
+            if wait_until <= now:
+                return
+            await asyncio.sleep(wait_until - now)
+            if bucket and loop.time() >= bucket.reset_at:
+                bucket.remaining = 1
+
+    def _backoff(self, attempt: int) -> float:
+        """指数退避加随机抖动"""
+        delay = min(self.max_backoff, self.base_backoff * (2 ** (attempt - 1)))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def _deliver(self, job: _DeliveryJob, queue: _WebhookQueue) -> DeliveryResult:
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wait_for_capacity(queue)
+
+            session = self._session_getter()
+            if session is None or session.closed:
+                return DeliveryResult(0, attempts=job.attempts, error="Webhook会话尚未就绪")
+
+            job.attempts += 1
+            rate_limit_wait = None
+            try:
+                async with session.request(job.method, job.url, json=job.payload, params=job.params) as response:
+                    self._update_bucket(queue, response.headers)
+                    status = response.status
+                    body = await self._read_json(response) if status != 204 else {}
+
+                    if status == 429:
+                        rate_limit_wait = self._retry_after(response.headers, body)
+                        if body.get('global') or response.headers.get('X-RateLimit-Global'):
+                            self._global_reset_at = max(self._global_reset_at, loop.time() + rate_limit_wait)
+                        elif queue.bucket:
+                            bucket = self._buckets.setdefault(queue.bucket, _RateLimitBucket())
+                            bucket.remaining = 0
+                            bucket.reset_at = max(bucket.reset_at, loop.time() + rate_limit_wait)
+                    elif 200 <= status < 300:
+                        return DeliveryResult(status, body, job.attempts)
+                    elif status < 500:
+                        # 4xx（404/401等）重试没有意义，交给调用方处理
+                        return DeliveryResult(status, body, job.attempts, f"HTTP {status}")
+                    error = f"HTTP {status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status = 0
+                body = None
+                error = str(e) or e.__class__.__name__
+
+            if rate_limit_wait is not None:
+                # 429：按Retry-After等待后重试，不占用普通重试次数
+                self.rate_limited += 1
+                job.rate_limited += 1
+                if job.rate_limited > self.max_rate_limit_retries:
+                    return DeliveryResult(status, body, job.attempts, "限流重试次数过多")
+                self.retries += 1
+                await asyncio.sleep(rate_limit_wait + random.uniform(0, 0.25))
+                continue
+
+            # 5xx或网络错误：退避后重试
+            if job.attempts > self.max_retries:
+                return DeliveryResult(status, body, job.attempts, error)
+            self.retries += 1
+            await asyncio.sleep(self._backoff(job.attempts))
+
+    def _update_bucket(self, queue: _WebhookQueue, headers):
+        """根据X-RateLimit-*响应头更新限流桶"""
+        bucket_id = headers.get('X-RateLimit-Bucket')
+        if bucket_id:
+            queue.bucket = bucket_id
+        if not queue.bucket:
+            return
+
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset_after = headers.get('X-RateLimit-Reset-After')
+        if remaining is None or reset_after is None:
+            return
+
+        try:
+            bucket = self._buckets.setdefault(queue.bucket, _RateLimitBucket())
+            bucket.remaining = int(remaining)
+            bucket.reset_at = asyncio.get_running_loop().time() + float(reset_after)
+        except ValueError:
+            pass
+
+    @staticmethod
+    def _retry_after(headers, body: Dict) -> float:
+        """429响应的等待时间（秒），优先使用JSON中的精确值"""
+        for value in (body.get('retry_after'), headers.get('Retry-After')):
+            try:
+                if value is not None:
+                    return max(0.0, float(value))
+            except (TypeError, ValueError):
+                continue
+        return 1.0
+
+    @staticmethod
+    async def _read_json(response: aiohttp.ClientResponse) -> Dict:
+        try:
+            data = await response.json(content_type=None)
+        except (aiohttp.ContentTypeError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
@@ -0,0 +1,67 @@
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+# (guild_id, channel_id)
+GroupMember = Tuple[int, int]
+
+def group_bridge_name(group_name: str, source_channel_id: int, target_channel_id: int) -> str:
+    """群组内每条“源频道 -> 目标频道”路由对应一个虚拟桥接名称（用于记录、统计和发件箱去重）"""
+    return f"{group_name}#{source_channel_id}→#{target_channel_id}"
+
+def build_group_configs(groups: Dict[str, List[GroupMember]], coalesce_window_ms: int) -> List[Dict]:
+    """把桥接群组展开成“源频道 -> 其他每个成员频道”的桥接配置"""
+    configs = []
+    for group_name, members in groups.items():
+        for source_guild_id, source_channel_id in members:
+            for target_guild_id, target_channel_id in members:
+                if target_channel_id == source_channel_id:
+                    continue
+                configs.append({
+                    'bridge_name': group_bridge_name(group_name, source_channel_id, target_channel_id),
+                    'group_name': group_name,
+                    'source_guild_id': source_guild_id,
+                    'source_channel_id': source_channel_id,
+                    'target_guild_id': target_guild_id,
+                    'target_channel_id': target_channel_id,
+                    'webhook_url': None,
+                    'is_enabled': True,
+                    'audit_mode': False,
+                    'retention_days': None,
+                    'coalesce_mode': 'off',
+                    'coalesce_window_ms': coalesce_window_ms
+                })
+    return configs
+
+class SeenMessageCache:
+    """有容量上限、按时间过期的消息ID集合，用于防止回环和重复处理"""
+
+    def __init__(self, max_size: int = 50000, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._expires: "OrderedDict[int, float]" = OrderedDict()
+
+    def add(self, message_id: int):
+        self._expires[message_id] = time.monotonic() + self.ttl
+        self._expires.move_to_end(message_id)
+        while len(self._expires) > self.max_size:
+            self._expires.popitem(last=False)
+
+    def check_and_add(self, message_id: int) -> bool:
+        """已见过返回True；否则记录下来并返回False"""
+        if message_id in self:
+            return True
+        self.add(message_id)
+        return False
+
+    def __contains__(self, message_id: int) -> bool:
+        expires = self._expires.get(message_id)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del self._expires[message_id]
+            return False
+        return True
+
+    def __len__(self) -> int:
+        return len(self._expires)
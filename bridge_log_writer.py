@@ -0,0 +1,189 @@
+import asyncio
+import sqlite3
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, List, Optional, Tuple
+
+from bridge_db import BridgeDatabase
+
+# 单条转发记录：(bridge_name, original_message_id, forwarded_message_id,
+#               author_id, author_name, content, timestamp)
+LogRow = Tuple[str, int, int, int, str, str, str]
+
+# 停止信号
+_STOP = object()
+
+class ForwardLogWriter:
+    """后台批量写入转发记录，攒够N条或等待T毫秒后统一提交"""
+
+    def __init__(self, db: BridgeDatabase, batch_size: int = 200, flush_interval: float = 0.5,
+                 on_flush: Optional[Callable[[float, int], None]] = None, max_retry_rows: int = 10000):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # on_flush(耗时毫秒, 行数)：每批提交成功后调用，用于上报指标
+        self.on_flush = on_flush
+        # 提交失败后留待重试的记录上限，超出部分（最新的记录）才会丢弃
+        self.max_retry_rows = max_retry_rows
+
+        self._queue: asyncio.Queue = asyncio.Queue()
+        # 提交失败的记录，下一批时排在最前面重新提交
+        self._retry: List[LogRow] = []
+        self._task: Optional[asyncio.Task] = None
+        self._stop_requested = False
+
+        # 运行统计
+        self.rows_written = 0
+        self.batches_written = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self.total_flush_ms = 0.0
+        self.failed_batches = 0
+        self.rows_dropped = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """等待写入的记录数（包括等待重试的）"""
+        return self._queue.qsize() + len(self._retry)
+
+    def submit(self, bridge_name: str, original_msg_id: int, forwarded_msg_id: int,
+               author_id: int, author_name: str, content: str):
+        """提交一条转发记录（不阻塞事件循环）"""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._queue.put_nowait((
+            bridge_name, original_msg_id, forwarded_msg_id,
+            author_id, author_name, (content or '')[:500], timestamp
+        ))
+
+    def start(self):
+        """启动后台写入任务"""
+        if self._task is None or self._task.done():
+            self._stop_requested = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并写入队列中剩余的记录"""
+        if self._task:
+            # 哨兵排在所有已提交记录之后，后台任务写完它们再退出
+            self._stop_requested = True
+            self._queue.put_nowait(_STOP)
+            await self._task
+            self._task = None
+
+    def stats(self) -> dict:
+        """返回写入队列深度和提交耗时"""
+        return {
+            'queue_depth': self.queue_depth,
+            'rows_written': self.rows_written,
+            'batches_written': self.batches_written,
+            'last_flush_ms': self.last_flush_ms,
+            'max_flush_ms': self.max_flush_ms,
+            'total_flush_ms': self.total_flush_ms,
+            'failed_batches': self.failed_batches,
+            'rows_dropped': self.rows_dropped
+        }
+
+    async def _run(self):
+        """按数量或时间窗口攒批后提交；提交失败的批次等一个窗口后与新记录一起重试"""
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            if self._retry:
+                rows, self._retry = self._retry, []
+            else:
+                row = await self._queue.get()
+                if row is _STOP:
+                    break
+                rows = [row]
+            deadline = loop.time() + self.flush_interval
+
+            while len(rows) < self.batch_size:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                rows.append(row)
+
+            if not await self._flush(rows):
+                if self._stop_requested:
+                    break
+                # 数据库暂时不可用：等一个窗口再重试，不要连续重试
+                await asyncio.sleep(self.flush_interval)
+
+        # 停止时把等待重试的和仍在排队的记录最后提交一次
+        rows, self._retry = self._retry, []
+        while not self._queue.empty():
+            row = self._queue.get_nowait()
+            if row is not _STOP:
+                rows.append(row)
+        if rows and not await self._flush(rows):
+            self.rows_dropped += len(self._retry)
+            print(f"⚠️ 停止时仍有 {len(self._retry)} 条转发记录未能写入")
+            self._retry = []
+
+    async def _flush(self, rows: List[LogRow]) -> bool:
+        """在数据库线程中提交一批记录；失败时整批放回重试队列的最前面"""
+        start = time.perf_counter()
+        try:
+            await self.db.run(self._write_batch, rows)
+        except Exception as e:
+            print(f"批量写入转发记录失败（{len(rows)} 条），稍后重试: {e}")
+            self.failed_batches += 1
+            # 整批在同一事务中回滚，记录和统计汇总不会只写一半；保留最早的记录，保持写入顺序
+            self._retry = rows[:self.max_retry_rows]
+            dropped = len(rows) - len(self._retry)
+            if dropped:
+                self.rows_dropped += dropped
+                print(f"⚠️ 重试队列已满，丢弃 {dropped} 条转发记录")
+            return False
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self.total_flush_ms += elapsed_ms
+        self.rows_written += len(rows)
+        self.batches_written += 1
+        if self.on_flush:
+            self.on_flush(elapsed_ms, len(rows))
+        return True
+
+    @staticmethod
+    def _write_batch(conn: sqlite3.Connection, rows: List[LogRow]):
+        """executemany + 单次commit，同一事务内累加统计汇总表"""
+        # 时间戳格式为 'YYYY-MM-DD HH:MM:SS'（UTC）
+        hourly = Counter((row[0], row[6][:13]) for row in rows)
+        daily = Counter((row[0], row[6][:10]) for row in rows)
+        totals = Counter(row[0] for row in rows)
+
+        with conn:
+            conn.executemany('''
+                INSERT INTO forwarded_messages
+                (bridge_name, original_message_id, forwarded_message_id,
+                 author_id, author_name, content, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+            conn.executemany('''
+                INSERT INTO bridge_stats_hourly (bridge_name, hour, message_count)
+                VALUES (?, ?, ?)
+                ON CONFLICT(bridge_name, hour) DO UPDATE
+                SET message_count = message_count + excluded.message_count
+            ''', [(bridge, hour, count) for (bridge, hour), count in hourly.items()])
+            conn.executemany('''
+                INSERT INTO bridge_stats_daily (bridge_name, day, message_count)
+                VALUES (?, ?, ?)
+                ON CONFLICT(bridge_name, day) DO UPDATE
+                SET message_count = message_count + excluded.message_count
+            ''', [(bridge, day, count) for (bridge, day), count in daily.items()])
+            conn.executemany('''
+                INSERT INTO bridge_stats_totals (bridge_name, message_count)
+                VALUES (?, ?)
+                ON CONFLICT(bridge_name) DO UPDATE
+                SET message_count = message_count + excluded.message_count
+            ''', list(totals.items()))
@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# 关键词不超过这个数量时逐个用 str.find 扫描（C实现，小列表比逐字符走自动机快），
+# 超过后才构建Aho-Corasick自动机；分界点见 bench_violation_matcher.py
+LINEAR_SCAN_MAX_KEYWORDS = 100
+
+class KeywordMatch(NamedTuple):
+    """一次关键词命中，rule为关键词在构建列表中的序号"""
+    rule: int
+    keyword: str
+    category: str
+    start: int
+    end: int
+
+class KeywordMatcher:
+    """多模式关键词匹配器：一次调用找出所有命中的关键词及其类别
+
+    关键词少时逐个 str.find，多时用Aho-Corasick自动机一次扫描，结果相同。
+    关键词和消息都按小写匹配，构建完成后只读，可以在多个协程间共享。
+    """
+
+    def __init__(self, rules: Iterable[Tuple[str, str]], linear_max: int = LINEAR_SCAN_MAX_KEYWORDS):
+        # goto[state] 为该状态的字符转移表，fail为失败指针，output为以该状态结尾的(序号, 关键词, 类别)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[Tuple[int, str, str], ...]] = [()]
+        # (序号, 关键词, 类别, 小写关键词)，逐个扫描时使用
+        self._keywords: List[Tuple[int, str, str, str]] = []
+
+        seen = set()
+        for rule, (keyword, category) in enumerate(rules):
+            key = keyword.lower()
+            if not key or (key, category) in seen:
+                continue
+            seen.add((key, category))
+            self._keywords.append((rule, keyword, category, key))
+        self._keys = [key for _, _, _, key in self._keywords]
+        self.size = len(self._keywords)
+        self.linear = self.size <= linear_max
+        if not self.linear:
+            self._build_automaton()
+
+    def _build_automaton(self):
+        pending: Dict[int, List[Tuple[int, str, str]]] = {}
+        for rule, keyword, category, key in self._keywords:
+            state = 0
+            for ch in key:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = nxt
+            pending.setdefault(state, []).append((rule, keyword, category))
+
+        for state, outputs in pending.items():
+            self._output[state] = tuple(outputs)
+        self._build_fail_links()
+        # 所有关键词中出现过的字符，其他字符直接回到根节点
+        self._alphabet = frozenset(ch for table in self._goto for ch in table)
+
+    def _build_fail_links(self):
+        """BFS计算失败指针，并把后缀状态的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                if self._output[self._fail[nxt]]:
+                    self._output[nxt] = self._output[nxt] + self._output[self._fail[nxt]]
+
+    def scan(self, text: str) -> List[KeywordMatch]:
+        """返回文本中所有命中（按结束位置排序）"""
+        if not text or not self.size:
+            return []
+        if self.linear:
+            return self._scan_linear(text.lower())
+
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        alphabet = self._alphabet
+
+        matches = []
+        state = 0
+        for index, ch in enumerate(text.lower()):
+            if ch not in alphabet:
+                state = 0
+                continue
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                for rule, keyword, category in output[state]:
+                    matches.append(KeywordMatch(rule, keyword, category, index + 1 - len(keyword), index + 1))
+        return matches
+
+    def first(self, text: str) -> Optional[KeywordMatch]:
+        """返回序号最小的一条命中；逐个扫描时按序号检查，遇到第一条就返回"""
+        if not text or not self.size:
+            return None
+        if not self.linear:
+            matches = self.scan(text)
+            return min(matches, key=lambda match: match.rule) if matches else None
+
+        text = text.lower()
+        for index, key in enumerate(self._keys):
+            # 先用 in 判断（比调用find快），命中后才取位置
+            if key in text:
+                rule, keyword, category, _ = self._keywords[index]
+                start = text.find(key)
+                return KeywordMatch(rule, keyword, category, start, start + len(key))
+        return None
+
+    def _scan_linear(self, text: str) -> List[KeywordMatch]:
+        matches = []
+        for rule, keyword, category, key in self._keywords:
+            if key not in text:
+                continue
+            start = text.find(key)
+            while start != -1:
+                matches.append(KeywordMatch(rule, keyword, category, start, start + len(key)))
+                start = text.find(key, start + 1)
+        if len(matches) > 1:
+            matches.sort(key=lambda match: match.end)
+        return matches
@@ -0,0 +1,63 @@
+import sqlite3
+from collections import OrderedDict
+from typing import List, Tuple
+
+from bridge_db import BridgeDatabase
+
+# (bridge_name, forwarded_message_id)
+ForwardedCopy = Tuple[str, int]
+
+class ForwardedMessageMap:
+    """原消息ID -> 转发副本的映射：最近的消息走内存LRU，其余走带索引的数据库查询"""
+
+    def __init__(self, db: BridgeDatabase, max_size: int = 10000):
+        self.db = db
+        self.max_size = max_size
+        self._cache: "OrderedDict[int, List[ForwardedCopy]]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def remember(self, original_msg_id: int, bridge_name: str, forwarded_msg_id: int):
+        """记录一条刚转发的消息（在写入数据库前就能被编辑/删除找到）"""
+        copies = self._cache.get(original_msg_id)
+        if copies is None:
+            copies = self._cache[original_msg_id] = []
+        else:
+            self._cache.move_to_end(original_msg_id)
+        if (bridge_name, forwarded_msg_id) not in copies:
+            copies.append((bridge_name, forwarded_msg_id))
+        self._evict()
+
+    def forget(self, original_msg_id: int):
+        """原消息删除后移除映射"""
+        self._cache.pop(original_msg_id, None)
+
+    async def lookup(self, original_msg_id: int) -> List[ForwardedCopy]:
+        """查找原消息的所有转发副本"""
+        copies = self._cache.get(original_msg_id)
+        if copies is not None:
+            self._cache.move_to_end(original_msg_id)
+            self.hits += 1
+            return list(copies)
+
+        self.misses += 1
+        copies = await self.db.run(self._query, original_msg_id)
+        if copies:
+            self._cache[original_msg_id] = copies
+            self._evict()
+        return list(copies)
+
+    def _evict(self):
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    @staticmethod
+    def _query(conn: sqlite3.Connection, original_msg_id: int) -> List[ForwardedCopy]:
+        # 使用idx_forwarded_original索引，日志表再大也是O(log n)
+        rows = conn.execute('''
+            SELECT bridge_name, forwarded_message_id
+            FROM forwarded_messages
+            WHERE original_message_id = ? AND forwarded_message_id IS NOT NULL
+        ''', (original_msg_id,)).fetchall()
+        return [(bridge_name, int(forwarded_id)) for bridge_name, forwarded_id in rows]
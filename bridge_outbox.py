@@ -0,0 +1,283 @@
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+class ForwardOutbox:
+    """持久化的转发发件箱：发送前先落盘，成功后删除，重启后按原顺序重放未完成的任务
+
+    连接只在发件箱自己的线程中使用，所有方法都是协程，SQLite调用（包括提交时的fsync和
+    检查点）不占用事件循环。未完成/已放弃的任务数在同一线程中随写入维护，stats() 不查询数据库。
+    失败的任务按指数退避等待，由 OutboxRetrier 在运行期间重发。
+    """
+
+    def __init__(self, db_path: str, max_attempts: int = 5, retry_delay: float = 30.0,
+                 max_retry_delay: float = 3600.0, claim_timeout: float = 1800.0):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        # 第n次失败后等待 retry_delay * 2^(n-1) 秒再重发，最多等待 max_retry_delay 秒
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # 正在发送（或在合并缓冲区中）的任务ID -> 领取时间，重发时跳过；
+        # 超过 claim_timeout 还没有结果的视为丢失，允许重发
+        self.claim_timeout = claim_timeout
+        self._inflight: Dict[int, float] = {}
+        # 单线程执行器，写入天然串行；不与 bridge_config.db 的线程共用，入队不排在慢查询后面
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+
+        self.pending_count = 0
+        self.failed_count = 0
+        self.enqueued = 0
+        self.duplicates = 0
+        self.retried = 0
+        self.last_enqueue_ms = 0.0
+        self.max_enqueue_ms = 0.0
+        self.total_enqueue_ms = 0.0
+
+    async def open(self):
+        """在发件箱线程中打开数据库；WAL + synchronous=NORMAL 让每次入队只是一次追加写"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bridge-outbox')
+        await self._call(self._open)
+
+    async def close(self):
+        if self._executor is None:
+            return
+        await self._call(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+    async def enqueue(self, bridge_name: str, original_message_id: int, job: Dict) -> Optional[int]:
+        """写入一个转发任务，返回任务ID；同一桥接的同一条原消息还未完成时返回None
+
+        之前已放弃（failed）的同一条消息视为重新转发（如回填），替换为新的待发送任务。
+        """
+        return await self._call(self._enqueue, bridge_name, original_message_id, job)
+
+    async def complete(self, job_ids: Iterable[int]):
+        """发送成功，在一个事务中删除这些任务"""
+        await self._call(self._complete, list(job_ids))
+
+    async def fail(self, job_ids: Iterable[int], permanent: bool = False):
+        """记录一次失败；永久失败或超过最大次数后不再重放"""
+        await self._call(self._fail, list(job_ids), permanent)
+
+    async def pending(self) -> List[Tuple[int, Dict]]:
+        """按入队顺序返回所有未完成的任务，并标记为正在发送"""
+        return await self._call(self._pending)
+
+    async def due(self, limit: int = 100) -> List[Tuple[int, Dict]]:
+        """按入队顺序返回已到重发时间、且不在发送中的未完成任务，并标记为正在发送"""
+        return await self._call(self._due, limit)
+
+    def retry_backoff(self, attempts: int) -> float:
+        """第attempts次失败后距离下次重发的秒数"""
+        return min(self.retry_delay * 2 ** max(attempts - 1, 0), self.max_retry_delay)
+
+    def stats(self) -> Dict:
+        return {
+            'pending': self.pending_count,
+            'failed': self.failed_count,
+            'enqueued': self.enqueued,
+            'duplicates': self.duplicates,
+            'retried': self.retried,
+            'inflight': len(self._inflight),
+            'last_enqueue_ms': self.last_enqueue_ms,
+            'max_enqueue_ms': self.max_enqueue_ms,
+            'total_enqueue_ms': self.total_enqueue_ms
+        }
+
+    async def _call(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # 以下方法只在发件箱线程中执行
+
+    def _open(self):
+        if self._conn is not None:
+            return
+        self._conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode = WAL')
+        self._conn.execute('PRAGMA synchronous = NORMAL')
+        self._conn.execute('''
+            CREATE TABLE IF NOT EXISTS outbox_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bridge_name TEXT NOT NULL,
+                original_message_id INTEGER NOT NULL,
+                job TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (bridge_name, original_message_id)
+            )
+        ''')
+        # 旧版本的发件箱没有重发时间，已有任务视为立即到期
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(outbox_jobs)')}
+        if 'next_attempt_time' not in columns:
+            self._conn.execute('ALTER TABLE outbox_jobs ADD COLUMN next_attempt_time REAL NOT NULL DEFAULT 0')
+        self.pending_count, self.failed_count = self._conn.execute('''
+            SELECT COALESCE(SUM(status = 'pending'), 0), COALESCE(SUM(status = 'failed'), 0)
+            FROM outbox_jobs
+        ''').fetchone()
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _enqueue(self, bridge_name: str, original_message_id: int, job: Dict) -> Optional[int]:
+        start = time.perf_counter()
+        conn = self._conn
+        conn.execute('BEGIN')
+        try:
+            replaced = conn.execute('''
+                DELETE FROM outbox_jobs
+                WHERE bridge_name = ? AND original_message_id = ? AND status = 'failed'
+            ''', (bridge_name, original_message_id)).rowcount
+            # 正常情况下任务很快完成；进程内丢失结果时最早在一个重发间隔后由重发任务接手
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO outbox_jobs (bridge_name, original_message_id, job, next_attempt_time)
+                VALUES (?, ?, ?, ?)
+            ''', (bridge_name, original_message_id, json.dumps(job, ensure_ascii=False),
+                  time.time() + self.retry_delay))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_enqueue_ms = elapsed_ms
+        self.max_enqueue_ms = max(self.max_enqueue_ms, elapsed_ms)
+        self.total_enqueue_ms += elapsed_ms
+        self.failed_count -= replaced
+
+        if cursor.rowcount == 0:
+            self.duplicates += 1
+            return None
+        self.enqueued += 1
+        self.pending_count += 1
+        self._inflight[cursor.lastrowid] = time.monotonic()
+        return cursor.lastrowid
+
+    def _complete(self, job_ids: List[int]):
+        if self._conn is None or not job_ids:
+            return
+        self._update(job_ids, lambda status, attempts: None)
+
+    def _fail(self, job_ids: List[int], permanent: bool):
+        if self._conn is None or not job_ids:
+            return
+        now = time.time()
+
+        def transition(status: str, attempts: int):
+            attempts += 1
+            if permanent or attempts >= self.max_attempts:
+                return 'failed', attempts, 0
+            return 'pending', attempts, now + self.retry_backoff(attempts)
+
+        self._update(job_ids, transition)
+
+    def _update(self, job_ids: List[int], transition):
+        """在一个事务中按 transition(status, attempts) 更新任务，同时维护计数
+
+        transition 返回 (状态, 尝试次数, 下次重发时间)，返回None表示删除。有了结果的任务不再处于发送中。
+        """
+        for job_id in job_ids:
+            self._inflight.pop(job_id, None)
+        conn = self._conn
+        counts = {'pending': 0, 'failed': 0}
+        conn.execute('BEGIN')
+        try:
+            for job_id in job_ids:
+                row = conn.execute('SELECT status, attempts FROM outbox_jobs WHERE id = ?', (job_id,)).fetchone()
+                if row is None:
+                    continue
+                status, attempts = row
+                new = transition(status, attempts)
+                counts[status] -= 1
+                if new is None:
+                    conn.execute('DELETE FROM outbox_jobs WHERE id = ?', (job_id,))
+                    continue
+                conn.execute('UPDATE outbox_jobs SET status = ?, attempts = ?, next_attempt_time = ? WHERE id = ?',
+                             (*new, job_id))
+                counts[new[0]] += 1
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        self.pending_count += counts['pending']
+        self.failed_count += counts['failed']
+
+    def _pending(self) -> List[Tuple[int, Dict]]:
+        rows = self._conn.execute('''
+            SELECT id, job FROM outbox_jobs
+            WHERE status = 'pending'
+            ORDER BY id
+        ''').fetchall()
+        return self._claim(rows)
+
+    def _due(self, limit: int) -> List[Tuple[int, Dict]]:
+        stale = time.monotonic() - self.claim_timeout
+        for job_id in [job_id for job_id, claimed in self._inflight.items() if claimed < stale]:
+            del self._inflight[job_id]
+        # 多取正在发送的数量，跳过它们后仍能凑够一批
+        rows = self._conn.execute('''
+            SELECT id, job FROM outbox_jobs
+            WHERE status = 'pending' AND next_attempt_time <= ?
+            ORDER BY id
+            LIMIT ?
+        ''', (time.time(), limit + len(self._inflight))).fetchall()
+        jobs = self._claim([row for row in rows if row[0] not in self._inflight][:limit])
+        self.retried += len(jobs)
+        return jobs
+
+    def _claim(self, rows: List[Tuple[int, str]]) -> List[Tuple[int, Dict]]:
+        now = time.monotonic()
+        for job_id, _ in rows:
+            self._inflight[job_id] = now
+        return [(job_id, json.loads(job)) for job_id, job in rows]
+
+class OutboxRetrier:
+    """运行期间定期重发发件箱中已到重发时间的任务，Discord长时间故障恢复后不需要重启机器人"""
+
+    def __init__(self, outbox: ForwardOutbox,
+                 redeliver: Callable[[List[Tuple[int, Dict]]], Awaitable[None]],
+                 interval: float = 10.0, batch_size: int = 100):
+        # redeliver(jobs)：按顺序重发一批 (任务ID, 任务)，成功或失败都会通过 complete/fail 写回发件箱
+        self.outbox = outbox
+        self.redeliver = redeliver
+        self.interval = interval
+        self.batch_size = batch_size
+
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                print(f"重发发件箱任务失败: {e}")
+
+    async def run_once(self) -> int:
+        """重发一批到期的任务，返回任务数"""
+        jobs = await self.outbox.due(self.batch_size)
+        if jobs:
+            await self.redeliver(jobs)
+        return len(jobs)
@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from bridge_db import BridgeDatabase
+
+class RetentionManager:
+    """按桥接保留策略把过期的转发记录分批归档到压缩文件，并增量回收数据库空间"""
+
+    def __init__(self, db: BridgeDatabase, archive_dir: str,
+                 policy_getter: Callable[[], Dict[str, Optional[int]]],
+                 default_days: int = 0, batch_size: int = 500,
+                 interval: float = 3600.0, vacuum_pages: int = 1000):
+        # policy_getter() 返回 {bridge_name: retention_days}，None表示使用默认值，0表示永久保留
+        self.db = db
+        self.archive_dir = archive_dir
+        self.policy_getter = policy_getter
+        self.default_days = default_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+
+        self._task: Optional[asyncio.Task] = None
+
+        self.archived_rows = 0
+        self.last_run: Optional[str] = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                archived = await self.run_once()
+                if archived:
+                    print(f"🗄️ 已归档 {archived} 条过期转发记录")
+            except Exception as e:
+                print(f"归档转发记录失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def retention_days(self, bridge_name: str, policies: Dict[str, Optional[int]]) -> int:
+        days = policies.get(bridge_name)
+        return self.default_days if days is None else days
+
+    async def run_once(self) -> int:
+        """执行一轮归档，返回归档的记录数"""
+        policies = self.policy_getter()
+        bridge_names = await self.db.run(self._logged_bridges)
+        now = datetime.now(timezone.utc)
+
+        total = 0
+        for bridge_name in bridge_names:
+            days = self.retention_days(bridge_name, policies)
+            if days <= 0:
+                continue
+            cutoff = (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+            while True:
+                # 每批单独一个短事务，批次之间让出写锁给日志写入器
+                moved = await self.db.run(self._archive_batch, bridge_name, cutoff)
+                total += moved
+                if moved < self.batch_size:
+                    break
+                await asyncio.sleep(0.05)
+
+        if total:
+            await self.db.run(self._incremental_vacuum)
+        self.archived_rows += total
+        self.last_run = now.strftime('%Y-%m-%d %H:%M:%S')
+        return total
+
+    @staticmethod
+    def _logged_bridges(conn: sqlite3.Connection) -> List[str]:
+        # 汇总表里有所有出现过的桥接名称，避免扫描日志表
+        return [row[0] for row in conn.execute('SELECT bridge_name FROM bridge_stats_totals')]
+
+    def _archive_path(self, bridge_name: str, timestamp: str) -> str:
+        safe_name = ''.join(ch if ch.isalnum() or ch in '-_' else '_' for ch in bridge_name)
+        return os.path.join(self.archive_dir, f"{safe_name}_{timestamp[:7]}.jsonl.gz")
+
+    def _archive_batch(self, conn: sqlite3.Connection, bridge_name: str, cutoff: str) -> int:
+        """归档一批过期记录：先追加写入压缩文件，再按ID删除"""
+        rows = conn.execute('''
+            SELECT id, bridge_name, original_message_id, forwarded_message_id,
+                   author_id, author_name, content, timestamp
+            FROM forwarded_messages
+            WHERE bridge_name = ? AND timestamp < ?
+            ORDER BY timestamp
+            LIMIT ?
+        ''', (bridge_name, cutoff, self.batch_size)).fetchall()
+        if not rows:
+            return 0
+
+        os.makedirs(self.archive_dir, exist_ok=True)
+        by_file: Dict[str, List[str]] = {}
+        for row in rows:
+            record = {
+                'id': row[0], 'bridge_name': row[1], 'original_message_id': row[2],
+                'forwarded_message_id': row[3], 'author_id': row[4], 'author_name': row[5],
+                'content': row[6], 'timestamp': row[7]
+            }
+            by_file.setdefault(self._archive_path(bridge_name, row[7]), []).append(
+                json.dumps(record, ensure_ascii=False)
+            )
+        # gzip支持多段追加，每批写成一个独立的压缩段
+        for path, lines in by_file.items():
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                archive.write('\n'.join(lines) + '\n')
+
+        with conn:
+            conn.executemany('DELETE FROM forwarded_messages WHERE id = ?', [(row[0],) for row in rows])
+        return len(rows)
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection):
+        conn.execute(f'PRAGMA incremental_vacuum({int(self.vacuum_pages)})').fetchall()
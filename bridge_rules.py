@@ -0,0 +1,217 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Tuple
+
+import discord
+
+from bridge_matcher import KeywordMatcher
+
+try:
+    import re._parser as _sre_parse
+    from re._constants import LITERAL as _LITERAL
+except ImportError:  # Python 3.10及以下
+    import sre_parse as _sre_parse
+    from sre_constants import LITERAL as _LITERAL
+
+# 规则类型 -> 说明
+RULE_TYPES = {
+    'include_author': "只转发这些用户的消息",
+    'exclude_author': "不转发这些用户的消息",
+    'include_role': "只转发带有这些身份组的成员的消息",
+    'exclude_role': "不转发带有这些身份组的成员的消息",
+    'include_regex': "只转发匹配正则表达式的消息",
+    'exclude_regex': "不转发匹配正则表达式的消息",
+    'attachments_only': "只转发带附件的消息",
+    'min_length': "只转发文字长度不少于N的消息",
+}
+
+@dataclass
+class BridgeRule:
+    id: int
+    bridge_name: str
+    rule_type: str
+    value: str
+
+def normalize_rule_value(rule_type: str, value: Optional[str]) -> str:
+    """校验并规范化规则值，无效时抛出ValueError"""
+    value = (value or '').strip()
+    if rule_type not in RULE_TYPES:
+        raise ValueError(f"未知的规则类型: {rule_type}")
+    if rule_type in ('include_author', 'exclude_author', 'include_role', 'exclude_role'):
+        # 支持直接粘贴 <@123> / <@&123> 形式的提及
+        digits = re.sub(r'\D', '', value)
+        if not digits:
+            raise ValueError("需要填写用户ID或身份组ID")
+        return digits
+    if rule_type in ('include_regex', 'exclude_regex'):
+        if not value:
+            raise ValueError("需要填写正则表达式")
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise ValueError(f"无效的正则表达式: {e}")
+        return value
+    if rule_type == 'min_length':
+        if not value.isdigit():
+            raise ValueError("需要填写非负整数")
+        return value
+    return ''
+
+# 正则数量超过这个值才启用字面量预筛
+PREFILTER_MIN_RULES = 8
+
+def _required_literal(pattern: str) -> str:
+    """取出正则顶层必须出现的最长连续字面量（小写），取不到时返回空串"""
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except Exception:
+        return ''
+    best, run = '', []
+    for op, arg in list(parsed) + [(None, None)]:
+        if op == _LITERAL:
+            run.append(chr(arg))
+            continue
+        if len(run) > len(best):
+            best = ''.join(run)
+        run = []
+    # 个别字符小写后长度会变，无法保证和忽略大小写的正则一致，放弃预筛
+    lowered = best.lower()
+    return lowered if len(lowered) == len(best) else ''
+
+class _RegexSet:
+    """一组正则：先用Aho-Corasick按各条正则必须包含的字面量一次扫描预筛，只运行可能命中的正则"""
+
+    def __init__(self, rules: List[BridgeRule]):
+        self._patterns: Dict[int, Pattern] = {}
+        self._order: Dict[int, int] = {}
+        # 提取不出字面量的正则每条消息都要运行
+        self._always: List[int] = []
+        literals: List[Tuple[str, str]] = []
+        for index, rule in enumerate(rules):
+            self._patterns[rule.id] = re.compile(rule.value, re.IGNORECASE)
+            self._order[rule.id] = index
+            # 规则很少时逐条运行正则比纯Python扫描更快
+            literal = _required_literal(rule.value) if len(rules) > PREFILTER_MIN_RULES else ''
+            if literal:
+                literals.append((literal, str(rule.id)))
+            else:
+                self._always.append(rule.id)
+        self._matcher = KeywordMatcher(literals)
+
+    def __bool__(self) -> bool:
+        return bool(self._patterns)
+
+    def search(self, text: str) -> Optional[int]:
+        """返回第一条命中的规则ID（按规则添加顺序）"""
+        candidates = set(self._always)
+        candidates.update(int(match.category) for match in self._matcher.scan(text))
+        for rule_id in sorted(candidates, key=self._order.__getitem__):
+            if self._patterns[rule_id].search(text):
+                return rule_id
+        return None
+
+class CompiledRules:
+    """一个桥接的全部规则编译成的判定函数，规则越多判定开销也基本不变"""
+
+    def __init__(self, rules: Iterable[BridgeRule]):
+        self.include_authors: Dict[int, int] = {}
+        self.exclude_authors: Dict[int, int] = {}
+        self.include_roles: Dict[int, int] = {}
+        self.exclude_roles: Dict[int, int] = {}
+        include_regex: List[BridgeRule] = []
+        exclude_regex: List[BridgeRule] = []
+        self.attachments_only: Optional[int] = None
+        self.min_length = 0
+        self.min_length_rule: Optional[int] = None
+
+        for rule in rules:
+            if rule.rule_type == 'include_author':
+                self.include_authors[int(rule.value)] = rule.id
+            elif rule.rule_type == 'exclude_author':
+                self.exclude_authors[int(rule.value)] = rule.id
+            elif rule.rule_type == 'include_role':
+                self.include_roles[int(rule.value)] = rule.id
+            elif rule.rule_type == 'exclude_role':
+                self.exclude_roles[int(rule.value)] = rule.id
+            elif rule.rule_type == 'include_regex':
+                include_regex.append(rule)
+            elif rule.rule_type == 'exclude_regex':
+                exclude_regex.append(rule)
+            elif rule.rule_type == 'attachments_only':
+                self.attachments_only = rule.id
+            elif rule.rule_type == 'min_length' and int(rule.value) > self.min_length:
+                self.min_length = int(rule.value)
+                self.min_length_rule = rule.id
+
+        self.include_regex = _RegexSet(include_regex)
+        self.exclude_regex = _RegexSet(exclude_regex)
+
+    def evaluate(self, message: discord.Message) -> Tuple[bool, List[int]]:
+        """返回 (是否转发, 命中的规则ID)；排除规则优先，同类包含规则之间为“或”，不同类之间为“且”"""
+        author_id = message.author.id
+        hits: List[int] = []
+
+        rule_id = self.exclude_authors.get(author_id)
+        if rule_id is not None:
+            return False, [rule_id]
+        if self.include_authors:
+            rule_id = self.include_authors.get(author_id)
+            if rule_id is None:
+                return False, []
+            hits.append(rule_id)
+
+        if self.attachments_only is not None and not message.attachments:
+            return False, [self.attachments_only]
+        content = message.content or ''
+        if self.min_length_rule is not None and len(content.strip()) < self.min_length:
+            return False, [self.min_length_rule]
+
+        if self.include_roles or self.exclude_roles:
+            # 私信或webhook消息没有身份组
+            role_ids = [role.id for role in getattr(message.author, 'roles', ())]
+            for role_id in role_ids:
+                rule_id = self.exclude_roles.get(role_id)
+                if rule_id is not None:
+                    return False, [rule_id]
+            if self.include_roles:
+                rule_id = next((self.include_roles[r] for r in role_ids if r in self.include_roles), None)
+                if rule_id is None:
+                    return False, []
+                hits.append(rule_id)
+
+        if self.exclude_regex:
+            rule_id = self.exclude_regex.search(content)
+            if rule_id is not None:
+                return False, [rule_id]
+        if self.include_regex:
+            rule_id = self.include_regex.search(content)
+            if rule_id is None:
+                return False, []
+            hits.append(rule_id)
+
+        return True, hits
+
+class RuleEngine:
+    """按桥接保存编译好的规则；配置变化时整体替换，记录每条规则的命中次数"""
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledRules] = {}
+        self.hits: Counter = Counter()
+
+    def load(self, rules: Iterable[BridgeRule]) -> int:
+        by_bridge: Dict[str, List[BridgeRule]] = {}
+        for rule in rules:
+            by_bridge.setdefault(rule.bridge_name, []).append(rule)
+        self._compiled = {name: CompiledRules(items) for name, items in by_bridge.items()}
+        return sum(len(items) for items in by_bridge.values())
+
+    def allows(self, bridge_name: str, message: discord.Message) -> bool:
+        """没有规则的桥接直接放行"""
+        compiled = self._compiled.get(bridge_name)
+        if compiled is None:
+            return True
+        allowed, hits = compiled.evaluate(message)
+        for rule_id in hits:
+            self.hits[rule_id] += 1
+        return allowed
@@ -0,0 +1,157 @@
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+# trigram分词按3个字符切分，可以在中文等没有空格的文本里做子串搜索；
+# 少于3个字符的关键词无法使用索引，只能在其他条件筛出的结果里逐条匹配
+MIN_INDEXED_TERM = 3
+
+# 只有过短关键词的搜索只能逐条LIKE匹配，最多检查符合桥接/日期条件的最近这么多条记录，
+# 避免在数据库线程上扫描整张转发记录表
+SHORT_TERM_SCAN_ROWS = 20000
+
+@dataclass
+class SearchResult:
+    id: int
+    bridge_name: str
+    author_name: str
+    snippet: str
+    timestamp: str
+    original_message_id: int
+
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    """创建转发记录的FTS5全文索引和同步触发器，首次创建时为已有记录建索引；不支持FTS5时返回False"""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS forwarded_messages_fts USING fts5(
+                content, author_name, bridge_name,
+                content = 'forwarded_messages',
+                content_rowid = 'id',
+                tokenize = 'trigram'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        print(f"全文搜索不可用（需要SQLite 3.34+并启用FTS5）: {e}")
+        return False
+
+    # 外部内容表：索引只存分词结果，正文仍在 forwarded_messages 中，由触发器保持同步
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS forwarded_messages_fts_insert
+        AFTER INSERT ON forwarded_messages BEGIN
+            INSERT INTO forwarded_messages_fts (rowid, content, author_name, bridge_name)
+            VALUES (new.id, new.content, new.author_name, new.bridge_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS forwarded_messages_fts_delete
+        AFTER DELETE ON forwarded_messages BEGIN
+            INSERT INTO forwarded_messages_fts (forwarded_messages_fts, rowid, content, author_name, bridge_name)
+            VALUES ('delete', old.id, old.content, old.author_name, old.bridge_name);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS forwarded_messages_fts_update
+        AFTER UPDATE ON forwarded_messages BEGIN
+            INSERT INTO forwarded_messages_fts (forwarded_messages_fts, rowid, content, author_name, bridge_name)
+            VALUES ('delete', old.id, old.content, old.author_name, old.bridge_name);
+            INSERT INTO forwarded_messages_fts (rowid, content, author_name, bridge_name)
+            VALUES (new.id, new.content, new.author_name, new.bridge_name);
+        END
+    ''')
+
+    if not conn.execute("SELECT 1 FROM bridge_meta WHERE key = 'search_index_built'").fetchone():
+        print("正在为已有转发记录建立全文索引...")
+        conn.execute("INSERT INTO forwarded_messages_fts (forwarded_messages_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO bridge_meta (key, value) VALUES ('search_index_built', datetime('now'))")
+    return True
+
+def parse_query(text: str) -> Tuple[List[str], List[str]]:
+    """把搜索词拆成 (可走索引的词组, 过短的词)；双引号内为整体短语"""
+    terms = [phrase or word for phrase, word in re.findall(r'"([^"]+)"|(\S+)', text)]
+    indexed = [term for term in terms if len(term) >= MIN_INDEXED_TERM]
+    short = [term for term in terms if len(term) < MIN_INDEXED_TERM]
+    return indexed, short
+
+def build_match_expression(terms: List[str]) -> str:
+    """每个词组作为FTS5短语，多个词组之间为AND"""
+    return ' AND '.join('"' + term.replace('"', '""') + '"' for term in terms)
+
+def _escape_like(term: str) -> str:
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def search_messages(conn: sqlite3.Connection, query: str, bridge_name: Optional[str] = None,
+                    start_day: Optional[date] = None, end_day: Optional[date] = None,
+                    limit: int = 10, offset: int = 0) -> List[SearchResult]:
+    """按关键词搜索转发记录，结果按时间从新到旧排列"""
+    indexed, short = parse_query(query)
+    if not indexed and not short:
+        return []
+
+    # 桥接/日期条件和关键词条件分开，只有过短关键词时先用前者划出扫描窗口
+    filters: List[str] = []
+    filter_params: List = []
+    if bridge_name:
+        filters.append('m.bridge_name = ?')
+        filter_params.append(bridge_name)
+    # 记录时间为UTC的 'YYYY-MM-DD HH:MM:SS'，按字符串比较即可
+    if start_day:
+        filters.append('m.timestamp >= ?')
+        filter_params.append(start_day.isoformat())
+    if end_day:
+        filters.append('m.timestamp < ?')
+        filter_params.append((end_day + timedelta(days=1)).isoformat())
+
+    likes: List[str] = []
+    like_params: List = []
+    for term in short:
+        likes.append("(m.content LIKE ? ESCAPE '\\' OR m.author_name LIKE ? ESCAPE '\\')")
+        pattern = f"%{_escape_like(term)}%"
+        like_params.extend([pattern, pattern])
+
+    if indexed:
+        where = ' AND '.join(['forwarded_messages_fts MATCH ?'] + likes + filters)
+        params = [build_match_expression(indexed)] + like_params + filter_params
+        # CROSS JOIN固定从全文索引出发（否则规划器可能按桥接索引逐行执行MATCH），
+        # 按rowid倒序取页，不需要对全部命中结果排序
+        sql = f'''
+            SELECT m.id, m.bridge_name, m.author_name,
+                   snippet(forwarded_messages_fts, 0, '**', '**', '…', 24),
+                   m.timestamp, m.original_message_id
+            FROM forwarded_messages_fts
+            CROSS JOIN forwarded_messages m ON m.id = forwarded_messages_fts.rowid
+            WHERE {where}
+            ORDER BY forwarded_messages_fts.rowid DESC
+            LIMIT ? OFFSET ?
+        '''
+    elif bridge_name:
+        # 沿 (bridge_name, timestamp) 索引从新到旧取最近的记录作为窗口，再在窗口内逐条匹配
+        sql = f'''
+            SELECT m.id, m.bridge_name, m.author_name, substr(m.content, 1, 120),
+                   m.timestamp, m.original_message_id
+            FROM (
+                SELECT * FROM forwarded_messages m
+                WHERE {' AND '.join(filters)}
+                ORDER BY m.timestamp DESC, m.id DESC
+                LIMIT ?
+            ) m
+            WHERE {' AND '.join(likes)}
+            ORDER BY m.timestamp DESC, m.id DESC
+            LIMIT ? OFFSET ?
+        '''
+        params = filter_params + [SHORT_TERM_SCAN_ROWS] + like_params
+    else:
+        # 没有桥接条件时只按主键范围扫描最近的记录，日期条件在窗口内筛选
+        where = ' AND '.join(['m.id > (SELECT COALESCE(MAX(id), 0) FROM forwarded_messages) - ?'] + likes + filters)
+        sql = f'''
+            SELECT m.id, m.bridge_name, m.author_name, substr(m.content, 1, 120),
+                   m.timestamp, m.original_message_id
+            FROM forwarded_messages m
+            WHERE {where}
+            ORDER BY m.id DESC
+            LIMIT ? OFFSET ?
+        '''
+        params = [SHORT_TERM_SCAN_ROWS] + like_params + filter_params
+    params.extend([limit, offset])
+    return [SearchResult(*row) for row in conn.execute(sql, params).fetchall()]
@@ -0,0 +1,97 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+import discord
+
+DEFAULT_WEBHOOK_NAME = "跨服桥接"
+
+def webhook_id_from_url(url: str) -> Optional[int]:
+    """从 .../webhooks/{id}/{token} 中解析webhook ID"""
+    try:
+        return int(url.split('/webhooks/', 1)[1].split('/', 1)[0])
+    except (IndexError, ValueError):
+        return None
+
+class WebhookRegistry:
+    """按目标频道缓存webhook URL；webhook失效时每个频道只重建一次"""
+
+    def __init__(self, persist: Callable[[int, str], Awaitable[None]]):
+        # persist(target_channel_id, webhook_url)：把新URL写回桥接配置
+        self._persist = persist
+        self._urls: Dict[int, str] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._own_ids: Set[int] = set()
+
+        self.recreated = 0
+
+    def seed(self, channel_id: int, url: Optional[str]):
+        """用数据库中已保存的URL预热缓存"""
+        if url and channel_id not in self._urls:
+            self._store(channel_id, url)
+
+    def get(self, channel_id: int) -> Optional[str]:
+        return self._urls.get(channel_id)
+
+    def is_own_webhook(self, webhook_id: Optional[int]) -> bool:
+        """判断消息是否由本机器人的桥接webhook发出"""
+        return webhook_id is not None and webhook_id in self._own_ids
+
+    async def resolve(self, channel: discord.TextChannel, name: str = DEFAULT_WEBHOOK_NAME) -> Optional[str]:
+        """返回频道的webhook URL，缓存未命中时查找或创建一次"""
+        url = self._urls.get(channel.id)
+        if url:
+            return url
+
+        async with self._lock(channel.id):
+            url = self._urls.get(channel.id)
+            if url:
+                return url
+            try:
+                webhook = None
+                for existing in await channel.webhooks():
+                    if existing.name == name and existing.token:
+                        webhook = existing
+                        break
+                if webhook is None:
+                    webhook = await channel.create_webhook(name=name)
+            except discord.HTTPException as e:
+                print(f"创建webhook失败: {e}")
+                return None
+
+            self._store(channel.id, webhook.url)
+            await self._persist(channel.id, webhook.url)
+            return webhook.url
+
+    async def recover(self, channel: discord.TextChannel, failed_url: str,
+                      name: str = DEFAULT_WEBHOOK_NAME) -> Optional[str]:
+        """webhook返回404/401后重建；并发的失败请求只会触发一次重建"""
+        async with self._lock(channel.id):
+            current = self._urls.get(channel.id)
+            if current and current != failed_url:
+                # 其他转发已经完成了重建
+                return current
+
+            self._urls.pop(channel.id, None)
+            try:
+                webhook = await channel.create_webhook(name=name)
+            except discord.HTTPException as e:
+                print(f"重建webhook失败: {e}")
+                return None
+
+            self.recreated += 1
+            self._store(channel.id, webhook.url)
+            await self._persist(channel.id, webhook.url)
+            print(f"♻️ 已为频道 {channel.id} 重建webhook")
+            return webhook.url
+
+    def _store(self, channel_id: int, url: str):
+        self._urls[channel_id] = url
+        webhook_id = webhook_id_from_url(url)
+        if webhook_id is not None:
+            self._own_ids.add(webhook_id)
+
+    def _lock(self, channel_id: int) -> asyncio.Lock:
+        lock = self._locks.get(channel_id)
+        if lock is None:
+            lock = self._locks[channel_id] = asyncio.Lock()
+        return lock
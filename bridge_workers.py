@@ -0,0 +1,293 @@
+import asyncio
+import multiprocessing
+import queue
+import signal
+import threading
+import zlib
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from bridge_db import BridgeDatabase
+from bridge_delivery import DeliveryResult, WebhookScheduler, webhook_queue_key
+from bridge_log_writer import ForwardLogWriter
+
+# 投递成功后由工作进程写入的转发记录：(bridge_name, original_message_id, author_id, author_name, content)
+LogRow = Tuple[str, int, int, str, str]
+
+# 工作进程一次最多从队列里取出的任务数
+_MAX_BATCH = 256
+
+class DeliveryWorkerPool:
+    """把webhook发送、重试和转发记录写入交给多个子进程，网关进程只负责路由和排队
+
+    同一个webhook的请求总是分到同一个进程，保证先后顺序，限流桶状态也只在一处维护。
+    """
+
+    def __init__(self, workers: int, session_factory: Callable[[], aiohttp.ClientSession], db_path: str,
+                 scheduler_options: Optional[Dict] = None, log_options: Optional[Dict] = None,
+                 monitor_interval: float = 5.0, on_flush: Optional[Callable[[float, int], None]] = None):
+        # session_factory 需要是模块级函数，才能传给子进程
+        # on_flush(耗时毫秒, 行数)：工作进程每批转发记录提交成功后在主进程调用，用于上报指标
+        self.workers = workers
+        self.session_factory = session_factory
+        self.db_path = db_path
+        self.scheduler_options = scheduler_options or {}
+        self.log_options = log_options or {}
+        self.monitor_interval = monitor_interval
+        self.on_flush = on_flush
+
+        # spawn：不继承父进程的线程、事件循环和数据库连接
+        self._context = multiprocessing.get_context('spawn')
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inboxes: List[Any] = []
+        self._processes: List[Any] = []
+        self._results = None
+        self._reader: Optional[threading.Thread] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # job_id -> (future, 队列键, 工作进程序号)
+        self._futures: Dict[int, Tuple[asyncio.Future, str, int]] = {}
+        self._in_flight: Counter = Counter()
+        self._next_id = 0
+        self._worker_stats: Dict[int, Dict] = {}
+
+        self.restarted = 0
+
+    def start(self):
+        """启动工作进程和结果读取线程"""
+        if self._processes:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._results = self._context.Queue()
+        for index in range(self.workers):
+            self._inboxes.append(None)
+            self._processes.append(None)
+            self._spawn(index)
+
+        self._reader = threading.Thread(target=self._read_results, name='bridge-delivery-results', daemon=True)
+        self._reader.start()
+        self._monitor = asyncio.create_task(self._watch())
+        print(f"🚚 已启动 {self.workers} 个投递进程")
+
+    def submit(self, method: str, url: str, payload: Optional[Dict] = None,
+               params: Optional[Dict] = None, log_rows: Optional[List[LogRow]] = None) -> asyncio.Future:
+        """交给负责该webhook的进程发送，返回可等待的DeliveryResult；成功时由工作进程写入log_rows"""
+        future = asyncio.get_running_loop().create_future()
+        if not self._processes or self._stopping:
+            future.set_result(DeliveryResult(0, error="投递进程未运行"))
+            return future
+
+        key = webhook_queue_key(url)
+        index = zlib.crc32(key.encode()) % self.workers
+        job_id = self._next_id
+        self._next_id += 1
+        self._futures[job_id] = (future, key, index)
+        self._in_flight[key] += 1
+        # 序列化在队列的后台线程中完成，不占用事件循环
+        self._inboxes[index].put((job_id, method, url, payload, params, log_rows))
+        return future
+
+    async def wait_ready(self, timeout: float = 30.0) -> bool:
+        """等待所有工作进程完成启动（首次上报统计）"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while len(self._worker_stats) < self.workers:
+            if loop.time() >= deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    def pending_for(self, url: str) -> int:
+        """指定webhook已提交但尚未返回结果的请求数"""
+        return self._in_flight.get(webhook_queue_key(url), 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """汇总各工作进程最近上报的统计，字段与WebhookScheduler.stats()一致"""
+        totals = Counter()
+        for stats in self._worker_stats.values():
+            totals.update(stats)
+        max_flush_ms = max((stats['max_flush_ms'] for stats in self._worker_stats.values()), default=0.0)
+        return {
+            'queues': len(self._in_flight),
+            'pending': sum(self._in_flight.values()),
+            'sent': totals['sent'],
+            'failed': totals['failed'],
+            'retries': totals['retries'],
+            'rate_limited': totals['rate_limited'],
+            'rows_written': totals['rows_written'],
+            'total_flush_ms': totals['total_flush_ms'],
+            'max_flush_ms': max_flush_ms,
+            'workers': sum(1 for process in self._processes if process and process.is_alive()),
+            'restarted': self.restarted
+        }
+
+    async def stop(self, timeout: float = 15.0):
+        """通知工作进程发完手上的请求、写完记录后退出，未返回的请求按失败处理"""
+        if not self._processes:
+            return
+        self._stopping = True
+        if self._monitor:
+            self._monitor.cancel()
+            self._monitor = None
+
+        for inbox in self._inboxes:
+            inbox.put(None)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._join_processes, timeout)
+
+        # 工作进程退出前已经把结果写进队列，哨兵排在它们之后
+        self._results.put(None)
+        await loop.run_in_executor(None, self._reader.join)
+
+        for job_id in list(self._futures):
+            self._resolve_failed(job_id, "投递进程已停止")
+        self._processes = []
+        self._inboxes = []
+        self._results.close()
+        self._results = None
+
+    def _spawn(self, index: int):
+        inbox = self._context.Queue()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, inbox, self._results, self.session_factory, self.db_path,
+                  self.scheduler_options, self.log_options),
+            name=f'bridge-delivery-{index}',
+            daemon=True
+        )
+        process.start()
+        self._inboxes[index] = inbox
+        self._processes[index] = process
+
+    def _join_processes(self, timeout: float):
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                print(f"投递进程 {process.name} 未能按时退出，强制结束")
+                process.terminate()
+                process.join()
+
+    def _read_results(self):
+        """在线程中阻塞读取结果，再交回事件循环处理"""
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            self._loop.call_soon_threadsafe(self._resolve, item)
+
+    def _resolve(self, item: tuple):
+        index, job_id, status, data, attempts, error, stats, flush = item
+        self._worker_stats[index] = stats
+        if flush and self.on_flush:
+            self.on_flush(*flush)
+        entry = self._futures.pop(job_id, None)
+        if entry is None:
+            return
+        future, key, _ = entry
+        self._release(key)
+        if not future.done():
+            future.set_result(DeliveryResult(status, data, attempts, error))
+
+    def _resolve_failed(self, job_id: int, error: str):
+        future, key, _ = self._futures.pop(job_id)
+        self._release(key)
+        if not future.done():
+            future.set_result(DeliveryResult(0, error=error))
+
+    def _release(self, key: str):
+        self._in_flight[key] -= 1
+        if self._in_flight[key] <= 0:
+            del self._in_flight[key]
+
+    async def _watch(self):
+        """工作进程意外退出时重启，分给它的请求按失败返回（由发件箱稍后重放）"""
+        while True:
+            await asyncio.sleep(self.monitor_interval)
+            for index, process in enumerate(self._processes):
+                if self._stopping or process.is_alive():
+                    continue
+                print(f"⚠️ 投递进程 {process.name} 已退出（退出码 {process.exitcode}），正在重启")
+                for job_id in [job_id for job_id, entry in self._futures.items() if entry[2] == index]:
+                    self._resolve_failed(job_id, "投递进程意外退出")
+                self._spawn(index)
+                self.restarted += 1
+
+def _worker_main(index: int, inbox, results, session_factory, db_path: str,
+                 scheduler_options: Dict, log_options: Dict):
+    """工作进程入口；Ctrl+C由主进程处理，子进程等待停止信号后正常收尾"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, inbox, results, session_factory, db_path, scheduler_options, log_options))
+
+async def _worker_loop(index: int, inbox, results, session_factory, db_path: str,
+                       scheduler_options: Dict, log_options: Dict):
+    loop = asyncio.get_running_loop()
+    session = session_factory()
+    scheduler = WebhookScheduler(lambda: session, **scheduler_options)
+    db = BridgeDatabase(db_path)
+    await db.open()
+    tasks = set()
+
+    def worker_stats() -> Dict:
+        stats = scheduler.stats()
+        return {
+            'sent': stats['sent'],
+            'failed': stats['failed'],
+            'retries': stats['retries'],
+            'rate_limited': stats['rate_limited'],
+            'rows_written': log_writer.rows_written,
+            'total_flush_ms': log_writer.total_flush_ms,
+            'max_flush_ms': log_writer.max_flush_ms
+        }
+
+    def report_flush(elapsed_ms: float, rows: int):
+        # 每批提交的耗时单独上报，主进程的数据库写入耗时直方图在多进程模式下也有数据
+        results.put((index, None, 0, None, 0, None, worker_stats(), (elapsed_ms, rows)))
+
+    log_writer = ForwardLogWriter(db, on_flush=report_flush, **log_options)
+    log_writer.start()
+
+    async def report(job_id: int, future: asyncio.Future, log_rows: Optional[List[LogRow]]):
+        result = await future
+        # 只回传转发副本的ID，其余响应内容留在子进程
+        data = None
+        if result.ok and result.data:
+            data = {'id': result.data.get('id')}
+            if log_rows and data['id']:
+                for bridge_name, original_msg_id, author_id, author_name, content in log_rows:
+                    log_writer.submit(bridge_name, original_msg_id, int(data['id']), author_id, author_name, content)
+        results.put((index, job_id, result.status, data, result.attempts, result.error, worker_stats(), None))
+
+    # 启动完成后先上报一次（job_id为None），主进程据此判断已就绪
+    results.put((index, None, 0, None, 0, None, worker_stats(), None))
+    stopping = False
+    while not stopping:
+        batch = [await loop.run_in_executor(None, inbox.get)]
+        while len(batch) < _MAX_BATCH:
+            try:
+                batch.append(inbox.get_nowait())
+            except queue.Empty:
+                break
+
+        for item in batch:
+            if item is None:
+                stopping = True
+                break
+            job_id, method, url, payload, params, log_rows = item
+            # 按到达顺序提交，调度器保证同一webhook内的先后顺序
+            future = scheduler.submit(method, url, payload, params)
+            task = asyncio.create_task(report(job_id, future, log_rows))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    await scheduler.stop()
+    if tasks:
+        await asyncio.gather(*tasks, return_exceptions=True)
+    await log_writer.stop()
+    # 最后一次上报统计
+    results.put((index, None, 0, None, 0, None, worker_stats(), None))
+    await db.close()
+    await session.close()
@@ -5,27 +5,323 @@ import sqlite3
 import os
 import json
 import aiohttp
-from datetime import datetime
-from typing import Optional, Dict, List
+from datetime import date, datetime
+from typing import Optional, Dict, List, Tuple
 import asyncio
+import time
+
+from bridge_backfill import BackfillManager
+from bridge_coalescer import COALESCE_MODES, ForwardCoalescer
+from bridge_db import BridgeDatabase
+from bridge_delivery import DeliveryResult, WebhookScheduler
+from bridge_groups import SeenMessageCache, build_group_configs
+from bridge_log_writer import ForwardLogWriter
+from bridge_matcher import KeywordMatch, KeywordMatcher
+from bridge_message_map import ForwardedMessageMap
+from bridge_metrics import LoopLagMonitor, MetricsRegistry, MetricsServer
+from bridge_outbox import ForwardOutbox, OutboxRetrier
+from bridge_retention import RetentionManager
+from bridge_rules import RULE_TYPES, BridgeRule, RuleEngine, normalize_rule_value
+from bridge_search import SHORT_TERM_SCAN_ROWS, SearchResult, ensure_search_index, parse_query, search_messages
+from bridge_webhooks import DEFAULT_WEBHOOK_NAME, WebhookRegistry
+from bridge_workers import DeliveryWorkerPool
 
 # 配置
 BOT_TOKEN = os.getenv('BRIDGE_BOT_TOKEN', "你的跨服桥接机器人TOKEN")
 
+# Webhook HTTP连接池配置
+WEBHOOK_POOL_LIMIT = int(os.getenv('BRIDGE_HTTP_POOL_LIMIT', '100'))
+WEBHOOK_POOL_LIMIT_PER_HOST = int(os.getenv('BRIDGE_HTTP_LIMIT_PER_HOST', '20'))
+WEBHOOK_KEEPALIVE_TIMEOUT = float(os.getenv('BRIDGE_HTTP_KEEPALIVE', '60'))
+WEBHOOK_CONNECT_TIMEOUT = float(os.getenv('BRIDGE_HTTP_CONNECT_TIMEOUT', '5'))
+WEBHOOK_TOTAL_TIMEOUT = float(os.getenv('BRIDGE_HTTP_TIMEOUT', '15'))
+
+# 一条消息同时转发到多个目标时的最大并发数
+FORWARD_CONCURRENCY = int(os.getenv('BRIDGE_FORWARD_CONCURRENCY', '8'))
+
+# Webhook投递重试配置
+DELIVERY_MAX_RETRIES = int(os.getenv('BRIDGE_DELIVERY_MAX_RETRIES', '5'))
+DELIVERY_MAX_RATE_LIMIT_RETRIES = int(os.getenv('BRIDGE_DELIVERY_MAX_429_RETRIES', '20'))
+
+# 投递进程数：大于0时webhook发送、重试和转发记录写入在子进程中完成，网关进程只负责路由
+DELIVERY_WORKERS = int(os.getenv('BRIDGE_DELIVERY_WORKERS', '0'))
+
+# 转发记录批量写入配置
+LOG_BATCH_SIZE = int(os.getenv('BRIDGE_LOG_BATCH_SIZE', '200'))
+LOG_FLUSH_INTERVAL_MS = int(os.getenv('BRIDGE_LOG_FLUSH_MS', '500'))
+
+# 转发记录保留与归档配置（默认永久保留，需要归档时通过环境变量或 /bridge_retention 开启）
+RETENTION_DEFAULT_DAYS = int(os.getenv('BRIDGE_RETENTION_DAYS', '0'))
+RETENTION_BATCH_SIZE = int(os.getenv('BRIDGE_RETENTION_BATCH_SIZE', '500'))
+RETENTION_INTERVAL_MIN = float(os.getenv('BRIDGE_RETENTION_INTERVAL_MIN', '60'))
+ARCHIVE_DIR = os.getenv('BRIDGE_ARCHIVE_DIR', 'bridge_archive')
+# 已有数据库切换到增量VACUUM需要完整VACUUM一次（耗时且临时占用约两倍磁盘空间），只在设为1时执行
+DB_CONVERT_AUTO_VACUUM = os.getenv('BRIDGE_DB_CONVERT_AUTO_VACUUM', '0') == '1'
+
+# 发件箱：任务最多尝试次数；失败后第n次重发前等待 OUTBOX_RETRY_SECONDS * 2^(n-1) 秒，最多 OUTBOX_RETRY_MAX_SECONDS 秒
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('BRIDGE_OUTBOX_MAX_ATTEMPTS', '5'))
+OUTBOX_RETRY_SECONDS = float(os.getenv('BRIDGE_OUTBOX_RETRY_SECONDS', '30'))
+OUTBOX_RETRY_MAX_SECONDS = float(os.getenv('BRIDGE_OUTBOX_RETRY_MAX_SECONDS', '3600'))
+
+# 合并发送的默认窗口（毫秒）
+DEFAULT_COALESCE_WINDOW_MS = 2000
+
+# 原消息 -> 转发副本映射的内存LRU大小
+MESSAGE_CACHE_SIZE = int(os.getenv('BRIDGE_MESSAGE_CACHE_SIZE', '10000'))
+
+# 防回环的已见消息缓存（条数上限、过期秒数）
+SEEN_CACHE_SIZE = int(os.getenv('BRIDGE_SEEN_CACHE_SIZE', '50000'))
+SEEN_CACHE_TTL = float(os.getenv('BRIDGE_SEEN_CACHE_TTL', '600'))
+# 是否转发其他webhook（非本机器人创建的）发出的消息
+FORWARD_FOREIGN_WEBHOOKS = os.getenv('BRIDGE_FORWARD_WEBHOOKS', '0') == '1'
+
+# 历史消息回填速度（每秒最多发送的消息数，Webhook上限约为每2秒5条）
+BACKFILL_RATE = float(os.getenv('BRIDGE_BACKFILL_RATE', '1'))
+
+# Prometheus指标服务（端口为0时不启动）
+METRICS_PORT = int(os.getenv('BRIDGE_METRICS_PORT', '0'))
+METRICS_HOST = os.getenv('BRIDGE_METRICS_HOST', '127.0.0.1')
+
+# 运行指标：每条消息只做字典计数，汇总统计在抓取时读取
+metrics = MetricsRegistry()
+messages_forwarded = metrics.counter(
+    'bridge_messages_forwarded_total', "成功转发的消息数", ('bridge',)
+)
+messages_failed = metrics.counter(
+    'bridge_messages_failed_total', "转发失败的消息数", ('bridge',)
+)
+messages_filtered = metrics.counter(
+    'bridge_messages_filtered_total', "被规则、审查模式或去重过滤的消息数", ('bridge', 'reason')
+)
+forward_latency = metrics.histogram(
+    'bridge_forward_latency_seconds', "从收到消息到webhook响应的耗时", ('bridge',)
+)
+db_write_latency = metrics.histogram(
+    'bridge_db_write_seconds', "数据库写入耗时（发件箱入队、转发记录批量提交）", ('kind',),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+event_loop_lag = metrics.histogram(
+    'bridge_event_loop_lag_seconds', "事件循环被阻塞的时间",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+loop_lag_monitor = LoopLagMonitor(event_loop_lag)
+metrics_server = MetricsServer(metrics, METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+
+# 桥接配置和转发记录数据库（持久连接，查询在专用线程中执行）
+db = BridgeDatabase('bridge_config.db')
+
+def observe_log_flush(elapsed_ms: float, rows: int):
+    """记录一批转发记录的提交耗时（本进程写入器和投递进程都会上报）"""
+    db_write_latency.observe(elapsed_ms / 1000, 'log_batch')
+
+# 转发记录后台写入器
+log_writer = ForwardLogWriter(
+    db,
+    batch_size=LOG_BATCH_SIZE,
+    flush_interval=LOG_FLUSH_INTERVAL_MS / 1000,
+    on_flush=observe_log_flush
+)
+
+# 持久化转发发件箱
+outbox = ForwardOutbox(
+    'bridge_outbox.db',
+    max_attempts=OUTBOX_MAX_ATTEMPTS,
+    retry_delay=OUTBOX_RETRY_SECONDS,
+    max_retry_delay=OUTBOX_RETRY_MAX_SECONDS
+)
+
+# 运行期间重发失败后到期的发件箱任务
+outbox_retrier = OutboxRetrier(outbox, lambda jobs: replay_outbox(jobs))
+
+# 高频桥接的合并发送
+coalescer = ForwardCoalescer(lambda job, job_id: deliver_forward_job(job, job_id))
+
+# 过期转发记录归档
+retention_manager = RetentionManager(
+    db,
+    ARCHIVE_DIR,
+    lambda: {name: config['retention_days'] for name, config in bridge_configs_by_name.items()},
+    default_days=RETENTION_DEFAULT_DAYS,
+    batch_size=RETENTION_BATCH_SIZE,
+    interval=RETENTION_INTERVAL_MIN * 60
+)
+
+# 用于同步编辑/删除的转发消息映射
+message_map = ForwardedMessageMap(db, max_size=MESSAGE_CACHE_SIZE)
+
+# 已处理的原消息和已发出的转发副本，防止群组内回环和重复转发
+seen_messages = SeenMessageCache(max_size=SEEN_CACHE_SIZE, ttl=SEEN_CACHE_TTL)
+
+# 按桥接编译的转发规则
+rule_engine = RuleEngine()
+
+# 历史消息回填（函数在后面定义）
+backfill_manager = BackfillManager(
+    db,
+    lambda bridge_name, message: backfill_forward(bridge_name, message),
+    lambda bridge_name: bridge_delivery_busy(bridge_name),
+    rate=BACKFILL_RATE
+)
+
+def create_webhook_session() -> aiohttp.ClientSession:
+    """创建长连接复用的webhook HTTP会话"""
+    connector = aiohttp.TCPConnector(
+        limit=WEBHOOK_POOL_LIMIT,
+        limit_per_host=WEBHOOK_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=WEBHOOK_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(
+        total=WEBHOOK_TOTAL_TIMEOUT,
+        connect=WEBHOOK_CONNECT_TIMEOUT
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+# 可选的多进程投递（函数需在模块级定义，才能传给子进程）
+delivery_workers = DeliveryWorkerPool(
+    DELIVERY_WORKERS,
+    create_webhook_session,
+    'bridge_config.db',
+    scheduler_options={
+        'max_retries': DELIVERY_MAX_RETRIES,
+        'max_rate_limit_retries': DELIVERY_MAX_RATE_LIMIT_RETRIES
+    },
+    log_options={
+        'batch_size': LOG_BATCH_SIZE,
+        'flush_interval': LOG_FLUSH_INTERVAL_MS / 1000
+    },
+    on_flush=observe_log_flush
+) if DELIVERY_WORKERS > 0 else None
+
+class BridgeBot(commands.Bot):
+    """跨服桥接机器人，负责管理webhook会话的生命周期"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.webhook_session: Optional[aiohttp.ClientSession] = None
+        # 连接网关前发件箱中未完成的任务，首次就绪后重放；之后实时入队的任务不在其中
+        self.outbox_snapshot: Optional[List[Tuple[int, Dict]]] = None
+        self.outbox_replay_task: Optional[asyncio.Task] = None
+        self.search_enabled = False
+    
+    async def setup_hook(self):
+        """登录后、连接网关前初始化数据库、路由表、webhook会话和后台写入器"""
+        await db.open()
+        await db.run(init_database)
+        await db.run(backfill_bridge_stats)
+        self.search_enabled = await db.run(ensure_search_index)
+        loaded = await reload_bridge_routes()
+        print(f"加载了 {loaded} 个桥接配置")
+        
+        await outbox.open()
+        self.outbox_snapshot = await outbox.pending()
+        self.webhook_session = create_webhook_session()
+        log_writer.start()
+        retention_manager.start()
+        if delivery_workers:
+            delivery_workers.start()
+        loop_lag_monitor.start()
+        if metrics_server:
+            await metrics_server.start()
+    
+    async def close(self):
+        """关闭机器人时发完队列中的消息、写完剩余的转发记录并释放webhook连接池"""
+        await super().close()
+        if self.outbox_replay_task and not self.outbox_replay_task.done():
+            # 未重放完的任务仍在发件箱中，下次启动继续
+            self.outbox_replay_task.cancel()
+        await outbox_retrier.stop()
+        if metrics_server:
+            await metrics_server.stop()
+        await loop_lag_monitor.stop()
+        await retention_manager.stop()
+        await backfill_manager.stop()
+        await coalescer.flush_all()
+        await webhook_scheduler.stop()
+        if delivery_workers:
+            await delivery_workers.stop()
+        await log_writer.stop()
+        await db.close()
+        await outbox.close()
+        if self.webhook_session and not self.webhook_session.closed:
+            await self.webhook_session.close()
+
 # 创建机器人实例
 intents = discord.Intents.default()
 intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+bot = BridgeBot(command_prefix='!', intents=intents)
+
+# 按webhook分队列的投递调度器
+webhook_scheduler = WebhookScheduler(
+    lambda: bot.webhook_session,
+    max_retries=DELIVERY_MAX_RETRIES,
+    max_rate_limit_retries=DELIVERY_MAX_RATE_LIMIT_RETRIES
+)
+
+def current_delivery_stats() -> Dict:
+    """投递统计：启用投递进程时汇总子进程的统计"""
+    return delivery_workers.stats() if delivery_workers else webhook_scheduler.stats()
+
+# 抓取时读取的指标（只在请求 /metrics 时计算，不影响消息路径）
+metrics.callback(
+    'bridge_webhook_requests_total', "Webhook请求最终结果", 'counter',
+    lambda: {('sent',): current_delivery_stats()['sent'], ('failed',): current_delivery_stats()['failed']},
+    ('result',)
+)
+metrics.callback('bridge_webhook_rate_limited_total', "收到的429响应次数", 'counter',
+                 lambda: current_delivery_stats()['rate_limited'])
+metrics.callback('bridge_webhook_retries_total', "Webhook请求重试次数（含429）", 'counter',
+                 lambda: current_delivery_stats()['retries'])
+metrics.callback('bridge_delivery_pending', "等待发送的webhook请求数", 'gauge',
+                 lambda: current_delivery_stats()['pending'])
+metrics.callback('bridge_outbox_pending', "发件箱中未完成的转发任务数", 'gauge',
+                 lambda: outbox.stats()['pending'])
+metrics.callback('bridge_log_queue_depth', "等待写入的转发记录数", 'gauge',
+                 lambda: log_writer.queue_depth)
+metrics.callback('bridge_db_queries_total', "数据库线程执行的查询数", 'counter',
+                 lambda: db.stats()['queries'])
+metrics.callback('bridge_coalesced_messages_total', "合并发送的消息数", 'counter',
+                 lambda: coalescer.coalesced_messages)
+metrics.callback('bridge_rule_hits_total', "转发规则命中次数", 'counter',
+                 lambda: {(str(rule_id),): count for rule_id, count in rule_engine.hits.items()}, ('rule_id',))
+metrics.callback('bridge_seen_cache_entries', "防回环缓存中的消息数", 'gauge',
+                 lambda: len(seen_messages))
+metrics.callback('bridge_configured_bridges', "已加载的桥接数（含群组展开）", 'gauge',
+                 lambda: len(bridge_configs_by_name))
+if delivery_workers:
+    metrics.callback('bridge_delivery_workers_alive', "存活的投递进程数", 'gauge',
+                     lambda: current_delivery_stats()['workers'])
 
 # 数据库初始化
-def init_database():
+def init_database(conn: sqlite3.Connection):
     """初始化SQLite数据库"""
-    conn = sqlite3.connect('bridge_config.db')
     cursor = conn.cursor()
     
+    # 启用增量VACUUM，归档后可以分批回收空间
+    cursor.execute('PRAGMA auto_vacuum')
+    if cursor.fetchone()[0] != 2:
+        cursor.execute("SELECT COUNT(*) FROM sqlite_master")
+        if cursor.fetchone()[0] == 0:
+            # 新数据库：建表前设置即可生效
+            cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        else:
+            page_count = cursor.execute('PRAGMA page_count').fetchone()[0]
+            page_size = cursor.execute('PRAGMA page_size').fetchone()[0]
+            size_mb = page_count * page_size / 1024 / 1024
+            if DB_CONVERT_AUTO_VACUUM:
+                print(f"正在把数据库（{size_mb:.0f} MB）切换到增量VACUUM，期间机器人不会连接，需要约两倍的磁盘空间...")
+                started = time.perf_counter()
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                cursor.execute('VACUUM')
+                print(f"增量VACUUM切换完成，耗时 {time.perf_counter() - started:.1f} 秒")
+            else:
+                # 不切换也能正常运行：归档释放的页会被后续写入复用，只是文件不会缩小
+                print(f"数据库（{size_mb:.0f} MB）未启用增量VACUUM，归档后文件不会缩小；"
+                      f"设置 BRIDGE_DB_CONVERT_AUTO_VACUUM=1 后重启可执行一次性切换")
+    
     # 创建桥接配置表
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS bridge_configs (
@@ -57,17 +353,209 @@ def init_database():
         )
     ''')
     
-    conn.commit()
-    conn.close()
+    # 旧版本数据库迁移：每个桥接的记录保留天数（NULL表示使用默认值，0表示永久保留）
+    cursor.execute('PRAGMA table_info(bridge_configs)')
+    columns = {row[1] for row in cursor.fetchall()}
+    if 'retention_days' not in columns:
+        cursor.execute('ALTER TABLE bridge_configs ADD COLUMN retention_days INTEGER')
+    # 合并发送模式：off / author（同作者连续消息合并）/ digest（窗口内全部合并）
+    if 'coalesce_mode' not in columns:
+        cursor.execute("ALTER TABLE bridge_configs ADD COLUMN coalesce_mode TEXT DEFAULT 'off'")
+    if 'coalesce_window_ms' not in columns:
+        cursor.execute('ALTER TABLE bridge_configs ADD COLUMN coalesce_window_ms INTEGER DEFAULT 2000')
+    
+    # 按桥接和时间查找过期记录（归档）
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_forwarded_bridge_time
+        ON forwarded_messages (bridge_name, timestamp)
+    ''')
+    
+    # 按原消息ID查找转发副本（编辑/删除同步）
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_forwarded_original
+        ON forwarded_messages (original_message_id)
+    ''')
+    
+    # 统计汇总表（随转发记录增量更新，时间均为UTC）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_stats_hourly (
+            bridge_name TEXT NOT NULL,
+            hour TEXT NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bridge_name, hour)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_stats_daily (
+            bridge_name TEXT NOT NULL,
+            day TEXT NOT NULL,
+            message_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bridge_name, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_stats_totals (
+            bridge_name TEXT PRIMARY KEY,
+            message_count INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_hourly_hour ON bridge_stats_hourly (hour)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_stats_daily_day ON bridge_stats_daily (day)')
+    
+    # 桥接群组：群组内任一成员频道的消息转发到其他所有成员频道
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_groups (
+            group_name TEXT PRIMARY KEY,
+            is_enabled BOOLEAN DEFAULT TRUE,
+            created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            admin_user_id INTEGER
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_group_members (
+            group_name TEXT NOT NULL,
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            webhook_url TEXT,
+            joined_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (group_name, channel_id)
+        )
+    ''')
+    
+    # 每个桥接的转发规则（作者/身份组/正则/附件/最短长度）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            bridge_name TEXT NOT NULL,
+            rule_type TEXT NOT NULL,
+            value TEXT NOT NULL DEFAULT '',
+            created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            admin_user_id INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bridge_rules_bridge ON bridge_rules (bridge_name)')
+    
+    # 历史消息回填进度（断点为最后处理的消息ID，end_message_id之后的消息由实时转发负责）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_backfill_jobs (
+            bridge_name TEXT PRIMARY KEY,
+            source_channel_id INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'running',
+            start_message_id INTEGER,
+            last_message_id INTEGER,
+            end_message_id INTEGER NOT NULL,
+            copied INTEGER NOT NULL DEFAULT 0,
+            error TEXT,
+            admin_user_id INTEGER,
+            created_time DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_time DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 一次性迁移标记等元数据
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bridge_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+def backfill_bridge_stats(conn: sqlite3.Connection):
+    """用已有的转发记录一次性回填统计汇总表（只执行一次）"""
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT value FROM bridge_meta WHERE key = 'stats_backfilled'")
+    if cursor.fetchone():
+        return
+    
+    print("正在回填桥接统计汇总表...")
+    cursor.execute('DELETE FROM bridge_stats_hourly')
+    cursor.execute('DELETE FROM bridge_stats_daily')
+    cursor.execute('DELETE FROM bridge_stats_totals')
+    cursor.execute('''
+        INSERT INTO bridge_stats_hourly (bridge_name, hour, message_count)
+        SELECT bridge_name, substr(timestamp, 1, 13), COUNT(*)
+        FROM forwarded_messages
+        GROUP BY bridge_name, substr(timestamp, 1, 13)
+    ''')
+    cursor.execute('''
+        INSERT INTO bridge_stats_daily (bridge_name, day, message_count)
+        SELECT bridge_name, substr(hour, 1, 10), SUM(message_count)
+        FROM bridge_stats_hourly
+        GROUP BY bridge_name, substr(hour, 1, 10)
+    ''')
+    cursor.execute('''
+        INSERT INTO bridge_stats_totals (bridge_name, message_count)
+        SELECT bridge_name, SUM(message_count)
+        FROM bridge_stats_daily
+        GROUP BY bridge_name
+    ''')
+    cursor.execute("INSERT INTO bridge_meta (key, value) VALUES ('stats_backfilled', datetime('now'))")
+
+def get_bridge_stats(conn: sqlite3.Connection, bridge_name: Optional[str] = None) -> Dict:
+    """从统计汇总表读取统计数据，耗时与转发记录总量无关"""
+    cursor = conn.cursor()
+    
+    bridge_filter = ""
+    params: List = []
+    if bridge_name:
+        bridge_filter = "AND bridge_name = ?"
+        params.append(bridge_name)
+    
+    cursor.execute(f'''
+        SELECT COALESCE(SUM(message_count), 0) FROM bridge_stats_totals
+        WHERE 1 = 1 {bridge_filter}
+    ''', params)
+    total_messages = cursor.fetchone()[0]
+    
+    cursor.execute(f'''
+        SELECT COALESCE(SUM(message_count), 0) FROM bridge_stats_daily
+        WHERE day = DATE('now') {bridge_filter}
+    ''', params)
+    today_messages = cursor.fetchone()[0]
+    
+    # 最活跃的桥接（只在查看全部桥接时有意义，指定桥接时不显示）
+    top_bridges = []
+    if not bridge_name:
+        cursor.execute('''
+            SELECT bridge_name, message_count
+            FROM bridge_stats_totals
+            ORDER BY message_count DESC
+            LIMIT 5
+        ''')
+        top_bridges = cursor.fetchall()
+    
+    # 按天（近7天）和按小时（近24小时）的分布
+    cursor.execute(f'''
+        SELECT day, SUM(message_count) FROM bridge_stats_daily
+        WHERE day >= DATE('now', '-6 days') {bridge_filter}
+        GROUP BY day ORDER BY day
+    ''', params)
+    daily = cursor.fetchall()
+    
+    cursor.execute(f'''
+        SELECT hour, SUM(message_count) FROM bridge_stats_hourly
+        WHERE hour >= strftime('%Y-%m-%d %H', 'now', '-23 hours') {bridge_filter}
+        GROUP BY hour ORDER BY hour
+    ''', params)
+    hourly = cursor.fetchall()
+    
+    return {
+        'total_messages': total_messages,
+        'today_messages': today_messages,
+        'top_bridges': top_bridges,
+        'daily': daily,
+        'hourly': hourly
+    }
 
-def get_bridge_configs() -> List[Dict]:
+def get_bridge_configs(conn: sqlite3.Connection) -> List[Dict]:
     """获取所有桥接配置"""
-    conn = sqlite3.connect('bridge_config.db')
     cursor = conn.cursor()
     
     cursor.execute('''
         SELECT bridge_name, source_guild_id, source_channel_id, 
-               target_guild_id, target_channel_id, webhook_url, is_enabled, audit_mode
+               target_guild_id, target_channel_id, webhook_url, is_enabled, audit_mode,
+               retention_days, coalesce_mode, coalesce_window_ms
         FROM bridge_configs 
         WHERE is_enabled = TRUE
     ''')
@@ -82,16 +570,107 @@ def get_bridge_configs() -> List[Dict]:
             'target_channel_id': row[4],
             'webhook_url': row[5],
             'is_enabled': row[6],
-            'audit_mode': row[7] if len(row) > 7 else False
+            'audit_mode': row[7] if len(row) > 7 else False,
+            'retention_days': row[8],
+            'coalesce_mode': row[9] or 'off',
+            'coalesce_window_ms': row[10] or DEFAULT_COALESCE_WINDOW_MS
         })
     
-    conn.close()
     return configs
 
-def save_bridge_config(bridge_name: str, source_guild_id: int, source_channel_id: int,
+def get_bridge_groups(conn: sqlite3.Connection) -> Dict[str, List[tuple]]:
+    """获取所有启用的桥接群组：group_name -> [(guild_id, channel_id, webhook_url)]"""
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT g.group_name, m.guild_id, m.channel_id, m.webhook_url
+        FROM bridge_groups g
+        LEFT JOIN bridge_group_members m ON m.group_name = g.group_name
+        WHERE g.is_enabled = TRUE
+        ORDER BY g.group_name, m.joined_time
+    ''')
+    
+    groups: Dict[str, List[tuple]] = {}
+    for group_name, guild_id, channel_id, webhook_url in cursor.fetchall():
+        members = groups.setdefault(group_name, [])
+        if channel_id is not None:
+            members.append((guild_id, channel_id, webhook_url))
+    
+    return groups
+
+def delete_bridge_group(conn: sqlite3.Connection, group_name: str) -> bool:
+    """删除桥接群组及其所有成员，返回群组是否存在"""
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM bridge_groups WHERE group_name = ?', (group_name,))
+    removed = cursor.rowcount > 0
+    cursor.execute('DELETE FROM bridge_group_members WHERE group_name = ?', (group_name,))
+    return removed
+
+def delete_bridge_config(conn: sqlite3.Connection, bridge_name: str) -> bool:
+    """在一个事务中删除桥接配置、转发规则和回填记录，返回桥接是否存在"""
+    cursor = conn.cursor()
+    
+    cursor.execute('DELETE FROM bridge_configs WHERE bridge_name = ?', (bridge_name,))
+    removed = cursor.rowcount > 0
+    cursor.execute('DELETE FROM bridge_rules WHERE bridge_name = ?', (bridge_name,))
+    BackfillManager.delete_job(conn, bridge_name)
+    return removed
+
+def get_bridge_rules(conn: sqlite3.Connection) -> List[BridgeRule]:
+    """获取所有桥接的转发规则"""
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT id, bridge_name, rule_type, value FROM bridge_rules ORDER BY id')
+    return [BridgeRule(*row) for row in cursor.fetchall()]
+
+async def reload_bridge_rules() -> int:
+    """重新编译所有桥接的转发规则，返回规则数量"""
+    return rule_engine.load(await db.run(get_bridge_rules))
+
+# 内存路由表：source_channel_id -> 该频道对应的桥接配置列表
+bridge_routes: Dict[int, List[Dict]] = {}
+# bridge_name -> 桥接配置
+bridge_configs_by_name: Dict[str, Dict] = {}
+
+async def reload_bridge_routes() -> int:
+    """从数据库重建内存路由表，返回已加载的桥接数量"""
+    global bridge_routes, bridge_configs_by_name
+    
+    routes: Dict[int, List[Dict]] = {}
+    configs = await db.run(get_bridge_configs)
+    groups = await db.run(get_bridge_groups)
+    
+    # 群组预先展开成每个成员频道到其他成员的路由，成员数不影响on_message的查找开销
+    group_members = {
+        group_name: [(guild_id, channel_id) for guild_id, channel_id, _ in members]
+        for group_name, members in groups.items()
+    }
+    configs = configs + build_group_configs(group_members, DEFAULT_COALESCE_WINDOW_MS)
+    for config in configs:
+        routes.setdefault(config['source_channel_id'], []).append(config)
+    
+    # 整体替换，避免on_message读到重建一半的路由表
+    bridge_routes = routes
+    bridge_configs_by_name = {config['bridge_name']: config for config in configs}
+    for config in configs:
+        webhook_registry.seed(config['target_channel_id'], config['webhook_url'])
+    for members in groups.values():
+        for _, channel_id, webhook_url in members:
+            webhook_registry.seed(channel_id, webhook_url)
+    await reload_bridge_rules()
+    return len(configs)
+
+def find_bridge_config(bridge_name: str) -> Optional[Dict]:
+    """按名称查找 /bridge_add 创建的桥接（群组展开的虚拟路由不在bridge_configs表中，不能单独设置）"""
+    config = bridge_configs_by_name.get(bridge_name)
+    if config is None or config.get('group_name'):
+        return None
+    return config
+
+def save_bridge_config(conn: sqlite3.Connection, bridge_name: str, source_guild_id: int, source_channel_id: int,
                       target_guild_id: int, target_channel_id: int, webhook_url: str, admin_user_id: int, audit_mode: bool = False):
     """保存桥接配置"""
-    conn = sqlite3.connect('bridge_config.db')
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -101,104 +680,121 @@ def save_bridge_config(bridge_name: str, source_guild_id: int, source_channel_id
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     ''', (bridge_name, source_guild_id, source_channel_id, target_guild_id, 
           target_channel_id, webhook_url, admin_user_id, audit_mode))
-    
-    conn.commit()
-    conn.close()
 
 def log_forwarded_message(bridge_name: str, original_msg_id: int, forwarded_msg_id: int,
                          author_id: int, author_name: str, content: str):
-    """记录转发的消息"""
-    conn = sqlite3.connect('bridge_config.db')
+    """记录转发的消息（交给后台写入器批量提交）"""
+    log_writer.submit(bridge_name, original_msg_id, forwarded_msg_id, author_id, author_name, content)
+
+def update_webhook_url(conn: sqlite3.Connection, target_channel_id: int, webhook_url: str):
+    """把目标频道的新webhook URL写回所有相关的桥接配置"""
     cursor = conn.cursor()
     
     cursor.execute('''
-        INSERT INTO forwarded_messages 
-        (bridge_name, original_message_id, forwarded_message_id, author_id, author_name, content)
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', (bridge_name, original_msg_id, forwarded_msg_id, author_id, author_name, content[:500]))
-    
-    conn.commit()
-    conn.close()
+        UPDATE bridge_configs 
+        SET webhook_url = ? 
+        WHERE target_channel_id = ?
+    ''', (webhook_url, target_channel_id))
+    cursor.execute('''
+        UPDATE bridge_group_members 
+        SET webhook_url = ? 
+        WHERE channel_id = ?
+    ''', (webhook_url, target_channel_id))
 
-async def create_webhook_if_needed(channel: discord.TextChannel, webhook_name: str = "跨服桥接") -> str:
-    """为频道创建webhook"""
-    try:
-        # 检查是否已有webhook
-        webhooks = await channel.webhooks()
-        for webhook in webhooks:
-            if webhook.name == webhook_name:
-                return webhook.url
-        
-        # 创建新webhook
-        webhook = await channel.create_webhook(name=webhook_name)
-        return webhook.url
-    except Exception as e:
-        print(f"创建webhook失败: {e}")
-        return None
+async def persist_webhook_url(target_channel_id: int, webhook_url: str):
+    """持久化新的webhook URL，并同步内存中的配置"""
+    for config in bridge_configs_by_name.values():
+        if config['target_channel_id'] == target_channel_id:
+            config['webhook_url'] = webhook_url
+    await db.run(update_webhook_url, target_channel_id, webhook_url)
+
+# 按目标频道缓存的webhook
+webhook_registry = WebhookRegistry(persist_webhook_url)
+
+async def create_webhook_if_needed(channel: discord.TextChannel, webhook_name: str = DEFAULT_WEBHOOK_NAME) -> str:
+    """获取频道的webhook（优先使用缓存，必要时查找或创建）"""
+    return await webhook_registry.resolve(channel, webhook_name)
+
+# 审查模式关键词
+FORBIDDEN_WORDS = ["镜花", "蜜淫"]
+
+DC_INVITE_PATTERNS = [
+    "discord.gg/",
+    "discord.com/invite/", 
+    "discordapp.com/invite/",
+    "discord.gg",
+    ".gg/"
+]
+
+POLITICAL_WORDS = [
+    "习近平", "xi jinping", "毛泽东", "邓小平", 
+    "共产党", "ccp", "中共", "政府", "党委",
+    "台独", "港独",
+    "六四", "法轮功", "民运", "反共", 
+    "民主", "人权", "维权", "异议", "反政府",
+    "中国", "美国"
+]
+
+def build_violation_matcher() -> KeywordMatcher:
+    """用所有关键词列表构建一次性的多模式匹配器（规则顺序即报告优先级）"""
+    rules = [(word, 'forbidden') for word in FORBIDDEN_WORDS]
+    rules += [(pattern, 'invite') for pattern in DC_INVITE_PATTERNS]
+    rules += [(word, 'political') for word in POLITICAL_WORDS]
+    return KeywordMatcher(rules)
+
+violation_matcher = build_violation_matcher()
+
+def format_violation_reason(match: KeywordMatch) -> str:
+    """生成违规提醒文本"""
+    if match.category == 'forbidden':
+        return f"包含违禁词: {match.keyword}"
+    if match.category == 'invite':
+        return "包含Discord邀请链接"
+    return f"包含涉政内容: {match.keyword}"
+
+def find_violations(content: str) -> List[KeywordMatch]:
+    """一次扫描返回消息命中的所有违规规则及类别"""
+    if not content:
+        return []
+    return violation_matcher.scan(content)
 
 def check_violation_content(content: str) -> tuple[bool, str]:
     """检查消息是否包含违规内容"""
     if not content:
         return False, ""
     
-    content_lower = content.lower()
-    
-    # 检查特殊违禁词
-    forbidden_words = ["镜花", "蜜淫"]
-    for word in forbidden_words:
-        if word in content:
-            return True, f"包含违禁词: {word}"
-    
-    # 检查DC群组链接
-    dc_patterns = [
-        "discord.gg/",
-        "discord.com/invite/", 
-        "discordapp.com/invite/",
-        "discord.gg",
-        ".gg/"
-    ]
-    for pattern in dc_patterns:
-        if pattern in content_lower:
-            return True, "包含Discord邀请链接"
-    
-    # 检查涉政关键词
-    political_words = [
-        "习近平", "xi jinping", "毛泽东", "邓小平", 
-        "共产党", "ccp", "中共", "政府", "党委",
-        "台独", "港独",
-        "六四", "法轮功", "民运", "反共", 
-        "民主", "人权", "维权", "异议", "反政府"
-        "中国"， "美国"
-    ]
-    for word in political_words:
-        if word in content_lower:
-            return True, f"包含涉政内容: {word}"
-    
-    return False, ""
-
-async def send_webhook_message(webhook_url: str, content: str, username: str, avatar_url: str, embeds: List = None):
-    """通过webhook发送消息"""
-    try:
-        async with aiohttp.ClientSession() as session:
-            payload = {
-                'content': content,
-                'username': username,
-                'avatar_url': avatar_url
-            }
-            
-            if embeds:
-                payload['embeds'] = embeds
-            
-            async with session.post(webhook_url, json=payload) as response:
-                if response.status == 200:
-                    response_data = await response.json()
-                    return response_data.get('id')
-                else:
-                    print(f"Webhook发送失败: {response.status}")
-                    return None
-    except Exception as e:
-        print(f"发送webhook消息失败: {e}")
-        return None
+    # 与逐个检查时一致：按违禁词、邀请链接、涉政词的列表顺序报告第一条
+    first = violation_matcher.first(content)
+    if first is None:
+        return False, ""
+    return True, format_violation_reason(first)
+
+def submit_webhook_request(method: str, url: str, payload: Optional[Dict] = None,
+                           params: Optional[Dict] = None, log_rows: Optional[List[tuple]] = None) -> asyncio.Future:
+    """提交webhook请求：启用投递进程时交给子进程（成功后由子进程写入log_rows），否则在本进程排队发送"""
+    if delivery_workers:
+        return delivery_workers.submit(method, url, payload, params, log_rows)
+    return webhook_scheduler.submit(method, url, payload, params)
+
+async def send_webhook_message(webhook_url: str, content: str, username: str, avatar_url: str,
+                               embeds: List = None, log_rows: Optional[List[tuple]] = None) -> DeliveryResult:
+    """通过webhook发送消息（按webhook排队，自动处理限流和重试）"""
+    payload = {
+        'content': content,
+        'username': username
+    }
+    
+    if avatar_url:
+        payload['avatar_url'] = avatar_url
+    
+    if embeds:
+        payload['embeds'] = embeds
+    
+    # wait=true 让Discord返回已创建的消息，用于记录转发后的消息ID
+    result = await submit_webhook_request('POST', webhook_url, payload, {'wait': 'true'}, log_rows)
+    if not result.ok:
+        print(f"Webhook发送失败: {result.status} ({result.error}, 尝试 {result.attempts} 次)")
+    return result
 
 @bot.event
 async def on_ready():
@@ -208,9 +804,6 @@ async def on_ready():
     print(f'已连接到 {len(bot.guilds)} 个服务器')
     print('-----')
     
-    # 初始化数据库
-    init_database()
-    
     # 同步斜杠命令
     try:
         synced = await bot.tree.sync()
@@ -218,139 +811,433 @@ async def on_ready():
     except Exception as e:
         print(f"同步命令失败: {e}")
     
-    # 加载桥接配置
-    configs = get_bridge_configs()
-    print(f"加载了 {len(configs)} 个桥接配置")
+    # 首次就绪后重放发件箱、开始定期重发失败的任务、继续未完成的回填（需要频道缓存已加载）
+    if bot.outbox_snapshot is not None:
+        jobs, bot.outbox_snapshot = bot.outbox_snapshot, None
+        bot.outbox_replay_task = asyncio.create_task(replay_outbox(jobs))
+        bot.outbox_replay_task.add_done_callback(report_replay_result)
+        outbox_retrier.start()
+        resumed = await backfill_manager.resume(bot.get_channel)
+        if resumed:
+            print(f"📥 继续 {resumed} 个未完成的历史回填")
 
 @bot.event
 async def on_message(message):
     """消息监听事件"""
-    # 忽略机器人消息和系统消息
-    if message.author.bot or message.type != discord.MessageType.default:
+    received_at = asyncio.get_running_loop().time()
+    
+    # 防回环：本机器人webhook发出的转发副本永远不再转发
+    if webhook_registry.is_own_webhook(message.webhook_id):
+        return
+    
+    # 忽略系统消息和机器人消息（其他webhook的消息按配置决定）
+    if message.type != discord.MessageType.default:
+        return
+    if message.author.bot and not (message.webhook_id and FORWARD_FOREIGN_WEBHOOKS):
         return
     
-    # 获取桥接配置
-    configs = get_bridge_configs()
+    # 查询内存路由表，未桥接的频道直接跳过
+    configs = bridge_routes.get(message.channel.id)
+    if not configs:
+        await bot.process_commands(message)
+        return
+    
+    # 已转发过的副本（webhook缓存尚未更新时）或重复投递的事件
+    if seen_messages.check_and_add(message.id):
+        return
     
+    # 确定需要转发的目标，审查结果每条消息只计算一次
+    targets = []
+    violation_checked = False
+    is_violation, violation_reason = False, ""
     for config in configs:
-        # 检查是否是源频道的消息
-        if (message.guild.id == config['source_guild_id'] and 
-            message.channel.id == config['source_channel_id']):
-            
-            # 检查审查模式
-            audit_mode = config.get('audit_mode', False)
-            print(f"桥接 {config['bridge_name']} - 审查模式: {audit_mode}")
-            
-            if audit_mode:
-                # 审查模式：只转发违规消息
+        # 检查是否是源服务器的消息
+        if not (message.guild and message.guild.id == config['source_guild_id']):
+            continue
+        
+        # 桥接自定义规则（预编译，没有规则的桥接直接放行）
+        if not rule_engine.allows(config['bridge_name'], message):
+            messages_filtered.inc(config['bridge_name'], 'rule')
+            continue
+        
+        if config.get('audit_mode', False):
+            # 审查模式：只转发违规消息
+            if not violation_checked:
                 is_violation, violation_reason = check_violation_content(message.content)
+                violation_checked = True
                 print(f"违规检查结果: {is_violation}, 原因: {violation_reason}")
-                if is_violation:
-                    await forward_message(message, config, violation_reason)
-                else:
-                    print("消息无违规内容，不转发")
+            if is_violation:
+                targets.append((config, violation_reason))
             else:
-                # 普通模式：转发所有消息
-                print("普通模式：转发消息")
-                await forward_message(message, config)
+                messages_filtered.inc(config['bridge_name'], 'audit')
+        else:
+            # 普通模式：转发所有消息
+            targets.append((config, None))
+    
+    if targets:
+        await forward_to_targets(message, targets, received_at)
     
     # 处理其他命令
     await bot.process_commands(message)
 
-async def forward_message(message: discord.Message, config: Dict, violation_reason: str = None):
-    """转发消息到目标频道"""
+def resolve_mirrored_copies(copies: List[tuple]) -> List[tuple]:
+    """只同步普通模式桥接的副本；审查模式转发的是违规证据，保持原样"""
+    result = []
+    for bridge_name, forwarded_msg_id in copies:
+        config = bridge_configs_by_name.get(bridge_name)
+        # 合并发送的副本包含多条原消息，不做单条同步
+        if not config or config.get('audit_mode', False) or config.get('coalesce_mode', 'off') != 'off':
+            continue
+        webhook_url = webhook_registry.get(config['target_channel_id'])
+        if webhook_url:
+            result.append((webhook_url, config, forwarded_msg_id))
+    return result
+
+@bot.event
+async def on_raw_message_edit(payload: discord.RawMessageUpdateEvent):
+    """源消息被编辑时同步编辑转发副本"""
+    if payload.channel_id not in bridge_routes:
+        return
+    
+    data = payload.data
+    # 只处理内容变化（链接预览展开等也会触发更新事件）
+    if 'content' not in data or data.get('webhook_id') or data.get('author', {}).get('bot'):
+        return
+    
+    copies = resolve_mirrored_copies(await message_map.lookup(payload.message_id))
+    for webhook_url, config, forwarded_msg_id in copies:
+        result = await submit_webhook_request(
+            'PATCH', f"{webhook_url}/messages/{forwarded_msg_id}",
+            {'content': data['content']}
+        )
+        if result.ok:
+            print(f"✏️ 已同步编辑: {config['bridge_name']} | {payload.message_id}")
+        else:
+            print(f"同步编辑失败: {config['bridge_name']} | {result.status} ({result.error})")
+
+@bot.event
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    """源消息被删除时同步删除转发副本"""
+    if payload.channel_id not in bridge_routes:
+        return
+    await delete_forwarded_copies(payload.message_id)
+
+@bot.event
+async def on_raw_bulk_message_delete(payload: discord.RawBulkMessageDeleteEvent):
+    """批量删除时逐条同步"""
+    if payload.channel_id not in bridge_routes:
+        return
+    await asyncio.gather(*(delete_forwarded_copies(message_id) for message_id in payload.message_ids))
+
+async def delete_forwarded_copies(original_msg_id: int):
+    """删除一条原消息的所有转发副本"""
+    copies = resolve_mirrored_copies(await message_map.lookup(original_msg_id))
+    message_map.forget(original_msg_id)
+    for webhook_url, config, forwarded_msg_id in copies:
+        result = await submit_webhook_request(
+            'DELETE', f"{webhook_url}/messages/{forwarded_msg_id}"
+        )
+        if result.ok or result.status == 404:
+            print(f"🗑️ 已同步删除: {config['bridge_name']} | {original_msg_id}")
+        else:
+            print(f"同步删除失败: {config['bridge_name']} | {result.status} ({result.error})")
+
+def build_forward_payload(message: discord.Message) -> Dict:
+    """构建转发用的webhook载荷（同一条消息的所有目标共用）"""
+    author = message.author
+    
+    # 处理附件
+    embeds = []
+    if message.attachments:
+        for attachment in message.attachments:
+            embed = discord.Embed()
+            if attachment.content_type and attachment.content_type.startswith('image/'):
+                embed.set_image(url=attachment.url)
+            else:
+                embed.add_field(
+                    name="📎 附件", 
+                    value=f"[{attachment.filename}]({attachment.url})",
+                    inline=False
+                )
+            embeds.append(embed.to_dict())
+    
+    # 处理嵌入消息
+    if message.embeds:
+        for embed in message.embeds:
+            embeds.append(embed.to_dict())
+    
+    return {
+        'content': message.content,
+        'username': f"{author.display_name}",
+        'avatar_url': str(author.display_avatar.url),
+        'embeds': embeds
+    }
+
+async def forward_to_targets(message: discord.Message, targets: List[tuple],
+                             received_at: Optional[float] = None) -> List[Dict]:
+    """并发转发到多个目标（并发数受限），返回每个目标的结果和耗时"""
+    payload = build_forward_payload(message)
+    semaphore = asyncio.Semaphore(FORWARD_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    if received_at is None:
+        received_at = loop.time()
+    
+    async def run(config: Dict, violation_reason: Optional[str]) -> Dict:
+        async with semaphore:
+            start = loop.time()
+            ok = await forward_message(message, config, violation_reason, payload)
+            # 合并发送只是放入缓冲区，不计入发送延迟
+            if ok and config.get('coalesce_mode', 'off') == 'off':
+                forward_latency.observe(loop.time() - received_at, config['bridge_name'])
+            return {
+                'bridge_name': config['bridge_name'],
+                'ok': ok,
+                'elapsed_ms': (loop.time() - start) * 1000
+            }
+    
+    start = loop.time()
+    results = await asyncio.gather(*(run(config, reason) for config, reason in targets))
+    
+    if len(results) > 1:
+        succeeded = sum(1 for result in results if result['ok'])
+        detail = ", ".join(
+            f"{result['bridge_name']}{'✅' if result['ok'] else '❌'} {result['elapsed_ms']:.0f}ms"
+            for result in results
+        )
+        print(f"📤 消息 {message.id} 扇出 {succeeded}/{len(results)} 成功，"
+              f"总耗时 {(loop.time() - start) * 1000:.0f}ms | {detail}")
+    return results
+
+async def forward_message(message: discord.Message, config: Dict, violation_reason: str = None,
+                          payload: Optional[Dict] = None) -> bool:
+    """转发消息到目标频道（先写入发件箱再发送），成功返回True"""
     try:
-        # 获取目标频道
-        target_guild = bot.get_guild(config['target_guild_id'])
-        if not target_guild:
-            print(f"无法找到目标服务器: {config['target_guild_id']}")
-            return
-        
-        target_channel = target_guild.get_channel(config['target_channel_id'])
-        if not target_channel:
-            print(f"无法找到目标频道: {config['target_channel_id']}")
-            return
-        
-        # 准备用户信息
-        author = message.author
-        username = f"{author.display_name}"
-        avatar_url = str(author.display_avatar.url)
-        
-        # 准备消息内容
-        content = message.content
-        
-        # 处理附件
-        embeds = []
-        if message.attachments:
-            for attachment in message.attachments:
-                embed = discord.Embed()
-                if attachment.content_type and attachment.content_type.startswith('image/'):
-                    embed.set_image(url=attachment.url)
-                else:
-                    embed.add_field(
-                        name="📎 附件", 
-                        value=f"[{attachment.filename}]({attachment.url})",
-                        inline=False
-                    )
-                embeds.append(embed.to_dict())
-        
-        # 处理嵌入消息
-        if message.embeds:
-            for embed in message.embeds:
-                embeds.append(embed.to_dict())
+        if payload is None:
+            payload = build_forward_payload(message)
+        content = payload['content']
         
         # 添加违规提醒（仅审查模式）
         if violation_reason:
             content = f"🚨 **违规内容检测**: {violation_reason}\n\n{content}"
         
-        # 获取或创建webhook
-        webhook_url = config.get('webhook_url')
+        job = {
+            'bridge_name': config['bridge_name'],
+            'original_message_id': message.id,
+            'target_guild_id': config['target_guild_id'],
+            'target_channel_id': config['target_channel_id'],
+            'content': content,
+            'username': payload['username'],
+            'avatar_url': payload['avatar_url'],
+            'embeds': payload['embeds'],
+            'author_id': message.author.id,
+            'author_name': message.author.name,
+            'original_content': message.content
+        }
+        
+        # 先落盘，重启或Discord故障后可以重放
+        try:
+            job_id = await outbox.enqueue(config['bridge_name'], message.id, job)
+            db_write_latency.observe(outbox.last_enqueue_ms / 1000, 'outbox_enqueue')
+            if job_id is None:
+                print(f"跳过重复转发: {config['bridge_name']} | {message.id}")
+                messages_filtered.inc(config['bridge_name'], 'duplicate')
+                return False
+        except sqlite3.Error as e:
+            # 发件箱不可用时仍然尝试直接发送
+            print(f"写入发件箱失败: {e}")
+            job_id = None
+        
+        coalesce_mode = config.get('coalesce_mode', 'off')
+        if coalesce_mode != 'off':
+            # 放入合并缓冲区，窗口结束后一起发送
+            coalescer.add(job, job_id, coalesce_mode, config.get('coalesce_window_ms', DEFAULT_COALESCE_WINDOW_MS))
+            return True
+        
+        return await deliver_forward_job(job, job_id)
+        
+    except Exception as e:
+        print(f"转发消息失败: {e}")
+        return False
+
+async def deliver_forward_job(job: Dict, job_id: Optional[int] = None) -> bool:
+    """发送一个转发任务（可能是合并后的任务），成功后从发件箱删除并记录"""
+    bridge_name = job['bridge_name']
+    parts = job.get('merged') or [(job, job_id)]
+    # 已经发送成功并从发件箱删除的部分，出错时不再标记失败
+    completed = set()
+    
+    async def fail_parts(permanent: bool = False):
+        remaining = [part_id for index, (_, part_id) in enumerate(parts) if index not in completed]
+        if not remaining:
+            return
+        messages_failed.inc(bridge_name, amount=len(remaining))
+        await outbox.fail([part_id for part_id in remaining if part_id], permanent)
+    
+    try:
+        # 获取目标频道
+        target_guild = bot.get_guild(job['target_guild_id'])
+        if not target_guild:
+            print(f"无法找到目标服务器: {job['target_guild_id']}")
+            await fail_parts(permanent=True)
+            return False
+        
+        target_channel = target_guild.get_channel(job['target_channel_id'])
+        if not target_channel:
+            print(f"无法找到目标频道: {job['target_channel_id']}")
+            await fail_parts(permanent=True)
+            return False
+        
+        # 获取webhook（内存缓存，未命中时才访问Discord）
+        webhook_url = webhook_registry.get(target_channel.id)
         if not webhook_url:
-            webhook_url = await create_webhook_if_needed(target_channel)
-            if webhook_url:
-                # 更新配置中的webhook URL
-                conn = sqlite3.connect('bridge_config.db')
-                cursor = conn.cursor()
-                cursor.execute('''
-                    UPDATE bridge_configs 
-                    SET webhook_url = ? 
-                    WHERE bridge_name = ?
-                ''', (webhook_url, config['bridge_name']))
-                conn.commit()
-                conn.close()
+            webhook_url = await webhook_registry.resolve(target_channel)
         
         if not webhook_url:
-            print(f"无法创建webhook for {config['bridge_name']}")
-            return
+            print(f"无法创建webhook for {bridge_name}")
+            await fail_parts()
+            return False
+        
+        # 投递进程模式下转发记录随任务一起交给子进程，发送成功后在子进程写入
+        log_rows = [
+            (bridge_name, part['original_message_id'], part['author_id'], part['author_name'], part['original_content'])
+            for part, _ in parts
+        ] if delivery_workers else None
         
         # 发送消息
-        forwarded_msg_id = await send_webhook_message(
-            webhook_url, content, username, avatar_url, embeds
+        result = await send_webhook_message(
+            webhook_url, job['content'], job['username'], job['avatar_url'], job['embeds'], log_rows
         )
         
-        if forwarded_msg_id:
+        if result.status in (401, 404):
+            # webhook已被删除：重建后重发一次
+            webhook_url = await webhook_registry.recover(target_channel, webhook_url)
+            if webhook_url:
+                result = await send_webhook_message(
+                    webhook_url, job['content'], job['username'], job['avatar_url'], job['embeds'], log_rows
+                )
+        
+        if not result.ok:
+            # 4xx说明请求本身有问题，重放也不会成功
+            await fail_parts(permanent=400 <= result.status < 500 and result.status != 429)
+            return False
+        
+        # 已经发送成功：先把所有部分从发件箱删除，后面记录出错也不会重放
+        await outbox.complete(part_id for _, part_id in parts if part_id)
+        completed.update(range(len(parts)))
+        
+        forwarded_msg_id = result.data.get('id')
+        seen_messages.add(int(forwarded_msg_id))
+        messages_forwarded.inc(bridge_name, amount=len(parts))
+        for part, _ in parts:
             # 记录转发消息
+            message_map.remember(part['original_message_id'], bridge_name, int(forwarded_msg_id))
+            if delivery_workers:
+                continue
             log_forwarded_message(
-                config['bridge_name'], 
-                message.id, 
+                bridge_name, 
+                part['original_message_id'], 
                 forwarded_msg_id,
-                author.id, 
-                author.name, 
-                message.content
+                part['author_id'], 
+                part['author_name'], 
+                part['original_content']
             )
-            
-            print(f"✅ 消息已转发: {config['bridge_name']} | {author.name}: {content[:50]}...")
+        
+        if len(parts) > 1:
+            print(f"✅ 已合并转发 {len(parts)} 条消息: {bridge_name}")
+        else:
+            print(f"✅ 消息已转发: {bridge_name} | {job['author_name']}: {job['content'][:50]}...")
+        return True
         
     except Exception as e:
         print(f"转发消息失败: {e}")
+        await fail_parts()
+        return False
 
-@bot.tree.command(name="bridge_add", description="添加跨服桥接配置（仅管理员）")
-@app_commands.describe(
-    桥接名称="桥接配置的名称",
-    源服务器id="源服务器ID",
-    源频道id="源频道ID", 
-    目标服务器id="目标服务器ID",
-    目标频道id="目标频道ID",
+async def backfill_forward(bridge_name: str, message: discord.Message) -> bool:
+    """按桥接当前的规则转发一条历史消息（与on_message的过滤一致）"""
+    config = bridge_configs_by_name.get(bridge_name)
+    if not config:
+        return False
+    if webhook_registry.is_own_webhook(message.webhook_id) or message.type != discord.MessageType.default:
+        return False
+    if message.author.bot and not (message.webhook_id and FORWARD_FOREIGN_WEBHOOKS):
+        return False
+    if not rule_engine.allows(bridge_name, message):
+        return False
+    
+    if config.get('audit_mode', False):
+        is_violation, violation_reason = check_violation_content(message.content)
+        if not is_violation:
+            return False
+        return await forward_message(message, config, violation_reason)
+    return await forward_message(message, config)
+
+def bridge_delivery_busy(bridge_name: str) -> bool:
+    """目标webhook是否还有实时消息在排队（回填在此期间暂停）"""
+    config = bridge_configs_by_name.get(bridge_name)
+    webhook_url = webhook_registry.get(config['target_channel_id']) if config else None
+    if not webhook_url:
+        return False
+    if delivery_workers:
+        return delivery_workers.pending_for(webhook_url) > 0
+    return webhook_scheduler.pending_for(webhook_url) > 0
+
+def find_logged_forwards(conn: sqlite3.Connection, keys: List[tuple]) -> set:
+    """返回已经记录过转发的 (bridge_name, original_message_id)"""
+    cursor = conn.cursor()
+    
+    logged = set()
+    for bridge_name, original_msg_id in keys:
+        cursor.execute('''
+            SELECT 1 FROM forwarded_messages
+            WHERE original_message_id = ? AND bridge_name = ?
+            LIMIT 1
+        ''', (original_msg_id, bridge_name))
+        if cursor.fetchone():
+            logged.add((bridge_name, original_msg_id))
+    
+    return logged
+
+async def replay_outbox(jobs: List[Tuple[int, Dict]]):
+    """按原顺序重放发件箱中未完成的转发任务（启动时的快照，或运行期间到了重发时间的任务）"""
+    if not jobs:
+        return
+    
+    # 已经发送成功但没来得及标记完成的任务直接跳过
+    logged = await db.run(
+        find_logged_forwards, [(job['bridge_name'], job['original_message_id']) for _, job in jobs]
+    )
+    
+    await outbox.complete(
+        job_id for job_id, job in jobs if (job['bridge_name'], job['original_message_id']) in logged
+    )
+    
+    tasks = []
+    for job_id, job in jobs:
+        if (job['bridge_name'], job['original_message_id']) in logged:
+            continue
+        # 按入队顺序创建任务，调度器按webhook保持先后顺序
+        tasks.append(asyncio.create_task(deliver_forward_job(job, job_id)))
+    
+    print(f"📬 正在重放 {len(tasks)} 个未完成的转发任务")
+    results = await asyncio.gather(*tasks)
+    print(f"📬 发件箱重放完成：{sum(results)}/{len(results)} 成功")
+
+def report_replay_result(task: asyncio.Task):
+    """重放任务结束时报告异常（否则异常只会在任务被回收时出现）"""
+    if task.cancelled():
+        return
+    error = task.exception()
+    if error:
+        print(f"重放发件箱失败: {error!r}")
+
+@bot.tree.command(name="bridge_add", description="添加跨服桥接配置（仅管理员）")
+@app_commands.describe(
+    桥接名称="桥接配置的名称",
+    源服务器id="源服务器ID",
+    源频道id="源频道ID", 
+    目标服务器id="目标服务器ID",
+    目标频道id="目标频道ID",
     审查模式="是否启用审查模式（只转发违规消息）"
 )
 async def bridge_add_command(interaction: discord.Interaction,
@@ -423,10 +1310,11 @@ async def bridge_add_command(interaction: discord.Interaction,
             return
         
         # 保存配置
-        save_bridge_config(
-            桥接名称, source_guild_id, source_channel_id,
+        await db.run(
+            save_bridge_config, 桥接名称, source_guild_id, source_channel_id,
             target_guild_id, target_channel_id, webhook_url, interaction.user.id, 审查模式
         )
+        await reload_bridge_routes()
         
         # 创建成功消息
         embed = discord.Embed(
@@ -475,9 +1363,10 @@ async def bridge_list_command(interaction: discord.Interaction):
         )
         return
     
-    configs = get_bridge_configs()
+    configs = await db.run(get_bridge_configs)
+    groups = await db.run(get_bridge_groups)
     
-    if not configs:
+    if not configs and not groups:
         await interaction.response.send_message(
             "📋 还没有配置任何桥接！",
             ephemeral=True
@@ -486,7 +1375,7 @@ async def bridge_list_command(interaction: discord.Interaction):
     
     embed = discord.Embed(
         title="🌉 跨服桥接配置列表",
-        description=f"当前活跃的桥接数量: {len(configs)}",
+        description=f"当前活跃的桥接数量: {len(configs)}，桥接群组: {len(groups)}",
         color=discord.Color.blue(),
         timestamp=datetime.now()
     )
@@ -502,6 +1391,8 @@ async def bridge_list_command(interaction: discord.Interaction):
         
         status = "🟢 活跃" if config['is_enabled'] else "🔴 禁用"
         mode = "🛡️ 审查模式" if config.get('audit_mode', False) else "📤 普通模式"
+        if config.get('coalesce_mode', 'off') != 'off':
+            mode += f" · 🧩 合并发送（{config['coalesce_mode']}, {config['coalesce_window_ms']} ms）"
         
         embed.add_field(
             name=f"🌉 {config['bridge_name']}",
@@ -514,7 +1405,20 @@ async def bridge_list_command(interaction: discord.Interaction):
             inline=False
         )
     
-    embed.set_footer(text="使用 /bridge_remove 删除桥接")
+    for group_name, members in groups.items():
+        member_names = []
+        for guild_id, channel_id, _ in members:
+            guild = bot.get_guild(guild_id)
+            channel = guild.get_channel(channel_id) if guild else None
+            member_names.append(f"{guild.name} #{channel.name}" if guild and channel else f"未知 ({channel_id})")
+        
+        embed.add_field(
+            name=f"🔁 群组 {group_name}",
+            value=f"**成员频道（{len(members)}）：**\n" + ("\n".join(member_names) or "暂无")[:1000],
+            inline=False
+        )
+    
+    embed.set_footer(text="使用 /bridge_remove 删除桥接，/bridge_group_leave 移出群组成员")
     
     await interaction.response.send_message(embed=embed, ephemeral=True)
 
@@ -532,23 +1436,18 @@ async def bridge_remove_command(interaction: discord.Interaction, 桥接名称:
         return
     
     try:
-        conn = sqlite3.connect('bridge_config.db')
-        cursor = conn.cursor()
-        
         # 检查桥接是否存在
-        cursor.execute('SELECT * FROM bridge_configs WHERE bridge_name = ?', (桥接名称,))
-        if not cursor.fetchone():
+        if not await db.fetchone('SELECT 1 FROM bridge_configs WHERE bridge_name = ?', (桥接名称,)):
             await interaction.response.send_message(
                 f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
                 ephemeral=True
             )
-            conn.close()
             return
         
-        # 删除配置
-        cursor.execute('DELETE FROM bridge_configs WHERE bridge_name = ?', (桥接名称,))
-        conn.commit()
-        conn.close()
+        # 先停止回填（避免它继续写断点），再删除配置、规则和回填记录
+        await backfill_manager.discard(桥接名称)
+        await db.run(delete_bridge_config, 桥接名称)
+        await reload_bridge_routes()
         
         await interaction.response.send_message(
             f"✅ 桥接配置 '{桥接名称}' 已删除！",
@@ -575,27 +1474,21 @@ async def bridge_audit_command(interaction: discord.Interaction, 桥接名称: s
         return
     
     try:
-        conn = sqlite3.connect('bridge_config.db')
-        cursor = conn.cursor()
-        
         # 检查桥接是否存在
-        cursor.execute('SELECT audit_mode FROM bridge_configs WHERE bridge_name = ?', (桥接名称,))
-        result = cursor.fetchone()
+        result = await db.fetchone('SELECT audit_mode FROM bridge_configs WHERE bridge_name = ?', (桥接名称,))
         if not result:
             await interaction.response.send_message(
                 f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
                 ephemeral=True
             )
-            conn.close()
             return
         
         # 切换审查模式
         current_mode = result[0] if result[0] is not None else False
         new_mode = not current_mode
         
-        cursor.execute('UPDATE bridge_configs SET audit_mode = ? WHERE bridge_name = ?', (new_mode, 桥接名称))
-        conn.commit()
-        conn.close()
+        await db.execute('UPDATE bridge_configs SET audit_mode = ? WHERE bridge_name = ?', (new_mode, 桥接名称))
+        await reload_bridge_routes()
         
         mode_text = "🛡️ 审查模式（仅转发违规消息）" if new_mode else "📤 普通模式（转发所有消息）"
         
@@ -632,9 +1525,13 @@ async def bridge_audit_command(interaction: discord.Interaction, 桥接名称: s
             ephemeral=True
         )
 
-@bot.tree.command(name="bridge_stats", description="查看桥接统计信息（仅管理员）")
-async def bridge_stats_command(interaction: discord.Interaction):
-    """查看桥接统计 - 仅管理员"""
+@bot.tree.command(name="bridge_retention", description="设置桥接转发记录的保留天数（仅管理员）")
+@app_commands.describe(
+    桥接名称="要设置的桥接配置名称",
+    保留天数="超过该天数的转发记录会归档到压缩文件（0为永久保留，-1恢复默认值）"
+)
+async def bridge_retention_command(interaction: discord.Interaction, 桥接名称: str, 保留天数: int):
+    """设置转发记录保留策略 - 仅管理员"""
     
     # 检查权限
     if not interaction.user.guild_permissions.administrator:
@@ -644,35 +1541,669 @@ async def bridge_stats_command(interaction: discord.Interaction):
         )
         return
     
+    if not find_bridge_config(桥接名称):
+        await interaction.response.send_message(
+            f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+            ephemeral=True
+        )
+        return
+    
     try:
-        conn = sqlite3.connect('bridge_config.db')
-        cursor = conn.cursor()
+        retention_days = None if 保留天数 < 0 else 保留天数
         
-        # 获取统计数据
-        cursor.execute('SELECT COUNT(*) FROM bridge_configs WHERE is_enabled = TRUE')
-        active_bridges = cursor.fetchone()[0]
+        if not await db.execute('UPDATE bridge_configs SET retention_days = ? WHERE bridge_name = ?',
+                                (retention_days, 桥接名称)):
+            await interaction.response.send_message(
+                f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+                ephemeral=True
+            )
+            return
+        await reload_bridge_routes()
         
-        cursor.execute('SELECT COUNT(*) FROM forwarded_messages')
-        total_messages = cursor.fetchone()[0]
+        if retention_days is None:
+            policy_text = f"默认（{RETENTION_DEFAULT_DAYS} 天）" if RETENTION_DEFAULT_DAYS > 0 else "默认（永久保留）"
+        elif retention_days == 0:
+            policy_text = "永久保留"
+        else:
+            policy_text = f"{retention_days} 天"
         
-        cursor.execute('SELECT COUNT(*) FROM forwarded_messages WHERE DATE(timestamp) = DATE("now")')
-        today_messages = cursor.fetchone()[0]
+        await interaction.response.send_message(
+            f"✅ 桥接 '{桥接名称}' 的转发记录保留策略已设置为：{policy_text}\n"
+            f"过期记录会在后台分批归档到 `{ARCHIVE_DIR}/` 目录。",
+            ephemeral=True
+        )
         
-        # 获取最活跃的桥接
-        cursor.execute('''
-            SELECT bridge_name, COUNT(*) as message_count
-            FROM forwarded_messages 
-            GROUP BY bridge_name 
-            ORDER BY message_count DESC 
-            LIMIT 5
-        ''')
-        top_bridges = cursor.fetchall()
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 设置保留策略失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_coalesce", description="设置桥接的合并发送模式（仅管理员）")
+@app_commands.describe(
+    桥接名称="要设置的桥接配置名称",
+    模式="合并方式",
+    窗口毫秒="合并窗口长度（毫秒）"
+)
+@app_commands.choices(模式=[
+    app_commands.Choice(name="关闭（逐条转发）", value="off"),
+    app_commands.Choice(name="同作者连续消息合并", value="author"),
+    app_commands.Choice(name="摘要模式（窗口内全部合并）", value="digest"),
+])
+async def bridge_coalesce_command(interaction: discord.Interaction, 桥接名称: str, 模式: str,
+                                  窗口毫秒: int = DEFAULT_COALESCE_WINDOW_MS):
+    """设置合并发送模式 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    if not find_bridge_config(桥接名称):
+        await interaction.response.send_message(
+            f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+            ephemeral=True
+        )
+        return
+    
+    if 模式 not in COALESCE_MODES or not 100 <= 窗口毫秒 <= 60000:
+        await interaction.response.send_message(
+            "❌ 无效的参数！窗口长度需要在 100 到 60000 毫秒之间。",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        if not await db.execute(
+            'UPDATE bridge_configs SET coalesce_mode = ?, coalesce_window_ms = ? WHERE bridge_name = ?',
+            (模式, 窗口毫秒, 桥接名称)
+        ):
+            await interaction.response.send_message(
+                f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+                ephemeral=True
+            )
+            return
+        await reload_bridge_routes()
+        
+        mode_text = {
+            'off': "关闭（逐条转发）",
+            'author': f"同作者连续消息合并（{窗口毫秒} ms）",
+            'digest': f"摘要模式（{窗口毫秒} ms）"
+        }[模式]
+        await interaction.response.send_message(
+            f"✅ 桥接 '{桥接名称}' 的合并发送模式已设置为：{mode_text}",
+            ephemeral=True
+        )
+        
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 设置合并发送模式失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_rule_add", description="为桥接添加转发规则（仅管理员）")
+@app_commands.describe(
+    桥接名称="要添加规则的桥接配置名称",
+    规则类型="规则类型",
+    值="用户ID / 身份组ID / 正则表达式 / 最短长度（只转发带附件的消息不需要填写）"
+)
+@app_commands.choices(规则类型=[
+    app_commands.Choice(name=description, value=rule_type) for rule_type, description in RULE_TYPES.items()
+])
+async def bridge_rule_add_command(interaction: discord.Interaction, 桥接名称: str, 规则类型: str,
+                                  值: Optional[str] = None):
+    """添加转发规则 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    if not find_bridge_config(桥接名称):
+        await interaction.response.send_message(
+            f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        value = normalize_rule_value(规则类型, 值)
+    except ValueError as e:
+        await interaction.response.send_message(
+            f"❌ 无效的规则：{e}",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        # 只在桥接仍然存在时插入（检查和插入之间可能已被删除）
+        if not await db.execute('''
+            INSERT INTO bridge_rules (bridge_name, rule_type, value, admin_user_id)
+            SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM bridge_configs WHERE bridge_name = ?)
+        ''', (桥接名称, 规则类型, value, interaction.user.id, 桥接名称)):
+            await interaction.response.send_message(
+                f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+                ephemeral=True
+            )
+            return
+        await reload_bridge_rules()
+        
+        await interaction.response.send_message(
+            f"✅ 已为桥接 '{桥接名称}' 添加规则：{RULE_TYPES[规则类型]}" + (f" `{value}`" if value else ""),
+            ephemeral=True
+        )
+    
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 添加规则失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_rule_remove", description="删除桥接的转发规则（仅管理员）")
+@app_commands.describe(规则id="要删除的规则ID（可在 /bridge_rule_list 中查看）")
+async def bridge_rule_remove_command(interaction: discord.Interaction, 规则id: int):
+    """删除转发规则 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        if not await db.execute('DELETE FROM bridge_rules WHERE id = ?', (规则id,)):
+            await interaction.response.send_message(
+                f"❌ 找不到ID为 {规则id} 的规则！",
+                ephemeral=True
+            )
+            return
+        await reload_bridge_rules()
+        rule_engine.hits.pop(规则id, None)
+        
+        await interaction.response.send_message(
+            f"✅ 规则 {规则id} 已删除！",
+            ephemeral=True
+        )
+    
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 删除规则失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_rule_list", description="查看桥接的转发规则和命中次数（仅管理员）")
+@app_commands.describe(桥接名称="只查看指定桥接的规则（可选）")
+async def bridge_rule_list_command(interaction: discord.Interaction, 桥接名称: Optional[str] = None):
+    """查看转发规则 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    rules = await db.run(get_bridge_rules)
+    if 桥接名称:
+        rules = [rule for rule in rules if rule.bridge_name == 桥接名称]
+    
+    if not rules:
+        await interaction.response.send_message(
+            "📋 还没有配置任何转发规则，所有消息都会转发。",
+            ephemeral=True
+        )
+        return
+    
+    embed = discord.Embed(
+        title="📏 桥接转发规则",
+        description="排除规则优先；同类包含规则满足其一即可，不同类规则需要同时满足。",
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    
+    by_bridge: Dict[str, List[str]] = {}
+    for rule in rules:
+        line = f"`#{rule.id}` {RULE_TYPES.get(rule.rule_type, rule.rule_type)}"
+        if rule.value:
+            line += f" `{rule.value}`"
+        line += f" · 命中 {rule_engine.hits[rule.id]:,} 次"
+        by_bridge.setdefault(rule.bridge_name, []).append(line)
+    
+    for bridge_name, lines in list(by_bridge.items())[:25]:
+        embed.add_field(name=f"🌉 {bridge_name}", value="\n".join(lines)[:1024], inline=False)
+    
+    embed.set_footer(text="命中次数自本次启动起统计 · 使用 /bridge_rule_remove 删除规则")
+    await interaction.response.send_message(embed=embed, ephemeral=True)
+
+@bot.tree.command(name="bridge_backfill", description="把源频道的历史消息补发到目标频道（仅管理员）")
+@app_commands.describe(
+    桥接名称="要回填的桥接配置名称",
+    操作="开始、查看进度或取消"
+)
+@app_commands.choices(操作=[
+    app_commands.Choice(name="开始回填", value="start"),
+    app_commands.Choice(name="查看进度", value="status"),
+    app_commands.Choice(name="取消回填", value="cancel"),
+])
+async def bridge_backfill_command(interaction: discord.Interaction, 桥接名称: str, 操作: str = "start"):
+    """历史消息回填 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    config = find_bridge_config(桥接名称)
+    if not config:
+        await interaction.response.send_message(
+            f"❌ 找不到名为 '{桥接名称}' 的桥接配置！",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        if 操作 == "status":
+            job = await backfill_manager.status(桥接名称)
+            if not job:
+                await interaction.response.send_message(
+                    f"📋 桥接 '{桥接名称}' 还没有回填记录。",
+                    ephemeral=True
+                )
+                return
+            status_text = {
+                'running': "⏳ 进行中" if backfill_manager.is_running(桥接名称) else "⏸️ 等待恢复",
+                'done': "✅ 已完成",
+                'failed': f"❌ 失败（{job.error}）",
+                'cancelled': "🛑 已取消"
+            }.get(job.status, job.status)
+            await interaction.response.send_message(
+                f"📥 桥接 '{桥接名称}' 回填状态：{status_text}\n{BackfillManager.describe(job)}",
+                ephemeral=True
+            )
+            return
+        
+        if 操作 == "cancel":
+            if await backfill_manager.cancel(桥接名称):
+                await interaction.response.send_message(
+                    f"🛑 已取消桥接 '{桥接名称}' 的回填。",
+                    ephemeral=True
+                )
+            else:
+                await interaction.response.send_message(
+                    f"❌ 桥接 '{桥接名称}' 没有正在进行的回填！",
+                    ephemeral=True
+                )
+            return
+        
+        if backfill_manager.is_running(桥接名称):
+            await interaction.response.send_message(
+                f"❌ 桥接 '{桥接名称}' 的回填已在进行中，使用 `操作: 查看进度` 查看。",
+                ephemeral=True
+            )
+            return
+        
+        source_channel = bot.get_channel(config['source_channel_id'])
+        if not source_channel:
+            await interaction.response.send_message(
+                f"❌ 无法找到源频道 ID: {config['source_channel_id']}",
+                ephemeral=True
+            )
+            return
+        
+        await backfill_manager.start(桥接名称, source_channel, interaction.user.id)
+        await interaction.response.send_message(
+            f"📥 已开始在后台回填桥接 '{桥接名称}' 的历史消息（每秒最多 {BACKFILL_RATE:g} 条，实时转发优先）。\n"
+            f"使用 `/bridge_backfill 操作: 查看进度` 查看进度和预计剩余时间，机器人重启后会从断点继续。",
+            ephemeral=True
+        )
+        
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 回填操作失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_group_create", description="创建双向/多向桥接群组（仅管理员）")
+@app_commands.describe(群组名称="桥接群组的名称")
+async def bridge_group_create_command(interaction: discord.Interaction, 群组名称: str):
+    """创建桥接群组 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        created = await db.execute(
+            'INSERT OR IGNORE INTO bridge_groups (group_name, admin_user_id) VALUES (?, ?)',
+            (群组名称, interaction.user.id)
+        ) > 0
+        
+        if not created:
+            await interaction.response.send_message(
+                f"❌ 桥接群组 '{群组名称}' 已存在！",
+                ephemeral=True
+            )
+            return
+        
+        await interaction.response.send_message(
+            f"✅ 桥接群组 '{群组名称}' 已创建！\n"
+            f"使用 `/bridge_group_join` 加入频道，群组内任一频道的消息会转发到其他所有成员频道。",
+            ephemeral=True
+        )
+    
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 创建桥接群组失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_group_join", description="把频道加入桥接群组（仅管理员）")
+@app_commands.describe(
+    群组名称="要加入的桥接群组名称",
+    服务器id="频道所在的服务器ID",
+    频道id="要加入群组的频道ID"
+)
+async def bridge_group_join_command(interaction: discord.Interaction, 群组名称: str, 服务器id: str, 频道id: str):
+    """加入桥接群组 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        guild_id = int(服务器id)
+        channel_id = int(频道id)
+        
+        guild = bot.get_guild(guild_id)
+        channel = guild.get_channel(channel_id) if guild else None
+        if not channel:
+            await interaction.response.send_message(
+                f"❌ 无法找到频道 ID: {频道id}",
+                ephemeral=True
+            )
+            return
+        
+        if not await db.fetchone('SELECT 1 FROM bridge_groups WHERE group_name = ?', (群组名称,)):
+            await interaction.response.send_message(
+                f"❌ 找不到名为 '{群组名称}' 的桥接群组！",
+                ephemeral=True
+            )
+            return
+        
+        # 加入时就准备好webhook，第一条消息不用等待创建
+        webhook_url = await create_webhook_if_needed(channel)
+        if not webhook_url:
+            await interaction.response.send_message(
+                f"❌ 无法为频道创建webhook！请检查机器人权限。",
+                ephemeral=True
+            )
+            return
+        
+        await db.execute('''
+            INSERT OR REPLACE INTO bridge_group_members (group_name, guild_id, channel_id, webhook_url)
+            VALUES (?, ?, ?, ?)
+        ''', (群组名称, guild_id, channel_id, webhook_url))
+        await reload_bridge_routes()
+        
+        members = (await db.run(get_bridge_groups)).get(群组名称, [])
+        await interaction.response.send_message(
+            f"✅ {guild.name} #{channel.name} 已加入桥接群组 '{群组名称}'（当前 {len(members)} 个成员频道）",
+            ephemeral=True
+        )
+    
+    except ValueError:
+        await interaction.response.send_message(
+            "❌ 无效的ID格式！请输入正确的数字ID。",
+            ephemeral=True
+        )
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 加入桥接群组失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_group_leave", description="把频道移出桥接群组（仅管理员）")
+@app_commands.describe(
+    群组名称="桥接群组名称",
+    频道id="要移出群组的频道ID"
+)
+async def bridge_group_leave_command(interaction: discord.Interaction, 群组名称: str, 频道id: str):
+    """退出桥接群组 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        removed = await db.execute(
+            'DELETE FROM bridge_group_members WHERE group_name = ? AND channel_id = ?',
+            (群组名称, int(频道id))
+        ) > 0
+        
+        if not removed:
+            await interaction.response.send_message(
+                f"❌ 频道 {频道id} 不在桥接群组 '{群组名称}' 中！",
+                ephemeral=True
+            )
+            return
+        
+        await reload_bridge_routes()
+        await interaction.response.send_message(
+            f"✅ 频道 {频道id} 已退出桥接群组 '{群组名称}'",
+            ephemeral=True
+        )
+    
+    except ValueError:
+        await interaction.response.send_message(
+            "❌ 无效的ID格式！请输入正确的数字ID。",
+            ephemeral=True
+        )
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 退出桥接群组失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_group_remove", description="删除桥接群组（仅管理员）")
+@app_commands.describe(群组名称="要删除的桥接群组名称")
+async def bridge_group_remove_command(interaction: discord.Interaction, 群组名称: str):
+    """删除桥接群组 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        removed = await db.run(delete_bridge_group, 群组名称)
         
-        conn.close()
+        if not removed:
+            await interaction.response.send_message(
+                f"❌ 找不到名为 '{群组名称}' 的桥接群组！",
+                ephemeral=True
+            )
+            return
+        
+        await reload_bridge_routes()
+        await interaction.response.send_message(
+            f"✅ 桥接群组 '{群组名称}' 已删除！",
+            ephemeral=True
+        )
+    
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 删除桥接群组失败：{e}",
+            ephemeral=True
+        )
+
+SEARCH_PAGE_SIZE = 10
+
+def build_search_embed(query: str, results: List[SearchResult], page: int, has_more: bool) -> discord.Embed:
+    """构建一页搜索结果"""
+    embed = discord.Embed(
+        title=f"🔍 搜索：{query}"[:256],
+        description="没有找到匹配的转发记录。" if not results else None,
+        color=discord.Color.blue(),
+        timestamp=datetime.now()
+    )
+    for index, result in enumerate(results, (page - 1) * SEARCH_PAGE_SIZE + 1):
+        embed.add_field(
+            name=f"{index}. {result.bridge_name} · {result.author_name} · {result.timestamp} UTC"[:256],
+            value=(result.snippet or "（无文字内容）")[:1024],
+            inline=False
+        )
+    footer = f"第 {page} 页" + ("" if has_more else " · 已是最后一页")
+    if not parse_query(query)[0]:
+        footer += f" · 关键词都少于3个字，只搜索最近 {SHORT_TERM_SCAN_ROWS} 条记录"
+    embed.set_footer(text=footer)
+    return embed
+
+class SearchResultsView(discord.ui.View):
+    """搜索结果翻页"""
+    
+    def __init__(self, query: str, filters: Dict, page: int, has_more: bool):
+        super().__init__(timeout=300)
+        self.query = query
+        self.filters = filters
+        self.page = page
+        self.previous_button.disabled = page <= 1
+        self.next_button.disabled = not has_more
+    
+    async def show_page(self, interaction: discord.Interaction, page: int):
+        results, has_more = await run_search(self.query, self.filters, page)
+        self.page = page
+        self.previous_button.disabled = page <= 1
+        self.next_button.disabled = not has_more
+        await interaction.response.edit_message(
+            embed=build_search_embed(self.query, results, page, has_more),
+            view=self
+        )
+    
+    @discord.ui.button(label="◀ 上一页", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page - 1)
+    
+    @discord.ui.button(label="下一页 ▶", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self.show_page(interaction, self.page + 1)
+
+async def run_search(query: str, filters: Dict, page: int) -> tuple:
+    """查询一页结果，多取一条用来判断是否还有下一页"""
+    results = await db.run(
+        search_messages, query,
+        limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE, **filters
+    )
+    return results[:SEARCH_PAGE_SIZE], len(results) > SEARCH_PAGE_SIZE
+
+@bot.tree.command(name="bridge_search", description="搜索转发记录（仅管理员）")
+@app_commands.describe(
+    关键词="要搜索的内容、作者名或桥接名，多个词用空格分隔，用双引号搜索完整短语",
+    桥接名称="只搜索指定桥接（可选）",
+    开始日期="起始日期，格式 YYYY-MM-DD（UTC，可选）",
+    结束日期="结束日期，格式 YYYY-MM-DD（UTC，包含当天，可选）",
+    页码="从第几页开始显示"
+)
+async def bridge_search_command(interaction: discord.Interaction, 关键词: str,
+                                桥接名称: Optional[str] = None,
+                                开始日期: Optional[str] = None,
+                                结束日期: Optional[str] = None,
+                                页码: int = 1):
+    """搜索转发记录 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    if not bot.search_enabled:
+        await interaction.response.send_message(
+            "❌ 全文搜索不可用：当前SQLite不支持FTS5 trigram分词（需要3.34及以上版本）。",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        filters = {
+            'bridge_name': 桥接名称,
+            'start_day': date.fromisoformat(开始日期) if 开始日期 else None,
+            'end_day': date.fromisoformat(结束日期) if 结束日期 else None
+        }
+    except ValueError:
+        await interaction.response.send_message(
+            "❌ 无效的日期格式！请使用 YYYY-MM-DD，例如 2024-01-31。",
+            ephemeral=True
+        )
+        return
+    
+    try:
+        page = max(1, 页码)
+        results, has_more = await run_search(关键词, filters, page)
+        await interaction.response.send_message(
+            embed=build_search_embed(关键词, results, page, has_more),
+            view=SearchResultsView(关键词, filters, page, has_more),
+            ephemeral=True
+        )
+    
+    except Exception as e:
+        await interaction.response.send_message(
+            f"❌ 搜索失败：{e}",
+            ephemeral=True
+        )
+
+@bot.tree.command(name="bridge_stats", description="查看桥接统计信息（仅管理员）")
+@app_commands.describe(桥接名称="只查看指定桥接的统计（可选）")
+async def bridge_stats_command(interaction: discord.Interaction, 桥接名称: Optional[str] = None):
+    """查看桥接统计 - 仅管理员"""
+    
+    # 检查权限
+    if not interaction.user.guild_permissions.administrator:
+        await interaction.response.send_message(
+            "❌ 此命令仅限管理员使用！", 
+            ephemeral=True
+        )
+        return
+    
+    try:
+        # 从统计汇总表读取（在线程中执行，不阻塞事件循环）
+        stats = await db.run(get_bridge_stats, 桥接名称)
+        active_bridges = len(bridge_configs_by_name)
+        total_messages = stats['total_messages']
+        today_messages = stats['today_messages']
+        top_bridges = stats['top_bridges']
         
         # 创建统计信息
         embed = discord.Embed(
-            title="📊 跨服桥接统计",
+            title=f"📊 跨服桥接统计 - {桥接名称}" if 桥接名称 else "📊 跨服桥接统计",
             color=discord.Color.green(),
             timestamp=datetime.now()
         )
@@ -692,6 +2223,77 @@ async def bridge_stats_command(interaction: discord.Interaction):
             inline=True
         )
         
+        if stats['daily']:
+            embed.add_field(
+                name="📅 近7天（UTC）",
+                value="\n".join(f"`{day[5:]}` {count:,} 条" for day, count in stats['daily']),
+                inline=True
+            )
+        
+        if stats['hourly']:
+            embed.add_field(
+                name="⏰ 近24小时（UTC）",
+                value=" ".join(f"`{hour[11:]}时`{count}" for hour, count in stats['hourly'])[:1024],
+                inline=False
+            )
+        
+        delivery_stats = current_delivery_stats()
+        delivery_text = (
+            f"**排队中：** {delivery_stats['pending']} 条\n"
+            f"**限流次数：** {delivery_stats['rate_limited']}\n"
+            f"**重试次数：** {delivery_stats['retries']}"
+        )
+        if delivery_workers:
+            delivery_text += f"\n**投递进程：** {delivery_stats['workers']}/{DELIVERY_WORKERS}"
+        embed.add_field(
+            name="📮 投递队列",
+            value=delivery_text,
+            inline=True
+        )
+        
+        embed.add_field(
+            name="🧩 合并发送",
+            value=(
+                f"**已合并消息：** {coalescer.coalesced_messages:,} 条\n"
+                f"**节省API调用：** {coalescer.saved_calls:,} 次"
+            ),
+            inline=True
+        )
+        
+        outbox_stats = outbox.stats()
+        embed.add_field(
+            name="📬 发件箱",
+            value=(
+                f"**未完成：** {outbox_stats['pending']} 条\n"
+                f"**已放弃：** {outbox_stats['failed']} 条\n"
+                f"**运行中重发：** {outbox_stats['retried']} 次\n"
+                f"**入队耗时：** {outbox_stats['last_enqueue_ms']:.2f} ms"
+            ),
+            inline=True
+        )
+        
+        writer_stats = log_writer.stats()
+        embed.add_field(
+            name="📝 记录写入",
+            value=(
+                f"**待写入：** {writer_stats['queue_depth']} 条\n"
+                f"**最近提交耗时：** {writer_stats['last_flush_ms']:.1f} ms\n"
+                f"**最大提交耗时：** {writer_stats['max_flush_ms']:.1f} ms"
+            ),
+            inline=True
+        )
+        
+        db_stats = db.stats()
+        embed.add_field(
+            name="🗄️ 数据库",
+            value=(
+                f"**已执行查询：** {db_stats['queries']:,} 次\n"
+                f"**最大查询耗时：** {db_stats['max_query_ms']:.1f} ms\n"
+                f"**事件循环最大延迟：** {loop_lag_monitor.max_lag * 1000:.1f} ms"
+            ),
+            inline=True
+        )
+        
         if top_bridges:
             top_text = ""
             for i, (bridge_name, count) in enumerate(top_bridges, 1):
@@ -731,6 +2333,17 @@ async def bridge_help_command(interaction: discord.Interaction):
             "`/bridge_list` - 查看所有桥接配置\n"
             "`/bridge_remove` - 删除桥接配置\n"
             "`/bridge_audit` - 切换审查模式\n"
+            "`/bridge_retention` - 设置记录保留天数\n"
+            "`/bridge_coalesce` - 设置合并发送模式\n"
+            "`/bridge_rule_add` - 添加转发规则\n"
+            "`/bridge_rule_remove` - 删除转发规则\n"
+            "`/bridge_rule_list` - 查看转发规则和命中次数\n"
+            "`/bridge_backfill` - 补发历史消息\n"
+            "`/bridge_group_create` - 创建双向/多向桥接群组\n"
+            "`/bridge_group_join` - 把频道加入群组\n"
+            "`/bridge_group_leave` - 把频道移出群组\n"
+            "`/bridge_group_remove` - 删除桥接群组\n"
+            "`/bridge_search` - 搜索转发记录\n"
             "`/bridge_stats` - 查看转发统计\n"
             "`/bridge_help` - 查看帮助"
         ),
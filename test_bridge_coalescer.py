@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+
+from bridge_coalescer import MAX_CONTENT_LENGTH, ForwardCoalescer
+
+def make_job(index: int, content: str, author_id: int = 1) -> dict:
+    return {
+        'bridge_name': 'test',
+        'original_message_id': index,
+        'content': content,
+        'username': f"user{author_id}",
+        'avatar_url': None,
+        'embeds': [],
+        'author_id': author_id,
+        'author_name': f"user{author_id}",
+        'original_content': content
+    }
+
+class ForwardCoalescerTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sent = []
+
+        async def deliver(job, job_id):
+            self.sent.append((job, job_id))
+            return True
+
+        self.coalescer = ForwardCoalescer(deliver)
+
+    async def test_long_message_in_digest_mode_is_sent_unmerged(self):
+        content = 'x' * 1995
+        self.coalescer.add(make_job(1, content), 11, 'digest', 50)
+        # 不进入缓冲区，不等合并窗口
+        self.assertEqual(self.coalescer.pending(), 0)
+        await self.coalescer.flush_all()
+
+        self.assertEqual(len(self.sent), 1)
+        job, job_id = self.sent[0]
+        self.assertEqual(job_id, 11)
+        self.assertEqual(job['content'], content)
+        self.assertNotIn('merged', job)
+        self.assertLessEqual(len(job['content']), MAX_CONTENT_LENGTH)
+
+    async def test_long_message_flushes_buffer_first(self):
+        self.coalescer.add(make_job(1, 'hello'), 11, 'digest', 1000)
+        self.coalescer.add(make_job(2, 'world', author_id=2), 12, 'digest', 1000)
+        self.coalescer.add(make_job(3, 'y' * 1995), 13, 'digest', 1000)
+        await self.coalescer.flush_all()
+
+        self.assertEqual(len(self.sent), 2)
+        merged, _ = self.sent[0]
+        self.assertEqual([part['original_message_id'] for part, _ in merged['merged']], [1, 2])
+        self.assertEqual(self.sent[1][1], 13)
+        self.assertEqual(self.coalescer.pending(), 0)
+
+    async def test_digest_never_exceeds_limit(self):
+        for index in range(20):
+            self.coalescer.add(make_job(index, 'z' * 300, author_id=index), index, 'digest', 1000)
+        await self.coalescer.flush_all()
+
+        self.assertEqual(sum(len(job.get('merged') or [None]) for job, _ in self.sent), 20)
+        for job, _ in self.sent:
+            self.assertLessEqual(len(job['content']), MAX_CONTENT_LENGTH)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,10 +1,13 @@
 import discord
 from discord.ext import commands
-import sqlite3
 import os
 from datetime import datetime
 from typing import Optional
 
+from vote_buffer import VoteWriteBuffer
+from vote_db import VoteDatabase
+from vote_names import NameResolver
+
 # 配置
 BOT_TOKEN = os.getenv('VOTE_BOT_TOKEN', "你的投票机器人TOKEN")
 
@@ -14,71 +17,29 @@ intents.message_content = True
 intents.guilds = True
 intents.members = True
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+# 投票数据库（与V2共用，持久连接，查询在后台线程执行）
+vote_db = VoteDatabase('votes.db')
+# 投票先进内存缓冲，每300毫秒合并成一个事务提交；读取能看到还没提交的投票
+vote_buffer = VoteWriteBuffer(vote_db)
 
-# 数据库初始化
-def init_database():
-    """初始化SQLite数据库"""
-    conn = sqlite3.connect('votes.db')
-    cursor = conn.cursor()
-    
-    # 创建投票表
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS votes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            voter_id INTEGER NOT NULL,
-            target_id INTEGER NOT NULL,
-            vote_type TEXT NOT NULL,
-            guild_id INTEGER NOT NULL,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(voter_id, target_id, guild_id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+class VoteBot(commands.Bot):
+    """投票机器人，负责数据库连接的生命周期"""
+    
+    async def setup_hook(self):
+        """登录后、连接网关前初始化数据库并启动投票缓冲"""
+        await vote_db.open()
+        vote_buffer.start()
+    
+    async def close(self):
+        """关闭机器人时写完缓冲中的投票，再关闭数据库连接"""
+        await super().close()
+        await vote_buffer.stop()
+        await vote_db.close()
 
-def get_user_stats(user_id: int, guild_id: int) -> dict:
-    """获取用户的投票统计"""
-    conn = sqlite3.connect('votes.db')
-    cursor = conn.cursor()
-    
-    # 获取好票数
-    cursor.execute('''
-        SELECT COUNT(*) FROM votes 
-        WHERE target_id = ? AND vote_type = '好票' AND guild_id = ?
-    ''', (user_id, guild_id))
-    good_votes = cursor.fetchone()[0]
-    
-    # 获取坏票数
-    cursor.execute('''
-        SELECT COUNT(*) FROM votes 
-        WHERE target_id = ? AND vote_type = '坏票' AND guild_id = ?
-    ''', (user_id, guild_id))
-    bad_votes = cursor.fetchone()[0]
-    
-    conn.close()
-    return {'good_votes': good_votes, 'bad_votes': bad_votes}
+bot = VoteBot(command_prefix='!', intents=intents)
 
-def cast_vote(voter_id: int, target_id: int, vote_type: str, guild_id: int) -> bool:
-    """投票功能"""
-    conn = sqlite3.connect('votes.db')
-    cursor = conn.cursor()
-    
-    try:
-        # 使用 INSERT OR REPLACE 来处理重复投票
-        cursor.execute('''
-            INSERT OR REPLACE INTO votes (voter_id, target_id, vote_type, guild_id)
-            VALUES (?, ?, ?, ?)
-        ''', (voter_id, target_id, vote_type, guild_id))
-        
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        print(f"投票错误: {e}")
-        conn.close()
-        return False
+# 排行榜和投票记录中的成员名称解析（成员缓存 → LRU → 有并发上限的REST请求）
+name_resolver = NameResolver(bot)
 
 @bot.event
 async def on_ready():
@@ -87,9 +48,6 @@ async def on_ready():
     print(f'机器人ID: {bot.user.id}')
     print('-----')
     
-    # 初始化数据库
-    init_database()
-    
     # 同步斜杠命令
     try:
         synced = await bot.tree.sync()
@@ -128,7 +86,7 @@ async def vote_command(interaction: discord.Interaction,
         return
     
     # 执行投票
-    success = cast_vote(
+    success = await vote_buffer.cast_vote(
         interaction.user.id, 
         用户.id, 
         票型, 
@@ -168,7 +126,7 @@ async def stats_command(interaction: discord.Interaction,
         用户 = interaction.user
     
     # 获取统计数据
-    stats = get_user_stats(用户.id, interaction.guild.id)
+    stats = await vote_buffer.get_user_stats(用户.id, interaction.guild.id)
     
     # 创建统计嵌入消息
     embed = discord.Embed(
@@ -221,25 +179,8 @@ async def leaderboard_command(interaction: discord.Interaction):
         )
         return
     
-    conn = sqlite3.connect('votes.db')
-    cursor = conn.cursor()
-    
     # 获取排行榜数据
-    cursor.execute('''
-        SELECT target_id,
-               SUM(CASE WHEN vote_type = '好票' THEN 1 ELSE 0 END) as good_votes,
-               SUM(CASE WHEN vote_type = '坏票' THEN 1 ELSE 0 END) as bad_votes,
-               COUNT(*) as total_votes
-        FROM votes 
-        WHERE guild_id = ?
-        GROUP BY target_id
-        HAVING total_votes > 0
-        ORDER BY good_votes DESC, total_votes DESC
-        LIMIT 10
-    ''', (interaction.guild.id,))
-    
-    results = cursor.fetchall()
-    conn.close()
+    results = await vote_buffer.get_leaderboard(interaction.guild.id, limit=10)
     
     if not results:
         await interaction.response.send_message(
@@ -256,13 +197,11 @@ async def leaderboard_command(interaction: discord.Interaction):
         timestamp=datetime.now()
     )
     
+    names = await name_resolver.resolve(interaction.guild, [row[0] for row in results])
+    
     leaderboard_text = ""
     for i, (user_id, good_votes, bad_votes, total_votes) in enumerate(results, 1):
-        try:
-            user = await bot.fetch_user(user_id)
-            user_name = user.display_name if hasattr(user, 'display_name') else user.name
-        except:
-            user_name = f"用户{user_id}"
+        user_name = names[user_id]
         
         good_percentage = (good_votes / total_votes) * 100 if total_votes > 0 else 0
         
@@ -280,19 +219,7 @@ async def leaderboard_command(interaction: discord.Interaction):
 async def my_votes_command(interaction: discord.Interaction):
     """查看自己的投票历史"""
     
-    conn = sqlite3.connect('votes.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        SELECT target_id, vote_type, timestamp
-        FROM votes 
-        WHERE voter_id = ? AND guild_id = ?
-        ORDER BY timestamp DESC
-        LIMIT 20
-    ''', (interaction.user.id, interaction.guild.id))
-    
-    results = cursor.fetchall()
-    conn.close()
+    results = await vote_buffer.get_recent_votes(interaction.user.id, interaction.guild.id)
     
     if not results:
         await interaction.response.send_message(
@@ -308,13 +235,11 @@ async def my_votes_command(interaction: discord.Interaction):
         timestamp=datetime.now()
     )
     
+    names = await name_resolver.resolve(interaction.guild, [row[0] for row in results])
+    
     votes_text = ""
     for target_id, vote_type, timestamp in results:
-        try:
-            user = await bot.fetch_user(target_id)
-            user_name = user.display_name if hasattr(user, 'display_name') else user.name
-        except:
-            user_name = f"用户{target_id}"
+        user_name = names[target_id]
         
         vote_emoji = "👍" if vote_type == "好票" else "👎"
         votes_text += f"{vote_emoji} {user_name} - {vote_type}\n"
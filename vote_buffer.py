@@ -0,0 +1,227 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from vote_db import LeaderboardRow, VoteDatabase, VoteKey, cutoff_day, cutoff_timestamp
+
+# 待写入的投票：(voter_id, target_id, guild_id) -> (vote_type, timestamp)
+PendingVotes = Dict[VoteKey, Tuple[str, str]]
+
+T = TypeVar('T')
+
+_VOTE_INDEX = {'好票': 0, '坏票': 1}
+
+class VoteWriteBuffer:
+    """投票写缓冲：/vote 只记进内存立即返回，后台每隔一段时间在一个事务中批量提交
+
+    同一投票人对同一成员的多次投票在缓冲中只保留最后一次。读取时把还没提交的投票叠加到
+    数据库结果上，刚投的票马上就能在 /stats、/leaderboard、/my_votes 中看到。
+    """
+
+    def __init__(self, db: VoteDatabase, flush_interval: float = 0.3, max_pending: int = 5000):
+        self.db = db
+        self.flush_interval = flush_interval
+        # 缓冲达到这个数量时不等计时器，立即提交
+        self.max_pending = max_pending
+
+        self._pending: PendingVotes = {}
+        self._has_pending = asyncio.Event()
+        self._full = asyncio.Event()
+        # 没有提交在进行时置位；读取只在这时对缓冲做快照
+        self._idle = asyncio.Event()
+        self._idle.set()
+        # 每次开始提交加一，读取据此判断期间数据库是否被缓冲中的投票改变过
+        self._flush_seq = 0
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+        # 运行统计
+        self.accepted = 0
+        self.deduplicated = 0
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_batches = 0
+        self.max_flush_ms = 0.0
+
+    @property
+    def pending(self) -> int:
+        """等待提交的投票数"""
+        return len(self._pending)
+
+    def start(self):
+        """启动后台提交任务"""
+        self._stopping = False
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止后台任务，并提交缓冲中剩余的投票"""
+        self._stopping = True
+        self._has_pending.set()
+        self._full.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+        if self._pending:
+            print(f"⚠️ 关闭时仍有 {len(self._pending)} 张投票未能写入数据库")
+
+    async def cast_vote(self, voter_id: int, target_id: int, vote_type: str, guild_id: int) -> bool:
+        """接受一张投票（重复投票覆盖之前的票），不等待数据库"""
+        key = (voter_id, target_id, guild_id)
+        if key in self._pending:
+            self.deduplicated += 1
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        self._pending[key] = (vote_type, timestamp)
+        self.accepted += 1
+        self._has_pending.set()
+        if len(self._pending) >= self.max_pending:
+            self._full.set()
+        return True
+
+    async def flush(self) -> bool:
+        """立即提交缓冲中的投票；失败的投票放回缓冲，下次再试，返回是否成功"""
+        await self._wait_idle()
+        if not self._pending:
+            return True
+
+        self._idle.clear()
+        self._flush_seq += 1
+        batch, self._pending = self._pending, {}
+        self._full.clear()
+        start = time.perf_counter()
+        try:
+            await self.db.cast_votes(
+                (voter_id, target_id, vote_type, guild_id, timestamp)
+                for (voter_id, target_id, guild_id), (vote_type, timestamp) in batch.items()
+            )
+        except Exception as e:
+            print(f"批量写入投票失败（{len(batch)} 张）: {e}")
+            self.failed_batches += 1
+            # 提交期间又投的新票更新，保留新票
+            for key, vote in batch.items():
+                self._pending.setdefault(key, vote)
+            return False
+        else:
+            self.rows_written += len(batch)
+            self.batches_written += 1
+            self.max_flush_ms = max(self.max_flush_ms, (time.perf_counter() - start) * 1000)
+            return True
+        finally:
+            if not self._pending:
+                self._has_pending.clear()
+            self._idle.set()
+
+    async def get_user_stats(self, user_id: int, guild_id: int, days: Optional[int] = None) -> dict:
+        """成员收到的好票/坏票数，包含尚未提交的投票"""
+
+        async def read(pending: PendingVotes) -> dict:
+            mine = {key: vote for key, vote in pending.items() if key[1] == user_id and key[2] == guild_id}
+            stats = await self.db.get_user_stats(user_id, guild_id, days)
+            if not mine:
+                return stats
+
+            existing = await self.db.get_votes(mine)
+            cutoff = cutoff_timestamp(days) if days else ''
+            counts = [stats['good_votes'], stats['bad_votes']]
+            self._apply(counts, mine, existing, lambda timestamp: timestamp >= cutoff)
+            return {'good_votes': counts[0], 'bad_votes': counts[1]}
+
+        return await self._consistent_read(read)
+
+    async def get_leaderboard(self, guild_id: int, days: Optional[int] = None, limit: int = 10) -> List[LeaderboardRow]:
+        """排行榜，包含尚未提交的投票"""
+
+        async def read(pending: PendingVotes) -> List[LeaderboardRow]:
+            mine = {key: vote for key, vote in pending.items() if key[2] == guild_id}
+            if not mine:
+                return await self.db.get_leaderboard(guild_id, days, limit)
+
+            # 受影响的成员最多挤掉同样多的名次，多取这么多行就能保证结果完整
+            targets = {key[1] for key in mine}
+            rows = await self.db.get_leaderboard(guild_id, days, limit + len(targets))
+            existing = await self.db.get_votes(mine)
+            board = {target_id: [good, bad] for target_id, good, bad, _ in rows}
+            for target_id, totals in (await self.db.get_target_totals(guild_id, targets, days)).items():
+                board[target_id] = list(totals)
+
+            # 排行榜的时间窗口按整天计算
+            day = cutoff_day(days) if days else ''
+            for target_id in targets:
+                target_votes = {key: vote for key, vote in mine.items() if key[1] == target_id}
+                self._apply(board[target_id], target_votes, existing, lambda timestamp: timestamp[:10] >= day)
+
+            results = [(target_id, good, bad, good + bad) for target_id, (good, bad) in board.items() if good + bad > 0]
+            results.sort(key=lambda row: (-row[1], -row[3]))
+            return results[:limit]
+
+        return await self._consistent_read(read)
+
+    async def get_recent_votes(self, voter_id: int, guild_id: int, limit: int = 20) -> List[Tuple[int, str, str]]:
+        """成员最近投出的票，包含尚未提交的投票"""
+
+        async def read(pending: PendingVotes) -> List[Tuple[int, str, str]]:
+            mine = {key[1]: vote for key, vote in pending.items() if key[0] == voter_id and key[2] == guild_id}
+            rows = await self.db.get_recent_votes(voter_id, guild_id, limit + len(mine))
+            if not mine:
+                return rows[:limit]
+            # 缓冲中的票替换数据库里对同一成员的旧票
+            merged = [row for row in rows if row[0] not in mine]
+            merged.extend((target_id, vote_type, timestamp) for target_id, (vote_type, timestamp) in mine.items())
+            merged.sort(key=lambda row: row[2], reverse=True)
+            return merged[:limit]
+
+        return await self._consistent_read(read)
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'accepted': self.accepted,
+            'deduplicated': self.deduplicated,
+            'rows_written': self.rows_written,
+            'batches_written': self.batches_written,
+            'failed_batches': self.failed_batches,
+            'max_flush_ms': self.max_flush_ms
+        }
+
+    async def _consistent_read(self, read: Callable[[PendingVotes], Awaitable[T]]) -> T:
+        """在缓冲快照和数据库之间做一致的读取
+
+        快照只在没有提交进行时获取；如果读取期间开始了一次提交，缓冲中的票可能已经进了数据库，
+        叠加会重复计数，所以等提交完成后重读。
+        """
+        while True:
+            await self._wait_idle()
+            seq = self._flush_seq
+            result = await read(dict(self._pending))
+            if seq == self._flush_seq:
+                return result
+
+    async def _wait_idle(self):
+        # 多个等待者同时被唤醒时，前面的可能已经开始了新的提交
+        while not self._idle.is_set():
+            await self._idle.wait()
+
+    @staticmethod
+    def _apply(counts: List[int], votes: PendingVotes, existing: Dict[VoteKey, Tuple[str, str]],
+               in_window: Callable[[str], bool]):
+        """把缓冲中的票叠加到 [好票, 坏票] 上：减去会被替换的旧票，加上新票"""
+        for key, (vote_type, timestamp) in votes.items():
+            old = existing.get(key)
+            if old and old[0] in _VOTE_INDEX and in_window(old[1]):
+                counts[_VOTE_INDEX[old[0]]] -= 1
+            if vote_type in _VOTE_INDEX and in_window(timestamp):
+                counts[_VOTE_INDEX[vote_type]] += 1
+
+    async def _run(self):
+        """有待写入的投票时，等待一个提交间隔（或缓冲已满）后统一提交"""
+        while not self._stopping:
+            await self._has_pending.wait()
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            if not await self.flush() and not self._stopping:
+                # 提交失败，等一个间隔再重试
+                await asyncio.sleep(self.flush_interval)
@@ -0,0 +1,406 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# 连接级别的PRAGMA：WAL让读写互不阻塞，NORMAL同步下提交不等待fsync（只在检查点时落盘）
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -16000',
+)
+
+CREATE_VOTES_SQL = '''
+    CREATE TABLE IF NOT EXISTS votes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        voter_id INTEGER NOT NULL,
+        target_id INTEGER NOT NULL,
+        vote_type TEXT NOT NULL,
+        guild_id INTEGER NOT NULL,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE(voter_id, target_id, guild_id)
+    )
+'''
+
+# 使用 INSERT OR REPLACE 来处理重复投票（汇总表由触发器同步）
+CAST_VOTE_SQL = '''
+    INSERT OR REPLACE INTO votes (voter_id, target_id, vote_type, guild_id)
+    VALUES (?, ?, ?, ?)
+'''
+
+# 批量写入时带上接受投票的时间，而不是提交的时间
+CAST_VOTE_AT_SQL = '''
+    INSERT OR REPLACE INTO votes (voter_id, target_id, vote_type, guild_id, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+'''
+
+GET_VOTE_SQL = '''
+    SELECT vote_type, timestamp FROM votes
+    WHERE voter_id = ? AND target_id = ? AND guild_id = ?
+'''
+
+# 条件聚合：好票和坏票在同一次覆盖索引范围扫描中统计
+USER_STATS_SQL = '''
+    SELECT COALESCE(SUM(vote_type = '好票'), 0),
+           COALESCE(SUM(vote_type = '坏票'), 0)
+    FROM votes
+    WHERE guild_id = ? AND target_id = ?
+'''
+
+USER_STATS_SINCE_SQL = USER_STATS_SQL + ' AND timestamp >= ?'
+
+LEADERBOARD_SQL = '''
+    SELECT target_id, good as good_votes, bad as bad_votes, good + bad as total_votes
+    FROM vote_totals
+    WHERE guild_id = ? AND good + bad > 0
+    ORDER BY good_votes DESC, total_votes DESC
+    LIMIT ?
+'''
+
+# 按天汇总：窗口从N天前那一天开始（整天计入）。
+# 逐个成员在主键上定位到窗口起点，只读取窗口内的日期桶，并且按成员顺序聚合
+LEADERBOARD_SINCE_SQL = '''
+    SELECT totals.target_id,
+           SUM(tallies.good) as good_votes,
+           SUM(tallies.bad) as bad_votes,
+           SUM(tallies.good) + SUM(tallies.bad) as total_votes
+    FROM vote_totals totals
+    JOIN vote_tallies tallies
+      ON tallies.guild_id = totals.guild_id
+     AND tallies.target_id = totals.target_id
+     AND tallies.day >= ?
+    WHERE totals.guild_id = ?
+    GROUP BY totals.target_id
+    HAVING total_votes > 0
+    ORDER BY good_votes DESC, total_votes DESC
+    LIMIT ?
+'''
+
+TARGET_TOTALS_SQL = '''
+    SELECT good, bad FROM vote_totals
+    WHERE guild_id = ? AND target_id = ?
+'''
+
+TARGET_TOTALS_SINCE_SQL = '''
+    SELECT COALESCE(SUM(good), 0), COALESCE(SUM(bad), 0) FROM vote_tallies
+    WHERE guild_id = ? AND target_id = ? AND day >= ?
+'''
+
+RECENT_VOTES_SQL = '''
+    SELECT target_id, vote_type, timestamp
+    FROM votes
+    WHERE voter_id = ? AND guild_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+
+# (target_id, good_votes, bad_votes, total_votes)
+LeaderboardRow = Tuple[int, int, int, int]
+
+# (voter_id, target_id, guild_id)：每个投票人对同一成员在同一服务器只有一票
+VoteKey = Tuple[int, int, int]
+
+# (voter_id, target_id, vote_type, guild_id, timestamp)
+VoteRow = Tuple[int, int, str, int, str]
+
+# 数据库结构版本（记录在 PRAGMA user_version 中）
+SCHEMA_VERSION = 2
+
+# 与新投票相同投票人、被投票人、服务器的已有投票（INSERT OR REPLACE 将要替换的那一条）
+_REPLACED_VOTE = 'FROM votes WHERE voter_id = new.voter_id AND target_id = new.target_id AND guild_id = new.guild_id'
+
+def migrate_database(conn: sqlite3.Connection):
+    """把已有的votes.db升级到当前结构版本"""
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+    if version < 1:
+        # 覆盖索引：按服务器+被投票人定位，票型和时间都在索引里，统计和排行榜不需要回表
+        print("正在为投票记录建立索引（记录较多时需要一些时间）...")
+        conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_votes_guild_target
+            ON votes (guild_id, target_id, vote_type, timestamp)
+        ''')
+        conn.execute('ANALYZE votes')
+
+    if version < 2:
+        print("正在建立投票汇总表...")
+        create_tally_tables(conn)
+        rebuild_tallies(conn)
+
+    if version < SCHEMA_VERSION:
+        conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+def create_tally_tables(conn: sqlite3.Connection):
+    """按天和总计的票数汇总表，由触发器随每次投票增量维护
+
+    WITHOUT ROWID：按主键聚簇存放，同一成员的日期桶相邻，按窗口读取时不需要回表。
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vote_tallies (
+            guild_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            good INTEGER NOT NULL DEFAULT 0,
+            bad INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, target_id, day)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS vote_totals (
+            guild_id INTEGER NOT NULL,
+            target_id INTEGER NOT NULL,
+            good INTEGER NOT NULL DEFAULT 0,
+            bad INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (guild_id, target_id)
+        ) WITHOUT ROWID
+    ''')
+
+    # 触发器写在数据库里，任何写votes表的程序（包括V1）都会保持汇总一致。
+    # INSERT OR REPLACE 删除旧票时不会触发DELETE触发器（recursive_triggers未开启），
+    # 所以改票时在BEFORE INSERT中先从旧票所在的日期桶减掉
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS votes_tally_replace
+        BEFORE INSERT ON votes BEGIN
+            UPDATE vote_tallies
+            SET good = good - ((SELECT vote_type {_REPLACED_VOTE}) = '好票'),
+                bad = bad - ((SELECT vote_type {_REPLACED_VOTE}) = '坏票')
+            WHERE guild_id = new.guild_id AND target_id = new.target_id
+              AND day = (SELECT date(timestamp) {_REPLACED_VOTE});
+            UPDATE vote_totals
+            SET good = good - ((SELECT vote_type {_REPLACED_VOTE}) = '好票'),
+                bad = bad - ((SELECT vote_type {_REPLACED_VOTE}) = '坏票')
+            WHERE guild_id = new.guild_id AND target_id = new.target_id
+              AND EXISTS (SELECT 1 {_REPLACED_VOTE});
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS votes_tally_insert
+        AFTER INSERT ON votes BEGIN
+            INSERT INTO vote_tallies (guild_id, target_id, day, good, bad)
+            VALUES (new.guild_id, new.target_id, date(new.timestamp),
+                    new.vote_type = '好票', new.vote_type = '坏票')
+            ON CONFLICT (guild_id, target_id, day) DO UPDATE
+            SET good = good + excluded.good, bad = bad + excluded.bad;
+            INSERT INTO vote_totals (guild_id, target_id, good, bad)
+            VALUES (new.guild_id, new.target_id, new.vote_type = '好票', new.vote_type = '坏票')
+            ON CONFLICT (guild_id, target_id) DO UPDATE
+            SET good = good + excluded.good, bad = bad + excluded.bad;
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS votes_tally_delete
+        AFTER DELETE ON votes BEGIN
+            UPDATE vote_tallies
+            SET good = good - (old.vote_type = '好票'), bad = bad - (old.vote_type = '坏票')
+            WHERE guild_id = old.guild_id AND target_id = old.target_id AND day = date(old.timestamp);
+            UPDATE vote_totals
+            SET good = good - (old.vote_type = '好票'), bad = bad - (old.vote_type = '坏票')
+            WHERE guild_id = old.guild_id AND target_id = old.target_id;
+        END
+    ''')
+
+def rebuild_tallies(conn: sqlite3.Connection):
+    """从投票记录重新计算汇总表（迁移时为已有投票建立汇总）"""
+    conn.execute('DELETE FROM vote_tallies')
+    conn.execute('DELETE FROM vote_totals')
+    conn.execute('''
+        INSERT INTO vote_tallies (guild_id, target_id, day, good, bad)
+        SELECT guild_id, target_id, date(timestamp),
+               SUM(vote_type = '好票'), SUM(vote_type = '坏票')
+        FROM votes
+        GROUP BY guild_id, target_id, date(timestamp)
+    ''')
+    conn.execute('''
+        INSERT INTO vote_totals (guild_id, target_id, good, bad)
+        SELECT guild_id, target_id, SUM(vote_type = '好票'), SUM(vote_type = '坏票')
+        FROM votes
+        GROUP BY guild_id, target_id
+    ''')
+
+def cutoff_timestamp(days: int) -> str:
+    """N天前的时间，格式与 CURRENT_TIMESTAMP 写入的一致（UTC 'YYYY-MM-DD HH:MM:SS'）"""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def cutoff_day(days: int) -> str:
+    """N天前的UTC日期（'YYYY-MM-DD'），对应 vote_tallies.day"""
+    return (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d')
+
+def init_database(conn: sqlite3.Connection):
+    """建表并升级到当前结构版本"""
+    conn.execute(CREATE_VOTES_SQL)
+    migrate_database(conn)
+
+class VoteDatabase:
+    """两个投票机器人共用的votes.db访问层
+
+    写入走一个持久连接和专用线程（天然串行）；读取走只读连接池，每个读线程一个持久连接，
+    WAL下读写互不阻塞。所有方法都是协程，SQLite调用不占用事件循环。
+    """
+
+    def __init__(self, db_path: str = 'votes.db', readers: int = 4):
+        self.db_path = db_path
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='vote-db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='vote-db-reader')
+        self._write_conn: Optional[sqlite3.Connection] = None
+        # 读线程各自的连接
+        self._local = threading.local()
+        self._read_conns: List[sqlite3.Connection] = []
+        self._read_conns_lock = threading.Lock()
+        self._opened = False
+
+        self.queries = 0
+        self.max_query_ms = 0.0
+
+    async def open(self):
+        """建立写连接并初始化/升级表结构（可重复调用）"""
+        if not self._opened:
+            await self._write(init_database)
+            self._opened = True
+
+    async def close(self):
+        if self._writer is None:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, self._close_writer)
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        # 读线程已全部退出，可以在当前线程关闭它们的连接
+        for conn in self._read_conns:
+            conn.close()
+        self._read_conns.clear()
+        self._writer = None
+        self._readers = None
+
+    async def cast_vote(self, voter_id: int, target_id: int, vote_type: str, guild_id: int) -> bool:
+        """投票（重复投票覆盖之前的票）"""
+        try:
+            await self._write(lambda conn: conn.execute(CAST_VOTE_SQL, (voter_id, target_id, vote_type, guild_id)))
+            return True
+        except Exception as e:
+            print(f"投票错误: {e}")
+            return False
+
+    async def cast_votes(self, rows: Iterable[VoteRow]) -> int:
+        """在一个事务中写入一批投票，失败时整批回滚并抛出异常"""
+        rows = list(rows)
+        await self._write(lambda conn: conn.executemany(CAST_VOTE_AT_SQL, rows))
+        return len(rows)
+
+    async def get_votes(self, keys: Iterable[VoteKey]) -> Dict[VoteKey, Tuple[str, str]]:
+        """已保存的投票：{(voter_id, target_id, guild_id): (vote_type, timestamp)}"""
+        keys = list(keys)
+
+        def read(conn: sqlite3.Connection):
+            found = {}
+            for key in keys:
+                row = conn.execute(GET_VOTE_SQL, key).fetchone()
+                if row:
+                    found[key] = row
+            return found
+
+        return await self._run_read(read)
+
+    async def get_target_totals(self, guild_id: int, target_ids: Iterable[int],
+                                days: Optional[int] = None) -> Dict[int, Tuple[int, int]]:
+        """指定成员在排行榜口径下的 (好票, 坏票)，时间窗口按整天计算"""
+        target_ids = list(target_ids)
+        day = cutoff_day(days) if days else None
+
+        def read(conn: sqlite3.Connection):
+            totals = {}
+            for target_id in target_ids:
+                if day:
+                    row = conn.execute(TARGET_TOTALS_SINCE_SQL, (guild_id, target_id, day)).fetchone()
+                else:
+                    row = conn.execute(TARGET_TOTALS_SQL, (guild_id, target_id)).fetchone()
+                totals[target_id] = tuple(row) if row else (0, 0)
+            return totals
+
+        return await self._run_read(read)
+
+    async def get_user_stats(self, user_id: int, guild_id: int, days: Optional[int] = None) -> dict:
+        """成员收到的好票/坏票数，days为None时统计全部时间"""
+        if days:
+            row = await self._read(USER_STATS_SINCE_SQL, (guild_id, user_id, cutoff_timestamp(days)))
+        else:
+            row = await self._read(USER_STATS_SQL, (guild_id, user_id))
+        good_votes, bad_votes = row[0]
+        return {'good_votes': good_votes, 'bad_votes': bad_votes}
+
+    async def get_leaderboard(self, guild_id: int, days: Optional[int] = None, limit: int = 10) -> List[LeaderboardRow]:
+        """按好票数排序的排行榜（读取汇总表，不扫描投票记录）"""
+        if days:
+            return await self._read(LEADERBOARD_SINCE_SQL, (cutoff_day(days), guild_id, limit))
+        return await self._read(LEADERBOARD_SQL, (guild_id, limit))
+
+    async def get_recent_votes(self, voter_id: int, guild_id: int, limit: int = 20) -> List[Tuple[int, str, str]]:
+        """成员最近投出的票：(target_id, vote_type, timestamp)"""
+        return await self._read(RECENT_VOTES_SQL, (voter_id, guild_id, limit))
+
+    def stats(self) -> dict:
+        return {'queries': self.queries, 'max_query_ms': self.max_query_ms}
+
+    async def _write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._call_write, fn)
+
+    async def _read(self, sql: str, params: tuple) -> List[tuple]:
+        return await self._run_read(lambda conn: conn.execute(sql, params).fetchall())
+
+    async def _run_read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, self._call_read, fn)
+
+    def _connect(self) -> sqlite3.Connection:
+        # 每个连接只在创建它的线程中使用；关闭时所有线程已退出，由close统一关闭。
+        # 查询都是固定文本，sqlite3默认每个连接缓存128条已编译语句，足够全部复用
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma).fetchall()
+        return conn
+
+    def _call_write(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        if self._write_conn is None:
+            self._write_conn = self._connect()
+        conn = self._write_conn
+        start = time.perf_counter()
+        try:
+            result = fn(conn)
+            if conn.in_transaction:
+                conn.commit()
+            return result
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._record(start)
+
+    def _call_read(self, fn: Callable[[sqlite3.Connection], Any]) -> Any:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+            conn.execute('PRAGMA query_only = ON')
+            with self._read_conns_lock:
+                self._read_conns.append(conn)
+        start = time.perf_counter()
+        try:
+            return fn(conn)
+        finally:
+            self._record(start)
+
+    def _record(self, start: float):
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.queries += 1
+        self.max_query_ms = max(self.max_query_ms, elapsed_ms)
+
+    def _close_writer(self):
+        if self._write_conn is not None:
+            self._write_conn.close()
+            self._write_conn = None
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+import discord
+
+class NameResolver:
+    """成员ID -> 显示名，供排行榜和投票记录批量使用
+
+    依次查找：服务器成员缓存（网关维护，无需请求）→ 带过期时间的LRU → 客户端用户缓存，
+    都没有时才调用 fetch_user，并发请求数有上限，避免一次渲染触发限流。
+    """
+
+    def __init__(self, bot: discord.Client, max_size: int = 5000, ttl: float = 3600.0, concurrency: int = 5):
+        self.bot = bot
+        self.max_size = max_size
+        self.ttl = ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # user_id -> (过期时间, 显示名)
+        self._cache: "OrderedDict[int, Tuple[float, str]]" = OrderedDict()
+
+        self.member_hits = 0
+        self.cache_hits = 0
+        self.fetches = 0
+
+    async def resolve(self, guild: Optional[discord.Guild], user_ids: Iterable[int]) -> Dict[int, str]:
+        """批量解析显示名；无法获取的用户显示为“用户{ID}”"""
+        names: Dict[int, str] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            name = self._lookup(guild, user_id)
+            if name is None:
+                missing.append(user_id)
+            else:
+                names[user_id] = name
+
+        if missing:
+            fetched = await asyncio.gather(*(self._fetch(user_id) for user_id in missing))
+            names.update(zip(missing, fetched))
+        return names
+
+    def _lookup(self, guild: Optional[discord.Guild], user_id: int) -> Optional[str]:
+        member = guild.get_member(user_id) if guild else None
+        if member is not None:
+            # 服务器昵称只在成员缓存里有，优先使用
+            self.member_hits += 1
+            return member.display_name
+
+        entry = self._cache.get(user_id)
+        if entry is not None:
+            expires, name = entry
+            if expires >= time.monotonic():
+                self._cache.move_to_end(user_id)
+                self.cache_hits += 1
+                return name
+            del self._cache[user_id]
+
+        user = self.bot.get_user(user_id)
+        if user is not None:
+            self._remember(user_id, user.display_name)
+            return user.display_name
+        return None
+
+    async def _fetch(self, user_id: int) -> str:
+        async with self._semaphore:
+            # 等待期间可能已被同一批之外的请求取到
+            entry = self._cache.get(user_id)
+            if entry is not None and entry[0] >= time.monotonic():
+                return entry[1]
+
+            self.fetches += 1
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.NotFound:
+                # 已注销的账号同样缓存，避免每次渲染都重新请求
+                name = f"用户{user_id}"
+            except discord.HTTPException as e:
+                print(f"获取用户 {user_id} 失败: {e}")
+                return f"用户{user_id}"
+            else:
+                name = user.display_name
+            self._remember(user_id, name)
+            return name
+
+    def _remember(self, user_id: int, name: str):
+        self._cache[user_id] = (time.monotonic() + self.ttl, name)
+        self._cache.move_to_end(user_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)